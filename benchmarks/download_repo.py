@@ -0,0 +1,200 @@
+import os
+import sys
+import ast
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def peak_rss():
+	"""
+	Returns the peak resident memory of the current process.
+
+	:returns: the peak resident memory in MB, or None if it is not available (e.g. on Windows).
+	"""
+	try:
+		import resource
+	except ImportError:
+		return None
+	maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return maxrss / 1024 ** 2 if sys.platform == "darwin" else maxrss / 1024
+
+def run_download(configuration):
+	"""
+	Downloads a repository from the mock of the GitHub API using gddownloader.download_repo and measures the
+	download. This function runs in its own process for each run, so that the properties are set before any
+	module of the tool is imported and the peak memory of each run is measured separately.
+
+	:param configuration: a dict containing the address of the mock, the backend (disk or mongo), the address
+	of the repository, the properties to be set, the address of a MongoDB server (or None to use a FakeMongoClient),
+	and whether the memory allocations are traced.
+	:returns: a dict containing the duration of the download, the number of stored items of each type, and the peak memory.
+	"""
+	import properties
+	tempfolder = tempfile.mkdtemp()
+	os.chdir(tempfolder)
+	settings = {"GitHubAuthToken": "benchmark", "github_api_address": configuration["address"], "graphql_api_address": configuration["address"] + "/graphql", \
+				"dataFolderPath": os.path.join(tempfolder, "data"), "verbose": 0, "use_database": configuration["backend"]}
+	if configuration["backend"] == "mongo" and configuration["mongo_uri"] != None:
+		settings["database_host_and_port"] = configuration["mongo_uri"]
+	settings.update(configuration["settings"])
+	for name, value in settings.items():
+		setattr(properties, name, value)
+	if configuration["backend"] == "mongo" and configuration["mongo_uri"] == None:
+		import pymongo
+		from fakemongo import FakeMongoClient
+		pymongo.MongoClient = FakeMongoClient
+	import gddownloader
+	from datamanager.project import Project
+
+	if configuration["trace_memory"]:
+		tracemalloc.start()
+	start = time.perf_counter()
+	gddownloader.download_repo(configuration["repo_address"])
+	seconds = time.perf_counter() - start
+	peak_traced = tracemalloc.get_traced_memory()[1] / 1024 ** 2 if configuration["trace_memory"] else None
+	tracemalloc.stop()
+
+	project = gddownloader.db.read_project_from_disk('_'.join(configuration["repo_address"].split('/')[-2:]))
+	items = {name: len(project[name]) for name in Project.key_fields}
+	os.chdir(os.path.dirname(tempfolder))
+	shutil.rmtree(tempfolder, ignore_errors = True)
+	return {"seconds": seconds, "items": items, "peak_rss_mb": peak_rss(), "peak_traced_mb": peak_traced}
+
+def run_benchmark(mock, backend, args):
+	"""
+	Runs the download of the repository of the mock in a new process and combines its measurements with the
+	requests received by the mock.
+
+	:param mock: an object of type MockGitHub, which is already started.
+	:param backend: the backend where the data are stored (disk or mongo).
+	:param args: the parsed command line arguments.
+	:returns: a dict containing the results of the run, or None if the download failed.
+	"""
+	configuration = {"address": mock.address, "backend": backend, "repo_address": "https://github.com/" + args.repo, "settings": args.settings, \
+					"mongo_uri": args.mongo_uri, "trace_memory": args.trace_memory}
+	mock.reset_counts()
+	p = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", json.dumps(configuration)], stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+	lines = p.stdout.decode('utf-8', 'replace').splitlines()
+	if p.returncode != 0 or not lines:
+		sys.stdout.write(p.stderr.decode('utf-8', 'replace'))
+		return None
+	result = dict(json.loads(lines[-1]), backend = backend, calls = mock.counts)
+	result["num_items"] = sum(result["items"].values())
+	result["num_requests"] = sum(sum(statuses.values()) for statuses in mock.counts.values())
+	result["items_per_second"] = result["num_items"] / result["seconds"]
+	result["requests_per_second"] = result["num_requests"] / result["seconds"]
+	return result
+
+def print_result(result):
+	"""
+	Prints the results of a run.
+
+	:param result: a dict containing the results of the run, as returned by run_benchmark.
+	"""
+	memory = "peak RSS: %7.1f MB" % result["peak_rss_mb"] if result["peak_rss_mb"] != None else "peak RSS: n/a"
+	if result["peak_traced_mb"] != None:
+		memory += "   peak traced: %7.1f MB" % result["peak_traced_mb"]
+	print("%-6s %8.2f s   %7d items (%8.1f items/s)   %6d requests (%7.1f requests/s)   %s" % (result["backend"], result["seconds"], \
+		result["num_items"], result["items_per_second"], result["num_requests"], result["requests_per_second"], memory))
+	for endpoint, statuses in sorted(result["calls"].items()):
+		print("       %-45s %s" % (endpoint, "   ".join("%s: %d" % (status, count) for status, count in sorted(statuses.items()))))
+
+def print_comparison(results, baselinefile):
+	"""
+	Prints the mean throughput and peak memory of each backend compared to the results of a previous benchmark.
+
+	:param results: a list containing the results of the runs, as returned by run_benchmark.
+	:param baselinefile: the path to the output file of the previous benchmark.
+	"""
+	with open(baselinefile, 'rb') as infile:
+		baseline = json.loads(infile.read())
+	print("Compared to %s (commit %s):" % (baselinefile, baseline.get("commit")))
+	for backend in sorted(set(result["backend"] for result in results)):
+		current = [result for result in results if result["backend"] == backend]
+		previous = [result for result in baseline["results"] if result["backend"] == backend]
+		if not previous:
+			continue
+		mean = lambda runs, field: sum(run[field] for run in runs) / len(runs)
+		comparison = "%-6s items/s: %8.1f -> %8.1f (x%.2f)   requests: %6d -> %6d" % (backend, mean(previous, "items_per_second"), \
+						mean(current, "items_per_second"), mean(current, "items_per_second") / mean(previous, "items_per_second"), \
+						mean(previous, "num_requests"), mean(current, "num_requests"))
+		if current[0]["peak_rss_mb"] != None and previous[0]["peak_rss_mb"] != None:
+			comparison += "   peak RSS: %7.1f MB -> %7.1f MB" % (mean(previous, "peak_rss_mb"), mean(current, "peak_rss_mb"))
+		print(comparison)
+
+def current_commit():
+	"""
+	Returns the commit of the working copy of the tool, so that the results of different commits can be told apart.
+
+	:returns: the hash of the commit, or None if it is not available.
+	"""
+	try:
+		return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd = os.path.dirname(os.path.abspath(__file__)), stderr = subprocess.DEVNULL).decode().strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def parse_setting(setting):
+	"""
+	Parses a property given in the command line.
+
+	:param setting: the property as NAME=VALUE, where the value is a Python literal (otherwise it is used as a string).
+	:returns: a tuple containing the name and the value of the property.
+	"""
+	name, value = setting.split('=', 1)
+	try:
+		return name, ast.literal_eval(value)
+	except (ValueError, SyntaxError):
+		return name, value
+
+if __name__ == "__main__":
+	if len(sys.argv) == 3 and sys.argv[1] == "--worker":
+		print(json.dumps(run_download(json.loads(sys.argv[2]))))
+		sys.exit(0)
+
+	parser = argparse.ArgumentParser(description = "Benchmarks gddownloader.download_repo against a local mock of the GitHub API.")
+	parser.add_argument("--backends", nargs = "+", default = ["disk", "mongo"], choices = ["disk", "jsonl", "mongo"], help = "the backends where the data are stored")
+	parser.add_argument("--runs", type = int, default = 1, help = "the number of runs for each backend")
+	parser.add_argument("--issues", type = int, default = 500, help = "the number of issues of the synthetic repository")
+	parser.add_argument("--issue-comments", type = int, default = 1000, help = "the number of issue comments of the synthetic repository")
+	parser.add_argument("--issue-events", type = int, default = 500, help = "the number of issue events of the synthetic repository")
+	parser.add_argument("--commits", type = int, default = 500, help = "the number of commits of the synthetic repository")
+	parser.add_argument("--commit-comments", type = int, default = 100, help = "the number of commit comments of the synthetic repository")
+	parser.add_argument("--contributors", type = int, default = 50, help = "the number of contributors of the synthetic repository")
+	parser.add_argument("--latency", type = float, default = 0, help = "the latency of each response in milliseconds")
+	parser.add_argument("--rate-limit", type = int, default = 5000, help = "the number of requests per hour (when it is exceeded, the tool waits for an hour)")
+	parser.add_argument("--replay", metavar = "PATH", help = "replay the responses of a response cache (see use_response_cache) instead of the synthetic repository")
+	parser.add_argument("--repo", default = "owner/repo", help = "the repository that is downloaded, as owner/name (required when replaying)")
+	parser.add_argument("--set", dest = "settings", metavar = "NAME=VALUE", action = "append", default = [], type = parse_setting, \
+						help = "set a property of the tool (e.g. --set use_async_downloader=True)")
+	parser.add_argument("--mongo-uri", help = "use the MongoDB server at this address instead of an in-memory stand-in (the gddata database is used, so use a test server)")
+	parser.add_argument("--trace-memory", action = "store_true", help = "also measure the peak memory allocated by Python using tracemalloc (slows down the runs)")
+	parser.add_argument("--output", metavar = "FILE", help = "write the results to this JSON file")
+	parser.add_argument("--baseline", metavar = "FILE", help = "compare the results to the output file of a previous benchmark")
+	args = parser.parse_args()
+	args.settings = dict(args.settings)
+
+	from mockgithub import MockGitHub
+	mock = MockGitHub(args.issues, args.issue_comments, args.issue_events, args.commits, args.commit_comments, args.contributors, \
+					args.latency / 1000, args.rate_limit, args.replay)
+	mock.start()
+	results = []
+	for backend in args.backends:
+		for run in range(args.runs):
+			result = run_benchmark(mock, backend, args)
+			if result == None:
+				print("%-6s run %d failed" % (backend, run + 1))
+				continue
+			print_result(result)
+			results.append(result)
+	mock.stop()
+
+	if args.output:
+		with open(args.output, 'w') as outfile:
+			json.dump({"commit": current_commit(), "arguments": vars(args), "results": results}, outfile, indent = 3)
+	if args.baseline:
+		print_comparison(results, args.baseline)
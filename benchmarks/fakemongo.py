@@ -0,0 +1,164 @@
+import threading
+from bson import BSON
+
+class FakeCollection:
+	"""
+	Class that implements an in-memory stand-in of a MongoDB collection, supporting the operations that are
+	used by MongoDBManager. The documents are kept encoded as BSON, so that the stand-in has the cost of
+	encoding and decoding the documents (as pymongo does) but not the cost of the network and the server.
+	As the collections of pymongo, the collections are compared by their names and are not hashable.
+	"""
+	def __init__(self, name):
+		"""
+		Initializes this collection.
+
+		:param name: the name of the collection.
+		"""
+		self.name = name
+		self.lock = threading.Lock()
+		self.documents = {}
+
+	def __eq__(self, other):
+		"""
+		Checks whether this collection is the same as another one.
+
+		:param other: the other collection.
+		:returns: True if the other collection has the same name, or False otherwise.
+		"""
+		return isinstance(other, FakeCollection) and other.name == self.name
+
+	__hash__ = None
+
+	def create_index(self, keys, **kwargs):  # @UnusedVariable
+		"""
+		Creates an index. Indexes are not kept, since the queries are answered by scanning the documents.
+
+		:param keys: the field or the list of fields of the index.
+		"""
+		pass
+
+	def matches(self, document, query):
+		"""
+		Checks whether a document matches a query, which may contain equality conditions and $exists conditions.
+
+		:param document: the document.
+		:param query: a dict containing the query.
+		:returns: True if the document matches the query, or False otherwise.
+		"""
+		for field, condition in query.items():
+			if isinstance(condition, dict) and "$exists" in condition:
+				if (field in document) != condition["$exists"]:
+					return False
+			elif document.get(field) != condition:
+				return False
+		return True
+
+	def find(self, query = None, projection = None):
+		"""
+		Finds the documents that match a query.
+
+		:param query: a dict containing the query, or None to find all documents.
+		:param projection: a dict containing the fields that are included (1) or excluded (0), or None to include all fields.
+		:returns: a generator containing the documents.
+		"""
+		with self.lock:
+			encodeddocuments = list(self.documents.values())
+		for encodeddocument in encodeddocuments:
+			document = BSON(encodeddocument).decode()
+			if self.matches(document, query or {}):
+				if projection != None:
+					included = [field for field, value in projection.items() if value]
+					document = {field: value for field, value in document.items() if (field in included if included else projection.get(field, 1))}
+				yield document
+
+	def find_one(self, query = None, projection = None):
+		"""
+		Finds the first document that matches a query.
+
+		:param query: a dict containing the query, or None to find any document.
+		:param projection: a dict containing the fields that are included (1) or excluded (0), or None to include all fields.
+		:returns: the document, or None if no document matches the query.
+		"""
+		if query != None and set(query) == {"_id"}:
+			with self.lock:
+				encodeddocument = self.documents.get(query["_id"])
+			return BSON(encodeddocument).decode() if encodeddocument != None else None
+		return next(self.find(query, projection), None)
+
+	def update_one(self, query, update, upsert = False):
+		"""
+		Updates the first document that matches a query using the $set operator.
+
+		:param query: a dict containing the query.
+		:param update: a dict containing the $set operator.
+		:param upsert: set to True to insert a document if no documents match the query.
+		"""
+		document = self.find_one(query)
+		if document == None:
+			if not upsert:
+				return
+			document = dict(query)
+		document.update(update["$set"])
+		encodeddocument = BSON.encode(document)
+		with self.lock:
+			self.documents[document["_id"]] = encodeddocument
+
+	def bulk_write(self, operations, ordered = True):  # @UnusedVariable
+		"""
+		Executes a list of UpdateOne operations.
+
+		:param operations: the list of operations.
+		:param ordered: ignored, since the operations are always executed in order.
+		"""
+		for operation in operations:
+			self.update_one(operation._filter, operation._doc, operation._upsert)
+
+class FakeMongoClient:
+	"""
+	Class that implements an in-memory stand-in of a MongoClient, which is used to benchmark MongoDBManager
+	without a MongoDB server. Each database is a dict of FakeCollection objects that are created on first access.
+	"""
+	def __init__(self, host = None, **kwargs):  # @UnusedVariable
+		"""
+		Initializes this client.
+
+		:param host: the host and port of the database (ignored).
+		"""
+		self.databases = {}
+
+	def __getitem__(self, name):
+		"""
+		Returns a database given its name.
+
+		:param name: the name of the database.
+		:returns: a dict with the names of the collections as keys and FakeCollection objects as values.
+		"""
+		database = self.databases.setdefault(name, {})
+		return FakeDatabase(database)
+
+	def close(self):
+		"""
+		Closes this client. Nothing is done, since the client has no connections.
+		"""
+		pass
+
+class FakeDatabase:
+	"""
+	Class that implements an in-memory stand-in of a MongoDB database, of which the collections are created on first access.
+	"""
+	def __init__(self, collections):
+		"""
+		Initializes this database.
+
+		:param collections: a dict with the names of the collections as keys and FakeCollection objects as values.
+		"""
+		self.collections = collections
+
+	def __getitem__(self, name):
+		"""
+		Returns a collection given its name.
+
+		:param name: the name of the collection.
+		:returns: an object of type FakeCollection.
+		"""
+		return self.collections.setdefault(name, FakeCollection(name))
@@ -0,0 +1,83 @@
+import os
+import sys
+import timeit
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jsoncodec import JSONCodec
+
+def github_user(user_id):
+	"""
+	Creates a user object as returned by the GitHub API.
+
+	:param user_id: the id of the user.
+	:returns: a dict containing the user.
+	"""
+	login = "user" + str(user_id)
+	user = {"login": login, "id": user_id, "node_id": "MDQ6VXNlcj" + str(user_id), "gravatar_id": "", "type": "User", "site_admin": False,
+			"avatar_url": "https://avatars.githubusercontent.com/u/" + str(user_id) + "?v=4"}
+	for field in ["url", "html_url", "followers_url", "following_url", "gists_url", "starred_url", "subscriptions_url", \
+				"organizations_url", "repos_url", "events_url", "received_events_url"]:
+		user[field] = "https://api.github.com/users/" + login + "/" + field
+	return user
+
+def github_issue(number):
+	"""
+	Creates a full issue object as returned by the GitHub API.
+
+	:param number: the number of the issue.
+	:returns: a dict containing the issue.
+	"""
+	address = "https://api.github.com/repos/owner/repo/issues/" + str(number)
+	return {"url": address, "repository_url": "https://api.github.com/repos/owner/repo", "labels_url": address + "/labels{/name}",
+			"comments_url": address + "/comments", "events_url": address + "/events", "html_url": "https://github.com/owner/repo/issues/" + str(number),
+			"id": 100000000 + number, "node_id": "MDU6SXNzdWUx" + str(number), "number": number, "title": "Crash when parsing a très long input #" + str(number),
+			"user": github_user(number % 50), "labels": [{"id": 1000 + number % 5, "name": "bug", "color": "d73a4a", "default": True}],
+			"state": "closed", "locked": False, "assignee": None, "assignees": [], "milestone": None, "comments": number % 7,
+			"created_at": "2019-01-01T10:00:00Z", "updated_at": "2019-02-01T10:00:00Z", "closed_at": "2019-02-01T10:00:00Z",
+			"author_association": "CONTRIBUTOR", "body": "Steps to reproduce:\r\n1. Run the tool\r\n2. See the \"error\" ✓\r\n" * 20,
+			"closed_by": github_user(number % 3)}
+
+def github_commit(number):
+	"""
+	Creates a full commit object as returned by the GitHub API.
+
+	:param number: the number of the commit.
+	:returns: a dict containing the commit.
+	"""
+	sha = format(number, "040x")
+	person = {"name": "Developer", "email": "developer@example.com", "date": "2019-01-01T10:00:00Z"}
+	return {"sha": sha, "node_id": "MDY6Q29tbWl0" + sha, "url": "https://api.github.com/repos/owner/repo/commits/" + sha,
+			"commit": {"author": person, "committer": person, "message": "Fix the parser\n\nThe parser failed on long inputs.", "comment_count": 0,
+					"tree": {"sha": sha, "url": "https://api.github.com/repos/owner/repo/git/trees/" + sha}},
+			"author": github_user(number % 50), "committer": github_user(number % 50), "parents": [{"sha": sha, "url": "https://api.github.com/repos/owner/repo/commits/" + sha}],
+			"stats": {"total": 30, "additions": 20, "deletions": 10},
+			"files": [{"sha": sha, "filename": "src/module" + str(i) + ".py", "status": "modified", "additions": 4, "deletions": 2, "changes": 6,
+					"patch": "@@ -1,6 +1,8 @@\n-import os\n+import os\n+import sys\n def parse(text):\n-\treturn text\n+\treturn text.strip()\n" * 5} for i in range(5)]}
+
+def benchmark(codec, payloads, number):
+	"""
+	Measures the time needed by a JSON codec to parse the payloads from bytes and to write them as
+	compact documents (as in JSON Lines segments) and as indented documents (as in JSON files).
+
+	:param codec: an object of type JSONCodec.
+	:param payloads: a dict with the names of the payloads as keys and the payloads as values.
+	:param number: the number of times each operation is repeated.
+	"""
+	for payloadname, payload in payloads.items():
+		data = codec.dumpb(payload)
+		loads = timeit.timeit(lambda: codec.loads(data), number = number)
+		dumps = timeit.timeit(lambda: codec.dumpb(payload), number = number)
+		dumps_indented = timeit.timeit(lambda: codec.dumpb(payload, indent = 3, sort_keys = True), number = number)
+		print("%-8s %-20s loads: %7.3f ms   compact dumps: %7.3f ms   indented dumps: %7.3f ms" % \
+			(codec.name, payloadname, 1000 * loads / number, 1000 * dumps / number, 1000 * dumps_indented / number))
+
+if __name__ == "__main__":
+	number = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+	payloads = {"page of 100 issues": [github_issue(i) for i in range(1, 101)], "page of 100 commits": [github_commit(i) for i in range(1, 101)], \
+				"full issue": github_issue(1), "full commit": github_commit(1)}
+	for name in ["json", "ujson", "orjson"]:
+		try:
+			codec = JSONCodec(name)
+		except ImportError:
+			print("%-8s is not installed" % name)
+			continue
+		benchmark(codec, payloads, number)
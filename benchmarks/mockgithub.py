@@ -0,0 +1,334 @@
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl, urlencode
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from json_codecs import github_user, github_issue, github_commit
+from metrics import registry
+
+def github_issue_comment(comment_id):
+	"""
+	Creates an issue comment object as returned by the GitHub API.
+
+	:param comment_id: the id of the comment.
+	:returns: a dict containing the issue comment.
+	"""
+	address = "https://api.github.com/repos/owner/repo/issues/comments/" + str(comment_id)
+	return {"url": address, "html_url": "https://github.com/owner/repo/issues/1#issuecomment-" + str(comment_id), "id": comment_id,
+			"node_id": "MDEyOklzc3VlQ29tbWVudDE" + str(comment_id), "user": github_user(comment_id % 50), "author_association": "CONTRIBUTOR",
+			"issue_url": "https://api.github.com/repos/owner/repo/issues/" + str(1 + comment_id % 100),
+			"created_at": "2019-01-15T10:00:00Z", "updated_at": "2019-01-15T10:00:00Z", "body": "I can reproduce this on the latest version.\r\n" * 5}
+
+def github_issue_event(event_id, date):
+	"""
+	Creates an issue event object as returned by the GitHub API.
+
+	:param event_id: the id of the event.
+	:param date: the date of the event.
+	:returns: a dict containing the issue event.
+	"""
+	return {"url": "https://api.github.com/repos/owner/repo/issues/events/" + str(event_id), "id": event_id, "node_id": "MDEwOkNsb3NlZEV2ZW50" + str(event_id),
+			"actor": github_user(event_id % 50), "event": "closed", "commit_id": None, "commit_url": None, "created_at": date,
+			"issue": {"url": "https://api.github.com/repos/owner/repo/issues/" + str(1 + event_id % 100), "number": 1 + event_id % 100, "state": "closed"}}
+
+def github_commit_comment(comment_id):
+	"""
+	Creates a commit comment object as returned by the GitHub API.
+
+	:param comment_id: the id of the comment.
+	:returns: a dict containing the commit comment.
+	"""
+	return {"url": "https://api.github.com/repos/owner/repo/comments/" + str(comment_id), "id": comment_id, "node_id": "MDEzOkNvbW1pdENvbW1lbnQ" + str(comment_id),
+			"user": github_user(comment_id % 50), "commit_id": format(1 + comment_id % 100, "040x"), "path": "src/module1.py", "position": 4, "line": 4,
+			"created_at": "2019-01-20T10:00:00Z", "updated_at": "2019-01-20T10:00:00Z", "body": "Should this be stripped here?"}
+
+def github_contributor(user_id):
+	"""
+	Creates a contributor object as returned by the GitHub API.
+
+	:param user_id: the id of the user.
+	:returns: a dict containing the contributor.
+	"""
+	return dict(github_user(user_id), contributions = 1000 // user_id)
+
+class MockGitHub:
+	"""
+	Class that implements a local mock of the GitHub API, which serves either a synthetic repository of
+	configurable size or the responses recorded in a response cache (see use_response_cache). The mock
+	serves paginated objects with Link headers (honoring the page, per_page, and since parameters), full
+	issues and commits, GraphQL queries for full objects, the rate limit (with x-ratelimit-* headers that
+	decrease with each request), and ETags (conditional requests for unchanged responses get a 304 that
+	does not count against the rate limit). Each response can be delayed to simulate the latency of the
+	network. The requests are counted per endpoint and status, so that the calls of the tool can be compared.
+	"""
+	def __init__(self, num_issues = 500, num_issue_comments = 1000, num_issue_events = 500, num_commits = 500, \
+				num_commit_comments = 100, num_contributors = 50, latency = 0, rate_limit = 5000, recordingspath = None):
+		"""
+		Initializes this mock of the GitHub API. The objects of the synthetic repository are created here,
+		while their responses are encoded once, the first time they are requested.
+
+		:param num_issues: the number of issues of the synthetic repository.
+		:param num_issue_comments: the number of issue comments of the synthetic repository.
+		:param num_issue_events: the number of issue events of the synthetic repository.
+		:param num_commits: the number of commits of the synthetic repository.
+		:param num_commit_comments: the number of commit comments of the synthetic repository.
+		:param num_contributors: the number of contributors of the synthetic repository.
+		:param latency: the number of seconds by which each response is delayed.
+		:param rate_limit: the number of requests that can be sent in an hour.
+		:param recordingspath: the path to a response cache of which the responses are replayed instead of
+		serving the synthetic repository, or None.
+		"""
+		self.latency = latency
+		self.rate_limit = rate_limit
+		self.lock = threading.Lock()
+		self.responses = {}
+		self.recordings = self.read_recordings(recordingspath) if recordingspath != None else None
+		self.full_issues = {number: github_issue(number) for number in range(num_issues, 0, -1)}
+		self.full_commits = {format(number, "040x"): github_commit(number) for number in range(num_commits, 0, -1)}
+		self.paginated_objects = {
+			"issues": ([{key: value for key, value in issue.items() if key != "closed_by"} for issue in self.full_issues.values()], "updated_at"),
+			"issues/comments": ([github_issue_comment(i) for i in range(1, num_issue_comments + 1)], "updated_at"),
+			"issues/events": ([github_issue_event(i, time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(1546300800 + (num_issue_events - i) * 60))) \
+								for i in range(1, num_issue_events + 1)], None),
+			"commits": ([{key: value for key, value in commit.items() if key not in ("stats", "files")} for commit in self.full_commits.values()], None),
+			"comments": ([github_commit_comment(i) for i in range(1, num_commit_comments + 1)], None),
+			"contributors": ([github_contributor(i) for i in range(1, num_contributors + 1)], None)
+		}
+		self.reset_counts()
+
+	def read_recordings(self, recordingspath):
+		"""
+		Reads the responses recorded in a response cache.
+
+		:param recordingspath: the path to the folder of the response cache.
+		:returns: a dict with the paths (including the query) of the requests as keys and tuples containing
+		the headers and the body of the responses as values.
+		"""
+		recordings = {}
+		for dirpath, _, filenames in os.walk(recordingspath):
+			for filename in filenames:
+				if filename.endswith(".json"):
+					with open(os.path.join(dirpath, filename), 'rb') as infile:
+						entry = json.loads(infile.read())
+					url = urlsplit(entry["url"])
+					recordings[url.path + ("?" + url.query if url.query else "")] = (entry["headers"], entry["body"].encode('utf-8'))
+		return recordings
+
+	def reset_counts(self):
+		"""
+		Resets the counts of the requests and the rate limit.
+		"""
+		with self.lock:
+			self.counts = {}
+			self.remaining = self.rate_limit
+			self.reset = int(time.time()) + 3600
+
+	def count(self, path, status):
+		"""
+		Counts a request. This function must be called while holding the lock of the mock.
+
+		:param path: the path of the request.
+		:param status: the status code of the response.
+		"""
+		endpoint = self.counts.setdefault(registry.endpoint(path), {})
+		endpoint[str(status)] = endpoint.get(str(status), 0) + 1
+
+	def start(self):
+		"""
+		Starts serving the mock of the GitHub API in a background thread.
+
+		:returns: the address of the mock (e.g. http://127.0.0.1:12345), which is used as the github_api_address.
+		"""
+		self.server = ThreadingHTTPServer(("127.0.0.1", 0), MockGitHubRequestHandler)
+		self.server.daemon_threads = True
+		self.server.mock = self
+		self.address = "http://127.0.0.1:%d" % self.server.server_address[1]
+		threading.Thread(target = self.server.serve_forever, daemon = True).start()
+		return self.address
+
+	def stop(self):
+		"""
+		Stops serving the mock of the GitHub API.
+		"""
+		self.server.shutdown()
+		self.server.server_close()
+
+	def page(self, path, name, parameters):
+		"""
+		Returns a page of a paginated object of the synthetic repository.
+
+		:param path: the path of the request.
+		:param name: the name of the paginated object, i.e. its path after the address of the repository (e.g. issues).
+		:param parameters: a dict containing the parameters of the request.
+		:returns: a tuple containing the objects of the page and the Link header, or None if there is no such object.
+		"""
+		if name not in self.paginated_objects:
+			return None
+		objects, date_field = self.paginated_objects[name]
+		if "since" in parameters:
+			if date_field != None:
+				objects = [obj for obj in objects if obj[date_field] >= parameters["since"]]
+			elif name == "commits":
+				objects = [obj for obj in objects if obj["commit"]["committer"]["date"] >= parameters["since"]]
+		per_page = min(int(parameters.get("per_page", 30)), 100)
+		page = int(parameters.get("page", 1))
+		last = max((len(objects) + per_page - 1) // per_page, 1)
+		links = []
+		for linkpage, rel in ((page + 1, "next"), (last, "last"), (1, "first"), (page - 1, "prev")):
+			if (rel in ("next", "last") and page < last) or (rel in ("first", "prev") and page > 1):
+				links.append('<%s?%s>; rel="%s"' % (self.address + path, urlencode(dict(parameters, page = linkpage)), rel))
+		return objects[(page - 1) * per_page:page * per_page], ", ".join(links)
+
+	def synthetic_response(self, path, parameters):
+		"""
+		Creates the response of the synthetic repository to a GET request.
+
+		:param path: the path of the request.
+		:param parameters: a dict containing the parameters of the request.
+		:returns: a tuple containing the status code, the headers, and the body of the response.
+		"""
+		match = re.match(r"^/repos/[^/]+/[^/]+(?:/(.*))?$", path)
+		if match == None:
+			return 404, {}, {"message": "Not Found"}
+		rest = match.group(1) or ""
+		if rest == "":
+			return 200, {}, {"id": 1296269, "node_id": "MDEwOlJlcG9zaXRvcnkxMjk2MjY5", "name": "repo", "full_name": "owner/repo",
+							"owner": github_user(1), "private": False, "fork": False, "html_url": "https://github.com/owner/repo",
+							"url": "https://api.github.com/repos/owner/repo", "default_branch": "master", "open_issues_count": len(self.full_issues) // 2,
+							"created_at": "2018-01-01T10:00:00Z", "updated_at": "2019-02-01T10:00:00Z", "pushed_at": "2019-02-01T10:00:00Z"}
+		match = re.match(r"^issues/(\d+)$", rest)
+		if match != None:
+			issue = self.full_issues.get(int(match.group(1)))
+			return (200, {}, issue) if issue != None else (404, {}, {"message": "Not Found"})
+		match = re.match(r"^commits/([0-9a-f]{40})$", rest)
+		if match != None:
+			commit = self.full_commits.get(match.group(1))
+			return (200, {}, commit) if commit != None else (422, {}, {"message": "No commit found for SHA: " + match.group(1)})
+		page = self.page(path, rest, parameters)
+		if page == None:
+			return 404, {}, {"message": "Not Found"}
+		objects, link = page
+		return 200, {"Link": link} if link else {}, objects
+
+	def graphql_response(self, query):
+		"""
+		Creates the response of the synthetic repository to a GraphQL query for full issues and commits.
+
+		:param query: the GraphQL query, as built by GraphQLDownloader.
+		:returns: the body of the response.
+		"""
+		with self.lock:
+			data = {"rateLimit": {"remaining": self.remaining, "resetAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.reset))}}
+		repository = None
+		for match in re.finditer(r'(r\d+): repository|(n\d+): issueOrPullRequest\(number: (\d+)\)|(n\d+): object\(oid: "([0-9a-f]+)"\)', query):
+			if match.group(1):
+				repository = data.setdefault(match.group(1), {})
+			elif match.group(2):
+				issue = self.full_issues.get(int(match.group(3)))
+				actor = {"__typename": "User", "login": issue["closed_by"]["login"], "databaseId": issue["closed_by"]["id"], "id": issue["closed_by"]["node_id"], \
+						"avatarUrl": issue["closed_by"]["avatar_url"], "url": issue["closed_by"]["html_url"]} if issue != None else None
+				repository[match.group(2)] = {"timelineItems": {"nodes": [{"actor": actor}]}} if issue != None else None
+			else:
+				commit = self.full_commits.get(match.group(5))
+				repository[match.group(4)] = {"additions": commit["stats"]["additions"], "deletions": commit["stats"]["deletions"]} if commit != None else None
+		return {"data": data}
+
+	def response(self, method, path, query, headers, body):
+		"""
+		Creates the response to a request, including the headers of the rate limit and the ETag. The
+		responses of the GET requests are encoded once and are then kept, since they do not change.
+
+		:param method: the method of the request (GET or POST).
+		:param path: the path of the request.
+		:param query: the query of the request.
+		:param headers: the headers of the request.
+		:param body: the body of the request as bytes.
+		:returns: a tuple containing the status code, the headers, and the body of the response.
+		"""
+		if path == "/rate_limit":
+			with self.lock:
+				self.count(path, 200)
+				rate = {"limit": self.rate_limit, "remaining": self.remaining, "reset": self.reset, "used": self.rate_limit - self.remaining}
+			return 200, {}, json.dumps({"resources": {"core": rate, "search": rate, "graphql": rate}, "rate": rate}).encode('utf-8')
+		key = method + " " + path + "?" + query
+		if key in self.responses:
+			status, responseheaders, responsebody = self.responses[key]
+		else:
+			if self.recordings != None:
+				recording = self.recordings.get(path + ("?" + query if query else "")) if method == "GET" else None
+				if recording != None:
+					status, responseheaders, responsebody = 200, dict(recording[0]), recording[1]
+					if "Link" in responseheaders:
+						responseheaders["Link"] = re.sub(r"<https?://[^/>]+", "<" + self.address, responseheaders["Link"])
+				else:
+					status, responseheaders, responsebody = 404, {}, json.dumps({"message": "Not Found"}).encode('utf-8')
+			elif method == "POST":
+				status, responseheaders, responsebody = 200, {}, json.dumps(self.graphql_response(json.loads(body)["query"])).encode('utf-8')
+			else:
+				status, responseheaders, responsebody = self.synthetic_response(path, dict(parse_qsl(query)))
+				responsebody = json.dumps(responsebody).encode('utf-8')
+			if status == 200 and "ETag" not in responseheaders:
+				responseheaders["ETag"] = '"' + hashlib.md5(responsebody).hexdigest() + '"'
+			if method == "GET":
+				self.responses[key] = status, responseheaders, responsebody
+		with self.lock:
+			if status == 200 and headers.get("If-None-Match") == responseheaders["ETag"]:
+				status, responsebody = 304, b''
+			elif self.remaining <= 0:
+				status, responsebody = 403, json.dumps({"message": "API rate limit exceeded"}).encode('utf-8')
+			else:
+				self.remaining -= 1
+			self.count(path, status)
+			ratelimitheaders = {"x-ratelimit-limit": str(self.rate_limit), "x-ratelimit-remaining": str(self.remaining), \
+								"x-ratelimit-reset": str(self.reset), "x-ratelimit-used": str(self.rate_limit - self.remaining), "x-ratelimit-resource": "core"}
+		return status, dict(responseheaders, **ratelimitheaders), responsebody
+
+class MockGitHubRequestHandler(BaseHTTPRequestHandler):
+	"""
+	Class that handles the requests to a MockGitHub server.
+	"""
+	protocol_version = "HTTP/1.1"
+	disable_nagle_algorithm = True
+
+	def log_message(self, format, *args):  # @UnusedVariable
+		"""
+		Disables the logging of the requests.
+		"""
+		pass
+
+	def handle_request(self, method):
+		"""
+		Handles a request by sending the response of the mock after the latency of the mock.
+
+		:param method: the method of the request (GET or POST).
+		"""
+		mock = self.server.mock
+		url = urlsplit(self.path)
+		body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+		status, headers, responsebody = mock.response(method, url.path, url.query, self.headers, body)
+		if mock.latency > 0:
+			time.sleep(mock.latency)
+		self.send_response(status)
+		self.send_header("Content-Type", "application/json; charset=utf-8")
+		self.send_header("Content-Length", str(len(responsebody)))
+		for header, value in headers.items():
+			self.send_header(header, value)
+		self.end_headers()
+		self.wfile.write(responsebody)
+
+	def do_GET(self):
+		"""
+		Handles a GET request to the REST API.
+		"""
+		self.handle_request("GET")
+
+	def do_POST(self):
+		"""
+		Handles a POST request to the GraphQL API.
+		"""
+		self.handle_request("POST")
@@ -1,9 +1,17 @@
+import time
+import threading
+import metrics
 from pymongo import UpdateOne
-from properties import num_bulk_operations
+from properties import num_bulk_operations, bulk_flush_interval
 
 class DatabaseManager:
 	"""
-	Class that implements a database manager. It includes functions for a MongoDB database.
+	Class that implements a database manager. It includes functions for a MongoDB database. The
+	update operations that are added to the write buffer are sent to the database in bulk, when
+	a buffer reaches num_bulk_operations documents, when its oldest document has been waiting for
+	more than bulk_flush_interval seconds (checked on each added document and by a timer, so that
+	documents are not kept while the downloader waits, e.g. for the rate limit), or when the method
+	flush_buffers is called. The buffers are kept by the names of the collections.
 	"""
 	def update_multiple(self, collection, documents, upsert = False):
 		"""
@@ -17,7 +25,91 @@ class DatabaseManager:
 		for document in documents:
 			operations.append(UpdateOne({"_id": document["_id"]}, {"$set": document}, upsert = upsert))
 			if len(operations) == num_bulk_operations:
-				collection.bulk_write(operations, ordered = False)
+				with metrics.timer("write_latency_seconds", {"backend": "mongo"}):
+					collection.bulk_write(operations, ordered = False)
 				operations = []
 		if len(operations) > 0:
-			collection.bulk_write(operations, ordered = False)
+			with metrics.timer("write_latency_seconds", {"backend": "mongo"}):
+				collection.bulk_write(operations, ordered = False)
+
+	def update_buffered(self, collection, document):
+		"""
+		Adds an upsert operation to the write buffer of a collection. If the buffer already has a
+		document with the same _id, the two documents are merged, as they would be by two $set
+		operations. Any buffer that is full or too old is flushed.
+
+		:param collection: the collection in which the document is updated.
+		:param document: the document to be updated.
+		"""
+		with self.buffer_lock:
+			self.buffer_collections[collection.name] = collection
+			buffer = self.buffers.setdefault(collection.name, {})
+			if not buffer:
+				self.buffer_times[collection.name] = time.time()
+				self.schedule_flush()
+			if document["_id"] in buffer:
+				buffer[document["_id"]].update(document)
+			else:
+				buffer[document["_id"]] = dict(document)
+			self.flush_full_or_old_buffers()
+
+	def flush_full_or_old_buffers(self):
+		"""
+		Flushes the write buffers that are full or too old. This function must be called while holding the buffer lock.
+		"""
+		now = time.time()
+		for name in list(self.buffers):
+			if len(self.buffers[name]) >= num_bulk_operations or \
+					(self.buffers[name] and now - self.buffer_times[name] >= bulk_flush_interval):
+				self.flush_buffer(name)
+
+	def schedule_flush(self):
+		"""
+		Starts a timer that flushes the buffers that are too old, if no such timer is running. This
+		function must be called while holding the buffer lock.
+		"""
+		if self.flush_timer == None:
+			self.flush_timer = threading.Timer(bulk_flush_interval, self.flush_old_buffers)
+			self.flush_timer.daemon = True
+			self.flush_timer.start()
+
+	def flush_old_buffers(self):
+		"""
+		Flushes the buffers that are too old. This function is called by the timer, which is started
+		again if any documents are still buffered.
+		"""
+		with self.buffer_lock:
+			self.flush_timer = None
+			self.flush_full_or_old_buffers()
+			if any(self.buffers.values()):
+				self.schedule_flush()
+
+	def flush_buffer(self, name):
+		"""
+		Sends the operations of the write buffer of a collection to the database. The buffer is emptied
+		only after the operations are sent, so that they are sent again by the next flush if they fail.
+
+		:param name: the name of the collection of which the buffer is flushed.
+		"""
+		documents = self.buffers.get(name)
+		if documents:
+			self.update_multiple(self.buffer_collections[name], documents.values(), upsert = True)
+		self.buffers.pop(name, None)
+
+	def flush_buffers(self):
+		"""
+		Sends the operations of all write buffers to the database.
+		"""
+		with self.buffer_lock:
+			for name in list(self.buffers):
+				self.flush_buffer(name)
+
+	def initialize_buffers(self):
+		"""
+		Initializes the write buffers of this database manager.
+		"""
+		self.buffers = {}
+		self.buffer_times = {}
+		self.buffer_collections = {}
+		self.buffer_lock = threading.Lock()
+		self.flush_timer = None
@@ -1,19 +1,65 @@
 import os
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datamanager.project import Project
+from datamanager.objectindex import ObjectIndex
 from datamanager.filemanager import FileManager
-from properties import dataFolderPath, always_write_to_disk
+from properties import dataFolderPath, always_write_to_disk, num_file_writer_threads, use_folder_snapshots
 
 class DBManager(FileManager):
 	"""
 	Class that implements a DB manager. To use this class, you must first call the method
 	initialize_write_to_disk, then optionally call any other method for writing data to
-	disk, and finally call the method finalize_write_to_disk.
+	disk, and finally call the method finalize_write_to_disk. If num_file_writer_threads is
+	larger than 0, the issues, commits, etc. are written by a pool of background threads.
 	"""
 	def __init__(self):
 		"""
 		Initializes this DB manager.
 		"""
 		self.create_folder_if_it_does_not_exist(dataFolderPath)
+		self.writer = ThreadPoolExecutor(max_workers = num_file_writer_threads) if num_file_writer_threads > 0 else None
+		self.pending_writes = {}
+
+	def write_json_to_file_in_background(self, filename, data):
+		"""
+		Writes a JSON object to file using the pool of writer threads. If the pool has too many pending
+		writes, this function waits until one of them finishes. Any pending write to the same file is
+		completed first, so that the writes to each file are performed in order.
+
+		:param filename: the filename of the file to be written.
+		:param data: the JSON data to be written to file.
+		"""
+		if self.writer == None:
+			self.write_json_to_file(filename, data)
+			return
+		if filename in self.pending_writes:
+			self.pending_writes.pop(filename).result()
+		if len(self.pending_writes) >= 4 * num_file_writer_threads:
+			done, _ = wait(self.pending_writes.values(), return_when = FIRST_COMPLETED)
+			for pending_filename in [f for f, future in self.pending_writes.items() if future in done]:
+				self.pending_writes.pop(pending_filename).result()
+		self.pending_writes[filename] = self.writer.submit(self.write_json_to_file, filename, data)
+
+	def wait_for_pending_writes(self, filename = None):
+		"""
+		Waits until the pending writes of the pool of writer threads are finished. Any exception raised
+		by a write is raised again by this function.
+
+		:param filename: the filename of the file of which the pending write is waited for, or None to wait for all pending writes.
+		"""
+		for pending_filename in ([filename] if filename != None else list(self.pending_writes)):
+			if pending_filename in self.pending_writes:
+				self.pending_writes.pop(pending_filename).result()
+
+	def read_written_json_from_file(self, filename):
+		"""
+		Reads a file into a JSON object, after any pending write to the file is finished.
+
+		:param filename: the filename of the file to be read.
+		:returns: the JSON object that is contained in the file.
+		"""
+		self.wait_for_pending_writes(filename)
+		return self.read_json_from_file(filename)
 
 	def initialize_write_to_disk(self, repo_name):
 		"""
@@ -43,14 +89,61 @@ class DBManager(FileManager):
 		rootfolder = os.path.join(dataFolderPath, repo_name)
 		project["info"] = self.read_json_from_file_if_it_exists(os.path.join(rootfolder, "info.json"))
 		project["stats"] = self.read_json_from_file_if_it_exists(os.path.join(rootfolder, "stats.json"))
-		project["issues"] = self.read_jsons_from_folder(os.path.join(rootfolder, "issues"), "id")
-		project["issueComments"] = self.read_jsons_from_folder(os.path.join(rootfolder, "issueComments"), "id")
-		project["issueEvents"] = self.read_jsons_from_folder(os.path.join(rootfolder, "issueEvents"), "id")
-		project["commits"] = self.read_jsons_from_folder(os.path.join(rootfolder, "commits"), "sha")
-		project["commitComments"] = self.read_jsons_from_folder(os.path.join(rootfolder, "commitComments"), "id")
-		project["contributors"] = self.read_jsons_from_folder(os.path.join(rootfolder, "contributors"), "id")
+		project["highwatermarks"] = self.read_json_from_file_if_it_exists(os.path.join(rootfolder, "highwatermarks.json"))
+		project["checkpoints"] = self.read_json_from_file_if_it_exists(os.path.join(rootfolder, "checkpoints.json"))
+		project["quarantined"] = []
+		project["issues"] = self.read_object_index(repo_name, "issues", project["quarantined"])
+		project["issueComments"] = self.read_object_index(repo_name, "issueComments", project["quarantined"])
+		project["issueEvents"] = self.read_object_index(repo_name, "issueEvents", project["quarantined"])
+		project["commits"] = self.read_object_index(repo_name, "commits", project["quarantined"])
+		project["commitComments"] = self.read_object_index(repo_name, "commitComments", project["quarantined"])
+		project["contributors"] = self.read_object_index(repo_name, "contributors", project["quarantined"])
 		return project
 
+	def read_object_index(self, repo_name, foldername, quarantined = None):
+		"""
+		Reads the index of the objects of a folder of a project (e.g. of its issues). The objects
+		are read from disk only when they are accessed. If use_folder_snapshots is True and the
+		snapshot of the folder is valid, the index is read from the snapshot.
+
+		:param repo_name: the name of the repository.
+		:param foldername: the name of the folder of the objects (e.g. issues).
+		:param quarantined: a list where the paths to the quarantined files are appended, or None.
+		:returns: an object of type ObjectIndex.
+		"""
+		folder = os.path.join(dataFolderPath, repo_name, foldername)
+		full_field = Project.full_fields.get(foldername)
+		keys = self.read_folder_snapshot(folder, quarantined) if use_folder_snapshots else None
+		if keys == None:
+			keys = self.read_json_index_from_folder(folder, Project.key_fields[foldername], full_field, quarantined)
+		index = ObjectIndex(full_field, lambda key: self.read_written_json_from_file(os.path.join(folder, str(key) + ".json")), \
+						None if always_write_to_disk else lambda objects: self.write_objects_to_disk(repo_name, foldername, objects))
+		for key, is_full in keys.items():
+			index.add_key(key, is_full)
+		return index
+
+	def write_objects_to_disk(self, repo_name, foldername, objects):
+		"""
+		Writes the objects of a folder of a project (e.g. its issues) to disk. This function is used
+		when always_write_to_disk is False to write the objects that are buffered in the project.
+
+		:param repo_name: the name of the repository.
+		:param foldername: the name of the folder of the objects (e.g. issues).
+		:param objects: the objects to be written to disk.
+		"""
+		folder = os.path.join(dataFolderPath, repo_name, foldername)
+		for obj in objects:
+			self.write_json_to_file_in_background(os.path.join(folder, str(obj[Project.key_fields[foldername]]) + ".json"), obj)
+
+	def read_project_checkpoints(self, repo_name):
+		"""
+		Reads the checkpoints of a project from disk, without reading the rest of the project.
+
+		:param repo_name: the name of the repository.
+		:returns: the checkpoints of the project, or an empty object if the project has no checkpoints.
+		"""
+		return self.read_json_from_file_if_it_exists(os.path.join(dataFolderPath, repo_name, "checkpoints.json"))
+
 	def project_exists(self, repo_name):
 		"""
 		Check if a project exists in the disk given the name of the repository that is also the folder
@@ -63,27 +156,34 @@ class DBManager(FileManager):
 
 	def finalize_write_to_disk(self, repo_name, project):
 		"""
-		Finalizes the writing of a project to disk. Closes any open buffers.
+		Finalizes the writing of a project to disk. Closes any open buffers and waits until all pending
+		writes are finished. If always_write_to_disk is False, the objects that are still buffered in the
+		project are written before its info, stats, high water marks, and checkpoints. If use_folder_snapshots is True,
+		the snapshots of the folders of the project are written.
 
 		:param repo_name: the name of the repository to be written to disk.
 		:param project: the repository data to be written to disk.
 		"""
+		if not always_write_to_disk:
+			project["issues"].flush()
+			project["issueComments"].flush()
+			project["issueEvents"].flush()
+			project["commits"].flush()
+			project["commitComments"].flush()
+			project["contributors"].flush()
+		self.wait_for_pending_writes()
+		if use_folder_snapshots:
+			for foldername in Project.key_fields:
+				self.write_folder_snapshot(os.path.join(dataFolderPath, repo_name, foldername), project[foldername].full)
 		if not always_write_to_disk:
 			rootfolder = os.path.join(dataFolderPath, repo_name)
 			self.write_json_to_file(os.path.join(rootfolder, "info.json"), project["info"])
-			self.write_json_to_file(os.path.join(rootfolder, "stats.json"), project["stats"])
-			for issue in project["issues"].values():
-				self.write_json_to_file(os.path.join(rootfolder, "issues", str(issue["id"]) + ".json"), issue)
-			for issue_comment in project["issueComments"].values():
-				self.write_json_to_file(os.path.join(rootfolder, "issueComments", str(issue_comment["id"]) + ".json"), issue_comment)
-			for issue_event in project["issueEvents"].values():
-				self.write_json_to_file(os.path.join(rootfolder, "issueEvents", str(issue_event["id"]) + ".json"), issue_event)
-			for commit in project["commits"].values():
-				self.write_json_to_file(os.path.join(rootfolder, "commits", str(commit["sha"]) + ".json"), commit)
-			for commit_comment in project["commitComments"].values():
-				self.write_json_to_file(os.path.join(rootfolder, "commitComments", str(commit_comment["id"]) + ".json"), commit_comment)
-			for contributor in project["contributors"].values():
-				self.write_json_to_file(os.path.join(rootfolder, "contributors", str(contributor["id"]) + ".json"), contributor)
+			if project["stats"]:
+				self.write_json_to_file(os.path.join(rootfolder, "stats.json"), project["stats"])
+			if project["highwatermarks"]:
+				self.write_json_to_file(os.path.join(rootfolder, "highwatermarks.json"), project["highwatermarks"])
+			if project["checkpoints"]:
+				self.write_json_to_file(os.path.join(rootfolder, "checkpoints.json"), project["checkpoints"])
 
 	def write_project_info_to_disk(self, repo_name, info):
 		"""
@@ -108,6 +208,34 @@ class DBManager(FileManager):
 			rootfolder = os.path.join(dataFolderPath, repo_name)
 			self.write_json_to_file(os.path.join(rootfolder, "stats.json"), stats)
 
+	def write_project_high_water_marks_to_disk(self, repo_name, info, highwatermarks):  # @UnusedVariable
+		"""
+		Writes the high water marks of the sections of a repository to disk. Any pending writes are
+		finished first, so that the high water marks never precede the written objects.
+
+		:param repo_name: the name of the repository.
+		:param info: the info of the project.
+		:param highwatermarks: the high water marks to be written to disk.
+		"""
+		if always_write_to_disk:
+			self.wait_for_pending_writes()
+			rootfolder = os.path.join(dataFolderPath, repo_name)
+			self.write_json_to_file(os.path.join(rootfolder, "highwatermarks.json"), highwatermarks)
+
+	def write_project_checkpoints_to_disk(self, repo_name, info, checkpoints):  # @UnusedVariable
+		"""
+		Writes the checkpoints of a repository to disk. Any pending writes are finished first, so that the
+		checkpoints never precede the written objects.
+
+		:param repo_name: the name of the repository.
+		:param info: the info of the project.
+		:param checkpoints: the checkpoints to be written to disk.
+		"""
+		if always_write_to_disk:
+			self.wait_for_pending_writes()
+			rootfolder = os.path.join(dataFolderPath, repo_name)
+			self.write_json_to_file(os.path.join(rootfolder, "checkpoints.json"), checkpoints)
+
 	def write_project_issue_to_disk(self, repo_name, issue):
 		"""
 		Writes an issue of a repository to disk.
@@ -117,7 +245,7 @@ class DBManager(FileManager):
 		"""
 		if always_write_to_disk:
 			rootfolder = os.path.join(dataFolderPath, repo_name)
-			self.write_json_to_file(os.path.join(rootfolder, "issues", str(issue["id"]) + ".json"), issue)
+			self.write_json_to_file_in_background(os.path.join(rootfolder, "issues", str(issue["id"]) + ".json"), issue)
 
 	def write_project_issue_comment_to_disk(self, repo_name, issue_comment):
 		"""
@@ -128,7 +256,7 @@ class DBManager(FileManager):
 		"""
 		if always_write_to_disk:
 			rootfolder = os.path.join(dataFolderPath, repo_name)
-			self.write_json_to_file(os.path.join(rootfolder, "issueComments", str(issue_comment["id"]) + ".json"), issue_comment)
+			self.write_json_to_file_in_background(os.path.join(rootfolder, "issueComments", str(issue_comment["id"]) + ".json"), issue_comment)
 
 	def write_project_issue_event_to_disk(self, repo_name, issue_event):
 		"""
@@ -139,7 +267,7 @@ class DBManager(FileManager):
 		"""
 		if always_write_to_disk:
 			rootfolder = os.path.join(dataFolderPath, repo_name)
-			self.write_json_to_file(os.path.join(rootfolder, "issueEvents", str(issue_event["id"]) + ".json"), issue_event)
+			self.write_json_to_file_in_background(os.path.join(rootfolder, "issueEvents", str(issue_event["id"]) + ".json"), issue_event)
 
 	def write_project_commit_to_disk(self, repo_name, commit):
 		"""
@@ -150,7 +278,7 @@ class DBManager(FileManager):
 		"""
 		if always_write_to_disk:
 			rootfolder = os.path.join(dataFolderPath, repo_name)
-			self.write_json_to_file(os.path.join(rootfolder, "commits", str(commit["sha"]) + ".json"), commit)
+			self.write_json_to_file_in_background(os.path.join(rootfolder, "commits", str(commit["sha"]) + ".json"), commit)
 
 	def write_project_commit_comment_to_disk(self, repo_name, commit_comment):
 		"""
@@ -161,7 +289,7 @@ class DBManager(FileManager):
 		"""
 		if always_write_to_disk:
 			rootfolder = os.path.join(dataFolderPath, repo_name)
-			self.write_json_to_file(os.path.join(rootfolder, "commitComments", str(commit_comment["id"]) + ".json"), commit_comment)
+			self.write_json_to_file_in_background(os.path.join(rootfolder, "commitComments", str(commit_comment["id"]) + ".json"), commit_comment)
 
 	def write_project_contributor_to_disk(self, repo_name, contributor):
 		"""
@@ -172,5 +300,5 @@ class DBManager(FileManager):
 		"""
 		if always_write_to_disk:
 			rootfolder = os.path.join(dataFolderPath, repo_name)
-			self.write_json_to_file(os.path.join(rootfolder, "contributors", str(contributor["id"]) + ".json"), contributor)
+			self.write_json_to_file_in_background(os.path.join(rootfolder, "contributors", str(contributor["id"]) + ".json"), contributor)
 
@@ -1,6 +1,8 @@
 import os
-import json
-import codecs
+import metrics
+import jsoncodec
+from concurrent.futures import ThreadPoolExecutor
+from properties import compact_json_files, num_file_reader_threads
 
 class FileManager:
 	"""
@@ -26,22 +28,159 @@ class FileManager:
 		"""
 		return self.read_json_from_file(filename) if os.path.exists(filename) else {}
 
-	def read_jsons_from_folder(self, foldername, element_id):
+	def list_json_files_of_folder(self, foldername):
+		"""
+		Lists the JSON files of a folder.
+
+		:param foldername: the path to the folder.
+		:returns: a list containing the names of the JSON files of the folder.
+		"""
+		with os.scandir(foldername) as entries:
+			return [entry.name for entry in entries if entry.name.endswith(".json") and entry.is_file()]
+
+	def quarantine_file(self, filename, quarantinefolder = None):
+		"""
+		Moves a file that cannot be read to the quarantine folder, which is next to the folder of the file
+		(e.g. the file data/repo/issues/1.json is moved to data/repo/quarantine/issues/1.json).
+
+		:param filename: the path to the file to be moved.
+		:param quarantinefolder: the path to the quarantine folder, or None to use the one next to the folder of the file.
+		:returns: the new path to the file, or None if the file could not be moved.
+		"""
+		if quarantinefolder == None:
+			foldername = os.path.dirname(filename)
+			quarantinefolder = os.path.join(os.path.dirname(foldername), "quarantine", os.path.basename(foldername))
+		quarantinefilename = os.path.join(quarantinefolder, os.path.basename(filename))
+		try:
+			self.create_folder_if_it_does_not_exist(quarantinefolder)
+			os.replace(filename, quarantinefilename)
+		except OSError:
+			return None
+		return quarantinefilename
+
+	def read_jsons_from_files(self, filenames, element_id = None, quarantined = None):
+		"""
+		Reads multiple files into JSON objects using num_file_reader_threads threads. Any file that cannot
+		be read or parsed, or of which the JSON object does not have the element_id field, is moved to the
+		quarantine folder instead of raising an exception.
+
+		:param filenames: the paths to the files to be read.
+		:param element_id: the JSON key that each JSON object must have, or None to accept any JSON object.
+		:param quarantined: a list where the paths to the quarantined files are appended, or None.
+		:returns: a generator containing the JSON objects of the files that were parsed.
+		"""
+		def read_json_from_file_or_none(filename):
+			try:
+				element = self.read_json_from_file(filename)
+				if element_id != None and element_id not in element:
+					raise KeyError(element_id)
+				return element
+			except (ValueError, OSError, KeyError, TypeError):
+				return None
+		with ThreadPoolExecutor(max_workers = max(num_file_reader_threads, 1)) as executor:
+			for filename, element in zip(filenames, executor.map(read_json_from_file_or_none, filenames)):
+				if element == None:
+					quarantinefilename = self.quarantine_file(filename)
+					if quarantined != None and quarantinefilename != None:
+						quarantined.append(quarantinefilename)
+				else:
+					yield element
+
+	def read_jsons_from_folder(self, foldername, element_id, quarantined = None):
 		"""
 		Reads the files of a folder into a dict of JSON objects. Given that a file
 		has a JSON object e.g. element, the returned dict has as key the element_id
 		field of the element (element[element_id]) and as value the element itself.
+		Any file that cannot be read or parsed is moved to the quarantine folder.
 
 		:param foldername: the path to the folder from where JSON objects are read.
 		:param element_id: the JSON key to be used as a key to the returned dict.
+		:param quarantined: a list where the paths to the quarantined files are appended, or None.
 		:returns: a dict containing the JSON objects that are contained in the folder.
 		"""
 		data = {}
-		for filename in os.listdir(foldername):
-			element = self.read_json_from_file(os.path.join(foldername, filename))
+		filenames = [os.path.join(foldername, filename) for filename in self.list_json_files_of_folder(foldername)]
+		for element in self.read_jsons_from_files(filenames, element_id, quarantined):
 			data[element[element_id]] = element
 		return data
 
+	def read_json_index_from_folder(self, foldername, element_id, full_field = None, quarantined = None):
+		"""
+		Reads the keys of the JSON objects of a folder, without keeping the objects in memory. If
+		full_field is None, the keys are derived from the filenames (i.e. each file is named after
+		the element_id field of its element) and the files are not read, so a corrupt file is only
+		detected when its element is accessed. Otherwise, the files are read to check whether each
+		element includes the full_field, and any file that cannot be read or parsed, or of which the
+		element does not have the element_id field, is moved to the quarantine folder.
+
+		:param foldername: the path to the folder from where JSON objects are read.
+		:param element_id: the JSON key to be used as a key to the returned dict.
+		:param full_field: the JSON key that indicates whether an element is full, or None.
+		:param quarantined: a list where the paths to the quarantined files are appended, or None.
+		:returns: a dict with the keys of the elements as keys and booleans indicating whether each element is full as values.
+		"""
+		data = {}
+		if full_field == None:
+			for filename in self.list_json_files_of_folder(foldername):
+				key = filename[:-len(".json")]
+				data[int(key) if key.isdigit() else key] = True
+		else:
+			filenames = [os.path.join(foldername, filename) for filename in self.list_json_files_of_folder(foldername)]
+			for element in self.read_jsons_from_files(filenames, element_id, quarantined):
+				data[element[element_id]] = full_field in element
+		return data
+
+	def folder_snapshot_filename(self, foldername):
+		"""
+		Returns the filename of the snapshot of the index of a folder.
+
+		:param foldername: the path to the folder.
+		:returns: the path to the snapshot file, which is next to the folder (e.g. data/repo/issues.snapshot.json).
+		"""
+		return foldername.rstrip(os.sep) + ".snapshot.json"
+
+	def read_folder_snapshot(self, foldername, quarantined = None):
+		"""
+		Reads the snapshot of the index of a folder. The snapshot is valid only if the folder has not
+		changed since the snapshot was written, i.e. if it has the same modification time and number
+		of JSON files. A snapshot that cannot be read or parsed is moved to the quarantine folder of
+		the repository (e.g. data/repo/quarantine/issues.snapshot.json).
+
+		:param foldername: the path to the folder.
+		:param quarantined: a list where the paths to the quarantined files are appended, or None.
+		:returns: a dict with the keys of the elements as keys and booleans indicating whether each element
+		is full as values, or None if the snapshot does not exist or is not valid.
+		"""
+		filename = self.folder_snapshot_filename(foldername)
+		if not os.path.exists(filename):
+			return None
+		try:
+			snapshot = self.read_json_from_file(filename)
+			mtime, count, index = snapshot["mtime"], snapshot["count"], {key: is_full for key, is_full in snapshot["index"]}
+		except (ValueError, OSError, KeyError, TypeError):
+			quarantinefilename = self.quarantine_file(filename, os.path.join(os.path.dirname(filename), "quarantine"))
+			if quarantined != None and quarantinefilename != None:
+				quarantined.append(quarantinefilename)
+			return None
+		if mtime != os.stat(foldername).st_mtime_ns or count != len(self.list_json_files_of_folder(foldername)):
+			return None
+		return index
+
+	def write_folder_snapshot(self, foldername, index):
+		"""
+		Writes a snapshot of the index of a folder, so that the index can be read later without reading
+		the files of the folder.
+
+		:param foldername: the path to the folder.
+		:param index: a dict with the keys of the elements as keys and booleans indicating whether each element is full as values.
+		"""
+		snapshot = {"mtime": os.stat(foldername).st_mtime_ns, "count": len(self.list_json_files_of_folder(foldername)), \
+					"index": [[key, is_full] for key, is_full in index.items()]}
+		filename = self.folder_snapshot_filename(foldername)
+		with open(filename + ".tmp", 'wb') as outfile:
+			outfile.write(jsoncodec.dumpb(snapshot))
+		os.replace(filename + ".tmp", filename)
+
 	def read_json_from_file(self, filename):
 		"""
 		Reads a file into a JSON object.
@@ -49,17 +188,23 @@ class FileManager:
 		:param filename: the filename of the file to be read.
 		:returns: the JSON object that is contained in the file.
 		"""
-		with codecs.open(filename, 'r', 'utf-8') as infile:
-			data = json.load(infile)
+		with open(filename, 'rb') as infile:
+			data = jsoncodec.loads(infile.read())
 		return data
 
 	def write_json_to_file(self, filename, data):
 		"""
-		Writes a JSON object to file.
+		Writes a JSON object to file. The object is written to a temporary file that is then renamed,
+		so that an interrupted write does not leave a truncated file. If compact_json_files is True,
+		the object is written without indentation.
 		
 		:param filename: the filename of the file to be written.
 		:param data: the JSON data to be written to file.
 		"""
-		with codecs.open(filename, 'w', 'utf-8') as outfile:
-			json.dump(data, fp = outfile, sort_keys = True, indent = 3, ensure_ascii = False)
+		with metrics.timer("json_encode_seconds"):
+			content = jsoncodec.dumpb(data, indent = None if compact_json_files else 3, sort_keys = True)
+		with metrics.timer("write_latency_seconds", {"backend": "disk"}):
+			with open(filename + ".tmp", 'wb') as outfile:
+				outfile.write(content)
+			os.replace(filename + ".tmp", filename)
 
@@ -0,0 +1,523 @@
+import os
+import gzip
+import zlib
+import threading
+import metrics
+import jsoncodec
+from datamanager.project import Project
+from datamanager.objectindex import ObjectIndex
+from datamanager.filemanager import FileManager
+from properties import dataFolderPath, always_write_to_disk, compress_jsonl_segments
+
+class JSONLinesDBManager(FileManager):
+	"""
+	Class that implements a DB manager that stores each type of data of a project (issues, issue comments,
+	issue events, commits, commit comments, and contributors) in a single append-only JSON Lines segment,
+	optionally compressed as a sequence of gzip members (one per record). Next to each segment, an index
+	file keeps the key of each record together with its position in the segment and whether it is full,
+	so that records that are written again supersede the older ones and projects can be read without
+	reading the records themselves. The info, the stats and the high water marks of a project
+	are written as JSON files, as in DBManager. To use this class, you must first call the method
+	initialize_write_to_disk, then optionally call any other method for writing data to disk, and finally
+	call the method finalize_write_to_disk.
+	"""
+	segments = Project.key_fields
+
+	def __init__(self):
+		"""
+		Initializes this DB manager.
+		"""
+		self.create_folder_if_it_does_not_exist(dataFolderPath)
+		self.lock = threading.Lock()
+		self.segment_files = {}
+		self.index_files = {}
+		self.indexes = {}
+		self.num_records = {}
+
+	def segment_filename(self, repo_name, segment):
+		"""
+		Returns the filename of a segment. If the segment already exists, its filename is returned regardless
+		of the value of compress_jsonl_segments.
+
+		:param repo_name: the name of the repository.
+		:param segment: the name of the segment (e.g. issues).
+		:returns: the path to the segment file.
+		"""
+		filename = os.path.join(dataFolderPath, repo_name, segment + ".jsonl")
+		if os.path.exists(filename + ".gz") or (compress_jsonl_segments and not os.path.exists(filename)):
+			return filename + ".gz"
+		return filename
+
+	def index_filename(self, repo_name, segment):
+		"""
+		Returns the filename of the index of a segment.
+
+		:param repo_name: the name of the repository.
+		:param segment: the name of the segment (e.g. issues).
+		:returns: the path to the index file.
+		"""
+		return os.path.join(dataFolderPath, repo_name, segment + ".idx")
+
+	def encode_record(self, obj, compressed):
+		"""
+		Encodes an object as a record of a segment.
+
+		:param obj: the object to be encoded.
+		:param compressed: boolean indicating whether the segment is compressed.
+		:returns: the record as bytes.
+		"""
+		record = jsoncodec.dumpb(obj) + b"\n"
+		return gzip.compress(record) if compressed else record
+
+	def decode_record(self, record, compressed):
+		"""
+		Decodes a record of a segment into an object.
+
+		:param record: the record as bytes.
+		:param compressed: boolean indicating whether the segment is compressed.
+		:returns: the object of the record.
+		"""
+		return jsoncodec.loads(gzip.decompress(record) if compressed else record)
+
+	def index_entry(self, segment, obj, offset, length):
+		"""
+		Returns the entry of the index of a segment for a record.
+
+		:param segment: the name of the segment (e.g. issues).
+		:param obj: the object of the record.
+		:param offset: the offset of the record in the segment.
+		:param length: the length of the record in bytes.
+		:returns: a list containing the key, the offset, the length of the record, and whether it is full.
+		"""
+		full_field = Project.full_fields.get(segment)
+		return [obj[self.segments[segment]], offset, length, full_field == None or full_field in obj]
+
+	def scan_segment(self, filename):
+		"""
+		Reads all the records of a segment. A record that is not complete (e.g. due to an interrupted
+		write) ends the scan. The records of compressed segments are found by streaming the segment through
+		one decompressor per gzip member, which is fed with windows of the read buffer, so that only the
+		unconsumed tail of a window is copied at the end of each member.
+
+		:param filename: the path to the segment file.
+		:returns: a generator containing tuples with the offset, the length and the bytes of each record.
+		"""
+		if not os.path.exists(filename):
+			return
+		with open(filename, 'rb') as infile:
+			if not filename.endswith(".gz"):
+				offset = 0
+				for line in infile:
+					if not line.endswith(b"\n"):
+						return
+					yield offset, len(line), line
+					offset += len(line)
+				return
+			offset = 0
+			parts = []
+			decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+			while True:
+				chunk = memoryview(infile.read(1 << 20))
+				if not chunk:
+					return
+				position = 0
+				while position < len(chunk):
+					window = chunk[position:position + (1 << 14)]
+					try:
+						decompressor.decompress(window)
+					except zlib.error:
+						return
+					used = len(window) - len(decompressor.unused_data)
+					parts.append(bytes(window[:used]))
+					position += used
+					if decompressor.eof:
+						record = b"".join(parts)
+						yield offset, len(record), record
+						offset += len(record)
+						parts = []
+						decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+
+	def read_index(self, repo_name, segment):
+		"""
+		Reads the index of a segment. If the index does not exist or does not match the segment (e.g. due to
+		an interrupted write), then it is rebuilt by scanning the segment, any incomplete record at the end
+		of the segment is removed, and the rebuilt index is written to disk.
+
+		:param repo_name: the name of the repository.
+		:param segment: the name of the segment (e.g. issues).
+		:returns: a tuple containing a dict with the keys of the records as keys and tuples with their offset,
+		their length and whether they are full as values, and the number of records of the segment.
+		"""
+		filename = self.segment_filename(repo_name, segment)
+		indexfilename = self.index_filename(repo_name, segment)
+		segmentsize = os.path.getsize(filename) if os.path.exists(filename) else 0
+		index = {}
+		num_records = 0
+		end = 0
+		if os.path.exists(indexfilename):
+			with open(indexfilename, 'r', encoding = 'utf-8') as infile:
+				try:
+					for line in infile:
+						key, offset, length, is_full = jsoncodec.loads(line)
+						index[key] = (offset, length, is_full)
+						num_records += 1
+						end = offset + length
+				except ValueError:
+					end = -1
+		if end == segmentsize:
+			return index, num_records
+		index = {}
+		num_records = 0
+		end = 0
+		compressed = filename.endswith(".gz")
+		with open(indexfilename, 'w', encoding = 'utf-8') as outfile:
+			for offset, length, record in self.scan_segment(filename):
+				key, offset, length, is_full = self.index_entry(segment, self.decode_record(record, compressed), offset, length)
+				index[key] = (offset, length, is_full)
+				num_records += 1
+				end = offset + length
+				outfile.write(jsoncodec.dumps([key, offset, length, is_full]) + "\n")
+		if end != segmentsize:
+			with open(filename, 'r+b') as segmentfile:
+				segmentfile.truncate(end)
+		return index, num_records
+
+	def read_record(self, filename, position):
+		"""
+		Reads a single record of a segment given its position.
+
+		:param filename: the path to the segment file.
+		:param position: a tuple containing the offset and the length of the record, as given by the index.
+		:returns: the object of the record.
+		"""
+		with open(filename, 'rb') as infile:
+			infile.seek(position[0])
+			return self.decode_record(infile.read(position[1]), filename.endswith(".gz"))
+
+	def read_segment(self, repo_name, segment):
+		"""
+		Reads the objects of a segment one by one, without keeping them in memory. Only the last record of
+		each key is returned.
+
+		:param repo_name: the name of the repository.
+		:param segment: the name of the segment (e.g. issues).
+		:returns: a generator containing the objects of the segment.
+		"""
+		filename = self.segment_filename(repo_name, segment)
+		compressed = filename.endswith(".gz")
+		index, _ = self.read_index(repo_name, segment)
+		for offset, _, record in self.scan_segment(filename):
+			obj = self.decode_record(record, compressed)
+			if index.get(obj[self.segments[segment]], (None, ))[0] == offset:
+				yield obj
+
+	def write_segment(self, repo_name, segment, objects):
+		"""
+		Writes a segment and its index from scratch. The segment and the index are written to temporary
+		files that are then renamed, so that an interrupted write does not affect the existing segment.
+
+		:param repo_name: the name of the repository.
+		:param segment: the name of the segment (e.g. issues).
+		:param objects: an iterable containing the objects of the segment.
+		:returns: the index of the written segment.
+		"""
+		filename = self.segment_filename(repo_name, segment)
+		indexfilename = self.index_filename(repo_name, segment)
+		compressed = filename.endswith(".gz")
+		index = {}
+		offset = 0
+		with open(filename + ".tmp", 'wb') as outfile, open(indexfilename + ".tmp", 'w', encoding = 'utf-8') as indexfile:
+			for obj in objects:
+				record = self.encode_record(obj, compressed)
+				outfile.write(record)
+				key, offset, length, is_full = self.index_entry(segment, obj, offset, len(record))
+				indexfile.write(jsoncodec.dumps([key, offset, length, is_full]) + "\n")
+				index[key] = (offset, length, is_full)
+				offset += len(record)
+		os.replace(filename + ".tmp", filename)
+		os.replace(indexfilename + ".tmp", indexfilename)
+		return index
+
+	def compact_segment(self, repo_name, segment):
+		"""
+		Compacts a segment by removing the records that are superseded by newer records of the same key. The
+		current records are streamed from the segment into the new segment file.
+
+		:param repo_name: the name of the repository.
+		:param segment: the name of the segment (e.g. issues).
+		:returns: the index of the compacted segment.
+		"""
+		return self.write_segment(repo_name, segment, self.read_segment(repo_name, segment))
+
+	def compact_project(self, repo_name):
+		"""
+		Compacts all the segments of a project.
+
+		:param repo_name: the name of the repository.
+		"""
+		for segment in self.segments:
+			self.compact_segment(repo_name, segment)
+
+	def append_record(self, segment, obj):
+		"""
+		Appends an object to a segment of the project that is currently written and updates the index.
+
+		:param segment: the name of the segment (e.g. issues).
+		:param obj: the object to be appended.
+		"""
+		with self.lock, metrics.timer("write_latency_seconds", {"backend": "jsonl"}):
+			segmentfile = self.segment_files[segment]
+			with metrics.timer("json_encode_seconds"):
+				record = self.encode_record(obj, segmentfile.name.endswith(".gz"))
+			offset = segmentfile.tell()
+			segmentfile.write(record)
+			segmentfile.flush()
+			key, offset, length, is_full = self.index_entry(segment, obj, offset, len(record))
+			self.index_files[segment].write(jsoncodec.dumps([key, offset, length, is_full]) + "\n")
+			self.index_files[segment].flush()
+			self.indexes[segment][key] = (offset, length, is_full)
+			self.num_records[segment] += 1
+
+	def append_records(self, repo_name, segment, objects):
+		"""
+		Appends multiple objects to a segment of a project, opening the segment if it is not open. This
+		function is used when always_write_to_disk is False to write the objects that are buffered in
+		the project.
+
+		:param repo_name: the name of the repository.
+		:param segment: the name of the segment (e.g. issues).
+		:param objects: the objects to be appended.
+		"""
+		if segment not in self.segment_files:
+			self.open_segment(repo_name, segment)
+		for obj in objects:
+			self.append_record(segment, obj)
+
+	def open_segment(self, repo_name, segment):
+		"""
+		Opens a segment of a project and its index for appending.
+
+		:param repo_name: the name of the repository.
+		:param segment: the name of the segment (e.g. issues).
+		"""
+		if segment not in self.indexes:
+			self.indexes[segment], self.num_records[segment] = self.read_index(repo_name, segment)
+		self.segment_files[segment] = open(self.segment_filename(repo_name, segment), 'ab')
+		self.index_files[segment] = open(self.index_filename(repo_name, segment), 'a', encoding = 'utf-8')
+
+	def close_segment(self, repo_name, segment):
+		"""
+		Closes a segment of a project and its index, and compacts the segment if the superseded records
+		are more than the current ones.
+
+		:param repo_name: the name of the repository.
+		:param segment: the name of the segment (e.g. issues).
+		"""
+		self.segment_files.pop(segment).close()
+		self.index_files.pop(segment).close()
+		if self.num_records[segment] > 2 * len(self.indexes[segment]):
+			self.indexes[segment].update(self.compact_segment(repo_name, segment))
+
+	def initialize_write_to_disk(self, repo_name):
+		"""
+		Initializes the writing of a project to disk. Creates all the necessary directories and, if
+		always_write_to_disk is True, opens the segments of the project for appending.
+
+		:param repo_name: the name of the repository to be written to disk.
+		"""
+		rootfolder = os.path.join(dataFolderPath, repo_name)
+		self.create_folder_if_it_does_not_exist(rootfolder)
+		self.create_folder_if_it_does_not_exist(os.path.join(rootfolder, "sourcecode"))
+		if always_write_to_disk:
+			for segment in self.segments:
+				self.open_segment(repo_name, segment)
+
+	def read_project_from_disk(self, repo_name):
+		"""
+		Reads a project from disk given the name of the repository that is also the folder
+		of the project. Only the indexes of the segments are read, while the records are read
+		from the segments only when they are accessed.
+
+		:param repo_name: the name of the repository to be read from disk.
+		:returns: an object of type Project.
+		"""
+		project = Project()
+		rootfolder = os.path.join(dataFolderPath, repo_name)
+		project["info"] = self.read_json_from_file_if_it_exists(os.path.join(rootfolder, "info.json"))
+		project["stats"] = self.read_json_from_file_if_it_exists(os.path.join(rootfolder, "stats.json"))
+		project["highwatermarks"] = self.read_json_from_file_if_it_exists(os.path.join(rootfolder, "highwatermarks.json"))
+		project["checkpoints"] = self.read_json_from_file_if_it_exists(os.path.join(rootfolder, "checkpoints.json"))
+		for segment in self.segments:
+			project[segment] = self.read_object_index(repo_name, segment)
+		return project
+
+	def read_object_index(self, repo_name, segment):
+		"""
+		Reads the index of a segment of a project as an object index. The index is shared with the
+		methods that append records, so that appended records are read from their current position.
+
+		:param repo_name: the name of the repository.
+		:param segment: the name of the segment (e.g. issues).
+		:returns: an object of type ObjectIndex.
+		"""
+		if segment not in self.indexes:
+			self.indexes[segment], self.num_records[segment] = self.read_index(repo_name, segment)
+		index = self.indexes[segment]
+		filename = self.segment_filename(repo_name, segment)
+		objectindex = ObjectIndex(Project.full_fields.get(segment), lambda key: self.read_record(filename, index[key]), \
+								None if always_write_to_disk else lambda objects: self.append_records(repo_name, segment, objects))
+		for key, (_, _, is_full) in index.items():
+			objectindex.add_key(key, is_full)
+		return objectindex
+
+	def read_project_checkpoints(self, repo_name):
+		"""
+		Reads the checkpoints of a project from disk, without reading the rest of the project.
+
+		:param repo_name: the name of the repository.
+		:returns: the checkpoints of the project, or an empty object if the project has no checkpoints.
+		"""
+		return self.read_json_from_file_if_it_exists(os.path.join(dataFolderPath, repo_name, "checkpoints.json"))
+
+	def project_exists(self, repo_name):
+		"""
+		Check if a project exists in the disk given the name of the repository that is also the folder
+		of the project. The existence of the project is determined by whether it has an info.json file.
+
+		:param repo_name: the name of the repository to be read from disk.
+		:returns: True if the project exists, or False otherwise.
+		"""
+		return os.path.exists(os.path.join(dataFolderPath, repo_name, "info.json"))
+
+	def finalize_write_to_disk(self, repo_name, project):
+		"""
+		Finalizes the writing of a project to disk. Closes the segments of the project and compacts the
+		segments where the superseded records are more than the current ones. If always_write_to_disk is
+		False, then the objects that are still buffered in the project are first appended to its segments,
+		and then its info, stats, high water marks, and checkpoints are written.
+
+		:param repo_name: the name of the repository to be written to disk.
+		:param project: the repository data to be written to disk.
+		"""
+		if not always_write_to_disk:
+			for segment in self.segments:
+				project[segment].flush()
+			rootfolder = os.path.join(dataFolderPath, repo_name)
+			self.write_json_to_file(os.path.join(rootfolder, "info.json"), project["info"])
+			if project["stats"]:
+				self.write_json_to_file(os.path.join(rootfolder, "stats.json"), project["stats"])
+			if project["highwatermarks"]:
+				self.write_json_to_file(os.path.join(rootfolder, "highwatermarks.json"), project["highwatermarks"])
+			if project["checkpoints"]:
+				self.write_json_to_file(os.path.join(rootfolder, "checkpoints.json"), project["checkpoints"])
+		for segment in list(self.segment_files):
+			self.close_segment(repo_name, segment)
+		self.indexes = {}
+		self.num_records = {}
+
+	def write_project_info_to_disk(self, repo_name, info):
+		"""
+		Writes the info of a repository to disk.
+
+		:param repo_name: the name of the repository.
+		:param info: the info to be written to disk.
+		"""
+		if always_write_to_disk:
+			rootfolder = os.path.join(dataFolderPath, repo_name)
+			self.write_json_to_file(os.path.join(rootfolder, "info.json"), info)
+
+	def write_project_stats_to_disk(self, repo_name, info, stats):  # @UnusedVariable
+		"""
+		Writes the stats of a repository to disk.
+
+		:param repo_name: the name of the repository.
+		:param info: the info of the project.
+		:param stats: the stats to be written to disk.
+		"""
+		if always_write_to_disk:
+			rootfolder = os.path.join(dataFolderPath, repo_name)
+			self.write_json_to_file(os.path.join(rootfolder, "stats.json"), stats)
+
+	def write_project_high_water_marks_to_disk(self, repo_name, info, highwatermarks):  # @UnusedVariable
+		"""
+		Writes the high water marks of the sections of a repository to disk.
+
+		:param repo_name: the name of the repository.
+		:param info: the info of the project.
+		:param highwatermarks: the high water marks to be written to disk.
+		"""
+		if always_write_to_disk:
+			rootfolder = os.path.join(dataFolderPath, repo_name)
+			self.write_json_to_file(os.path.join(rootfolder, "highwatermarks.json"), highwatermarks)
+
+	def write_project_checkpoints_to_disk(self, repo_name, info, checkpoints):  # @UnusedVariable
+		"""
+		Writes the checkpoints of a repository to disk.
+
+		:param repo_name: the name of the repository.
+		:param info: the info of the project.
+		:param checkpoints: the checkpoints to be written to disk.
+		"""
+		if always_write_to_disk:
+			rootfolder = os.path.join(dataFolderPath, repo_name)
+			self.write_json_to_file(os.path.join(rootfolder, "checkpoints.json"), checkpoints)
+
+	def write_project_issue_to_disk(self, repo_name, issue):  # @UnusedVariable
+		"""
+		Writes an issue of a repository to disk.
+
+		:param repo_name: the name of the repository.
+		:param issue: the issue to be written to disk.
+		"""
+		if always_write_to_disk:
+			self.append_record("issues", issue)
+
+	def write_project_issue_comment_to_disk(self, repo_name, issue_comment):  # @UnusedVariable
+		"""
+		Writes an issue comment of a repository to disk.
+
+		:param repo_name: the name of the repository.
+		:param issue_comment: the issue comment to be written to disk.
+		"""
+		if always_write_to_disk:
+			self.append_record("issueComments", issue_comment)
+
+	def write_project_issue_event_to_disk(self, repo_name, issue_event):  # @UnusedVariable
+		"""
+		Writes an issue event of a repository to disk.
+
+		:param repo_name: the name of the repository.
+		:param issue_event: the issue event to be written to disk.
+		"""
+		if always_write_to_disk:
+			self.append_record("issueEvents", issue_event)
+
+	def write_project_commit_to_disk(self, repo_name, commit):  # @UnusedVariable
+		"""
+		Writes a commit of a repository to disk.
+
+		:param repo_name: the name of the repository.
+		:param commit: the commit to be written to disk.
+		"""
+		if always_write_to_disk:
+			self.append_record("commits", commit)
+
+	def write_project_commit_comment_to_disk(self, repo_name, commit_comment):  # @UnusedVariable
+		"""
+		Writes a commit comment of a repository to disk.
+
+		:param repo_name: the name of the repository.
+		:param commit_comment: the commit comment to be written to disk.
+		"""
+		if always_write_to_disk:
+			self.append_record("commitComments", commit_comment)
+
+	def write_project_contributor_to_disk(self, repo_name, contributor):  # @UnusedVariable
+		"""
+		Writes a contributor of a repository to disk.
+
+		:param repo_name: the name of the repository.
+		:param contributor: the contributor to be written to disk.
+		"""
+		if always_write_to_disk:
+			self.append_record("contributors", contributor)
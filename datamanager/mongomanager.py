@@ -1,6 +1,7 @@
 import os
 import pymongo
 from datamanager.project import Project
+from datamanager.objectindex import ObjectIndex
 from datamanager.filemanager import FileManager
 from datamanager.databasemanager import DatabaseManager
 from properties import dataFolderPath, always_write_to_disk, database_host_and_port, \
@@ -12,23 +13,51 @@ class MongoDBManager(DatabaseManager, FileManager):
 	initialize_write_to_disk, then optionally call any other method for writing data to
 	disk, and finally call the method finalize_write_to_disk.
 	"""
-	def __init__(self):
+	def __init__(self, client = None):
 		"""
-		Initializes this DB manager.
+		Initializes this DB manager. If a client is given, it is shared with the DB manager that
+		created it, so that no new connections are opened and the indexes are not created again.
+
+		:param client: an object of type MongoClient that is shared, or None to create a new one.
 		"""
-		self.client = pymongo.MongoClient(database_host_and_port)
+		self.client = pymongo.MongoClient(database_host_and_port) if client == None else client
 		self.db = self.client["gddata"]
 		self.projects = self.db["projects"]
 		self.stats = self.db["stats"]
+		self.highwatermarks = self.db["highWaterMarks"]
+		self.checkpoints = self.db["checkpoints"]
 		self.issues = self.db["issues"]
 		self.issueComments = self.db["issueComments"]
 		self.issueEvents = self.db["issueEvents"]
 		self.commits = self.db["commits"]
 		self.commitComments = self.db["commitComments"]
 		self.contributors = self.db["contributors"]
+		self.initialize_buffers()
+		if client == None:
+			self.create_indexes()
 		if download_source_code:
 			self.create_folder_if_it_does_not_exist(dataFolderPath)  # this is required for downloading source code
 
+	def create_indexes(self):
+		"""
+		Creates the indexes of the collections (if they do not exist). All collections are indexed by
+		repo_name, and the collections of the objects of projects are also indexed by repo_name and key,
+		so that the keys of a project are read from the indexes. The collections of issues and commits
+		also have a partial index by repo_name and key that includes only the full objects (i.e. the
+		ones that have the field that indicates whether an object is full), so that the keys of the
+		full objects are also read from an index.
+		"""
+		self.projects.create_index("repo_name")
+		self.stats.create_index("repo_name")
+		self.highwatermarks.create_index("repo_name")
+		self.checkpoints.create_index("repo_name")
+		for name, key_field in Project.key_fields.items():
+			self.db[name].create_index([("repo_name", pymongo.ASCENDING), (key_field, pymongo.ASCENDING)])
+		for name, full_field in Project.full_fields.items():
+			key_field = Project.key_fields[name]
+			self.db[name].create_index([("repo_name", pymongo.ASCENDING), (key_field, pymongo.ASCENDING)], \
+									name = "repo_name_1_%s_1_full" % key_field, partialFilterExpression = {full_field: {"$exists": True}})
+
 	def initialize_write_to_disk(self, repo_name):
 		"""
 		Initializes the writing of a project to disk. In the case of MongoDB, it creates only a directory
@@ -43,7 +72,8 @@ class MongoDBManager(DatabaseManager, FileManager):
 
 	def read_project_from_disk(self, repo_name):
 		"""
-		Reads a project from disk given the name of the repository.
+		Reads a project from disk given the name of the repository. Only the keys of the documents
+		are read, while the documents themselves are read only when they are accessed.
 
 		:param repo_name: the name of the repository to be read from disk.
 		:returns: an object of type Project.
@@ -51,14 +81,65 @@ class MongoDBManager(DatabaseManager, FileManager):
 		project = Project()
 		project["info"] = self.projects.find_one({"repo_name": repo_name})
 		project["stats"] = self.stats.find_one({"repo_name": repo_name})
-		project["issues"] = {obj["_id"]: obj for obj in self.issues.find({"repo_name": repo_name})}
-		project["issueComments"] = {obj["_id"]: obj for obj in self.issueComments.find({"repo_name": repo_name})}
-		project["issueEvents"] = {obj["_id"]: obj for obj in self.issueEvents.find({"repo_name": repo_name})}
-		project["commits"] = {obj["_id"]: obj for obj in self.commits.find({"repo_name": repo_name})}
-		project["commitComments"] = {obj["_id"]: obj for obj in self.commitComments.find({"repo_name": repo_name})}
-		project["contributors"] = {obj["_id"]: obj for obj in self.contributors.find({"repo_name": repo_name})}
+		project["highwatermarks"] = self.highwatermarks.find_one({"repo_name": repo_name})
+		project["checkpoints"] = self.checkpoints.find_one({"repo_name": repo_name})
+		project["issues"] = self.read_object_index(self.issues, repo_name, "issues")
+		project["issueComments"] = self.read_object_index(self.issueComments, repo_name, "issueComments")
+		project["issueEvents"] = self.read_object_index(self.issueEvents, repo_name, "issueEvents")
+		project["commits"] = self.read_object_index(self.commits, repo_name, "commits")
+		project["commitComments"] = self.read_object_index(self.commitComments, repo_name, "commitComments")
+		project["contributors"] = self.read_object_index(self.contributors, repo_name, "contributors")
 		return project
 
+	def read_object_index(self, collection, repo_name, name):
+		"""
+		Reads the index of the documents of a collection of a project (e.g. of its issues). Only the
+		keys of the documents are read, first for all documents and then for the full documents
+		(i.e. the ones that have the field that indicates whether a document is full).
+
+		:param collection: the collection of the documents.
+		:param repo_name: the name of the repository.
+		:param name: the name of the type of the documents in the project (e.g. issues).
+		:returns: an object of type ObjectIndex.
+		"""
+		key_field = Project.key_fields[name]
+		full_field = Project.full_fields.get(name)
+		index = ObjectIndex(full_field, lambda key: collection.find_one({"repo_name": repo_name, key_field: key}), \
+						None if always_write_to_disk else lambda documents: self.write_documents_to_disk(collection, repo_name, name, documents))
+		for obj in collection.find({"repo_name": repo_name}, {"_id": 0, key_field: 1}):
+			index.add_key(obj[key_field], full_field == None)
+		if full_field != None:
+			for obj in collection.find({"repo_name": repo_name, full_field: {"$exists": True}}, {"_id": 0, key_field: 1}):
+				index.add_key(obj[key_field], True)
+		return index
+
+	def write_documents_to_disk(self, collection, repo_name, name, documents):
+		"""
+		Writes the documents of a collection of a project (e.g. its issues) in bulk. This function is
+		used when always_write_to_disk is False to write the documents that are buffered in the project.
+
+		:param collection: the collection of the documents.
+		:param repo_name: the name of the repository.
+		:param name: the name of the type of the documents in the project (e.g. issues).
+		:param documents: the documents to be written.
+		"""
+		for document in documents:
+			if name == "contributors":
+				document["_id"] = repo_name + "___" + str(document["id"])
+			else:
+				document["_id"] = document[Project.key_fields[name]]
+			document["repo_name"] = repo_name
+		self.update_multiple(collection, documents, upsert = True)
+
+	def read_project_checkpoints(self, repo_name):
+		"""
+		Reads the checkpoints of a project from disk, without reading the rest of the project.
+
+		:param repo_name: the name of the repository.
+		:returns: the checkpoints of the project, or None if the project has no checkpoints.
+		"""
+		return self.checkpoints.find_one({"repo_name": repo_name})
+
 	def project_exists(self, repo_name):
 		"""
 		Check if a project exists in the disk given the name of the repository. The
@@ -71,42 +152,36 @@ class MongoDBManager(DatabaseManager, FileManager):
 
 	def finalize_write_to_disk(self, repo_name, project):
 		"""
-		Finalizes the writing of a project to disk. Closes any open buffers.
+		Finalizes the writing of a project to disk. Closes any open buffers. If always_write_to_disk is
+		False, the documents that are still buffered in the project are written before its info, stats,
+		high water marks, and checkpoints.
 
 		:param repo_name: the name of the repository to be written to disk.
 		:param project: the repository data to be written to disk.
 		"""
+		self.flush_buffers()
 		if not always_write_to_disk:
+			project["issues"].flush()
+			project["issueComments"].flush()
+			project["issueEvents"].flush()
+			project["commits"].flush()
+			project["commitComments"].flush()
+			project["contributors"].flush()
 			project["info"]["_id"] = project["info"]["id"]
 			project["info"]["repo_name"] = repo_name
 			self.projects.update_one({"_id": project["info"]["_id"]}, {"$set": project["info"]}, upsert = True)
-			project["stats"]["_id"] = project["info"]["id"]
-			project["stats"]["repo_name"] = repo_name
-			self.stats.update_one({"_id": project["stats"]["_id"]}, {"$set": project["stats"]}, upsert = True)
-			for issue in project["issues"].values():
-				issue["_id"] = issue["id"]
-				issue["repo_name"] = repo_name
-			self.update_multiple(self.issues, project["issues"].values(), upsert = True)
-			for issue_comment in project["issueComments"].values():
-				issue_comment["_id"] = issue_comment["id"]
-				issue_comment["repo_name"] = repo_name
-			self.update_multiple(self.issueComments, project["issueComments"].values(), upsert = True)
-			for issue_event in project["issueEvents"].values():
-				issue_event["_id"] = issue_event["id"]
-				issue_event["repo_name"] = repo_name
-			self.update_multiple(self.issueEvents, project["issueEvents"].values(), upsert = True)
-			for commit in project["commits"].values():
-				commit["_id"] = commit["sha"]
-				commit["repo_name"] = repo_name
-			self.update_multiple(self.commits, project["commits"].values(), upsert = True)
-			for commit_comment in project["commitComments"].values():
-				commit_comment["_id"] = commit_comment["id"]
-				commit_comment["repo_name"] = repo_name
-			self.update_multiple(self.commitComments, project["commitComments"].values(), upsert = True)
-			for contributor in project["contributors"].values():
-				contributor["_id"] = repo_name + "___" + str(contributor["id"])
-				contributor["repo_name"] = repo_name
-			self.update_multiple(self.contributors, project["contributors"].values(), upsert = True)
+			if project["stats"]:
+				project["stats"]["_id"] = project["info"]["id"]
+				project["stats"]["repo_name"] = repo_name
+				self.stats.update_one({"_id": project["stats"]["_id"]}, {"$set": project["stats"]}, upsert = True)
+			if project["highwatermarks"]:
+				project["highwatermarks"]["_id"] = project["info"]["id"]
+				project["highwatermarks"]["repo_name"] = repo_name
+				self.highwatermarks.update_one({"_id": project["highwatermarks"]["_id"]}, {"$set": project["highwatermarks"]}, upsert = True)
+			if project["checkpoints"]:
+				project["checkpoints"]["_id"] = project["info"]["id"]
+				project["checkpoints"]["repo_name"] = repo_name
+				self.checkpoints.update_one({"_id": project["checkpoints"]["_id"]}, {"$set": project["checkpoints"]}, upsert = True)
 
 	def write_project_info_to_disk(self, repo_name, info):
 		"""
@@ -133,6 +208,36 @@ class MongoDBManager(DatabaseManager, FileManager):
 			stats["repo_name"] = repo_name
 			self.stats.update_one({"_id": stats["_id"]}, {"$set": stats}, upsert = True)
 
+	def write_project_high_water_marks_to_disk(self, repo_name, info, highwatermarks):
+		"""
+		Writes the high water marks of the sections of a repository to disk. The write buffers are
+		flushed first, so that the high water marks never precede the stored documents.
+
+		:param repo_name: the name of the repository.
+		:param info: the info of the project.
+		:param highwatermarks: the high water marks to be written to disk.
+		"""
+		if always_write_to_disk:
+			self.flush_buffers()
+			highwatermarks["_id"] = info["id"]
+			highwatermarks["repo_name"] = repo_name
+			self.highwatermarks.update_one({"_id": highwatermarks["_id"]}, {"$set": highwatermarks}, upsert = True)
+
+	def write_project_checkpoints_to_disk(self, repo_name, info, checkpoints):
+		"""
+		Writes the checkpoints of a repository to disk. The write buffers are flushed first, so that the
+		checkpoints never precede the stored documents.
+
+		:param repo_name: the name of the repository.
+		:param info: the info of the project.
+		:param checkpoints: the checkpoints to be written to disk.
+		"""
+		if always_write_to_disk:
+			self.flush_buffers()
+			checkpoints["_id"] = info["id"]
+			checkpoints["repo_name"] = repo_name
+			self.checkpoints.update_one({"_id": checkpoints["_id"]}, {"$set": checkpoints}, upsert = True)
+
 	def write_project_issue_to_disk(self, repo_name, issue):
 		"""
 		Writes an issue of a repository to disk.
@@ -143,7 +248,7 @@ class MongoDBManager(DatabaseManager, FileManager):
 		if always_write_to_disk:
 			issue["_id"] = issue["id"]
 			issue["repo_name"] = repo_name
-			self.issues.update_one({"_id": issue["_id"]}, {"$set": issue}, upsert = True)
+			self.update_buffered(self.issues, issue)
 
 	def write_project_issue_comment_to_disk(self, repo_name, issue_comment):
 		"""
@@ -155,7 +260,7 @@ class MongoDBManager(DatabaseManager, FileManager):
 		if always_write_to_disk:
 			issue_comment["_id"] = issue_comment["id"]
 			issue_comment["repo_name"] = repo_name
-			self.issueComments.update_one({"_id": issue_comment["_id"]}, {"$set": issue_comment}, upsert = True)
+			self.update_buffered(self.issueComments, issue_comment)
 
 	def write_project_issue_event_to_disk(self, repo_name, issue_event):
 		"""
@@ -167,7 +272,7 @@ class MongoDBManager(DatabaseManager, FileManager):
 		if always_write_to_disk:
 			issue_event["_id"] = issue_event["id"]
 			issue_event["repo_name"] = repo_name
-			self.issueEvents.update_one({"_id": issue_event["_id"]}, {"$set": issue_event}, upsert = True)
+			self.update_buffered(self.issueEvents, issue_event)
 
 	def write_project_commit_to_disk(self, repo_name, commit):
 		"""
@@ -179,7 +284,7 @@ class MongoDBManager(DatabaseManager, FileManager):
 		if always_write_to_disk:
 			commit["_id"] = commit["sha"]
 			commit["repo_name"] = repo_name
-			self.commits.update_one({"_id": commit["_id"]}, {"$set": commit}, upsert = True)
+			self.update_buffered(self.commits, commit)
 
 	def write_project_commit_comment_to_disk(self, repo_name, commit_comment):
 		"""
@@ -191,7 +296,7 @@ class MongoDBManager(DatabaseManager, FileManager):
 		if always_write_to_disk:
 			commit_comment["_id"] = commit_comment["id"]
 			commit_comment["repo_name"] = repo_name
-			self.commitComments.update_one({"_id": commit_comment["_id"]}, {"$set": commit_comment}, upsert = True)
+			self.update_buffered(self.commitComments, commit_comment)
 
 	def write_project_contributor_to_disk(self, repo_name, contributor):
 		"""
@@ -203,4 +308,4 @@ class MongoDBManager(DatabaseManager, FileManager):
 		if always_write_to_disk:
 			contributor["_id"] = repo_name + "___" + str(contributor["id"])
 			contributor["repo_name"] = repo_name
-			self.contributors.update_one({"_id": contributor["_id"]}, {"$set": contributor}, upsert = True)
+			self.update_buffered(self.contributors, contributor)
@@ -0,0 +1,82 @@
+from properties import deferred_write_buffer_size
+
+class ObjectIndex:
+	"""
+	Class that implements a compact index of the objects of a type (e.g. the issues) of a project. For each
+	stored object, the index keeps only its key and whether the object is full (i.e. whether it includes
+	the full_field, e.g. closed_by for issues). The objects themselves are loaded lazily using a loader
+	function. If a writer function is given (i.e. if the objects have to be written to disk later), the
+	objects that are added to the index are kept in a buffer, which is written using the writer function
+	whenever it reaches deferred_write_buffer_size objects and when the method flush is called.
+	"""
+	def __init__(self, full_field = None, loader = None, writer = None):
+		"""
+		Initializes this object index.
+
+		:param full_field: the field that indicates whether an object is full, or None if all objects are considered full.
+		:param loader: a function that receives the key of a stored object and returns the object.
+		:param writer: a function that receives a list of objects and writes them to disk, or None if the objects are not kept.
+		"""
+		self.full_field = full_field
+		self.loader = loader
+		self.writer = writer
+		self.full = {}
+		self.objects = {}
+
+	def add_key(self, key, is_full = True):
+		"""
+		Adds the key of a stored object to the index.
+
+		:param key: the key of the object.
+		:param is_full: boolean indicating whether the stored object is full.
+		"""
+		self.full[key] = is_full
+
+	def is_full(self, key):
+		"""
+		Checks if the object of a key exists in its full version.
+
+		:param key: the key of the object.
+		:returns: True if the object exists and is full, or False otherwise.
+		"""
+		return self.full.get(key, False)
+
+	def flush(self):
+		"""
+		Writes the objects of the buffer using the writer function and empties the buffer.
+		"""
+		if self.objects:
+			self.writer(list(self.objects.values()))
+			self.objects = {}
+
+	def values(self):
+		"""
+		Returns all the objects of the index, loading lazily the ones that are not kept in memory.
+
+		:returns: a generator containing the objects of the index.
+		"""
+		for key in self.full:
+			yield self[key]
+
+	def __contains__(self, key):
+		return key in self.full
+
+	def __iter__(self):
+		return iter(self.full)
+
+	def __len__(self):
+		return len(self.full)
+
+	def __getitem__(self, key):
+		if key in self.objects:
+			return self.objects[key]
+		if key in self.full and self.loader != None:
+			return self.loader(key)
+		raise KeyError(key)
+
+	def __setitem__(self, key, obj):
+		self.full[key] = self.full_field == None or self.full_field in obj
+		if self.writer != None:
+			self.objects[key] = obj
+			if len(self.objects) >= deferred_write_buffer_size:
+				self.flush()
@@ -2,8 +2,13 @@
 class Project(dict):
 	"""
 	Class that includes the data of a GitHub project. This class is implemented as a dict
-	and includes also several helper functions for adding data and checking for data.
+	and includes also several helper functions for adding data and checking for data. The
+	issues, issue comments, issue events, commits, commit comments, and contributors of the
+	project are kept in objects of type ObjectIndex.
 	"""
+	key_fields = {"issues": "id", "issueComments": "id", "issueEvents": "id", "commits": "sha", "commitComments": "id", "contributors": "id"}
+	full_fields = {"issues": "closed_by", "commits": "stats"}
+
 	def info_exists(self):
 		"""
 		Checks if the info of the project exists.
@@ -36,6 +41,69 @@ class Project(dict):
 		"""
 		self["stats"] = stats
 
+	def get_high_water_mark(self, name):
+		"""
+		Returns the high water mark (e.g. the last update date of the downloaded objects) of a section of the project.
+
+		:param name: the name of the section (e.g. issues).
+		:returns: the high water mark of the section, or None if the section has no high water mark.
+		"""
+		return self["highwatermarks"].get(name) if self.get("highwatermarks") else None
+
+	def add_high_water_mark(self, name, high_water_mark):
+		"""
+		Adds the high water mark of a section of the project.
+
+		:param name: the name of the section (e.g. issues).
+		:param high_water_mark: the high water mark to be added to the project.
+		"""
+		if not self.get("highwatermarks"):
+			self["highwatermarks"] = {}
+		self["highwatermarks"][name] = high_water_mark
+
+	def start_checkpoints(self, started_at):
+		"""
+		Starts new checkpoints for the project, i.e. for a download that starts from the first page of each section.
+
+		:param started_at: the time (as a UNIX timestamp) when the download started.
+		"""
+		self["checkpoints"] = {"started_at": started_at, "completed_at": None, "sections": {}}
+
+	def complete_checkpoints(self, completed_at):
+		"""
+		Marks the checkpoints of the project as completed, i.e. all of its sections are downloaded.
+
+		:param completed_at: the time (as a UNIX timestamp) when the download was completed.
+		"""
+		self["checkpoints"]["completed_at"] = completed_at
+
+	def get_checkpoint(self, name):
+		"""
+		Returns the checkpoint of a section of the project.
+
+		:param name: the name of the section (e.g. issues).
+		:returns: a dict with the address of the page from which the section is resumed (next) and whether the
+		section is finished (finished), or None if the section has no checkpoint.
+		"""
+		return self["checkpoints"]["sections"].get(name) if self.get("checkpoints") else None
+
+	def add_checkpoint(self, name, checkpoint):
+		"""
+		Adds the checkpoint of a section of the project.
+
+		:param name: the name of the section (e.g. issues).
+		:param checkpoint: the checkpoint to be added to the project.
+		"""
+		self["checkpoints"]["sections"][name] = checkpoint
+
+	def get_quarantined_files(self):
+		"""
+		Returns the files of the project that could not be read and were moved to the quarantine folder.
+
+		:returns: a list containing the paths to the quarantined files.
+		"""
+		return self.get("quarantined") or []
+
 	def issue_exists(self, issue):
 		"""
 		Checks if the given issue exists in the project.
@@ -52,10 +120,7 @@ class Project(dict):
 		:param issue: the issue to be checked.
 		:returns: True if the given issue exists in the project, or False otherwise.
 		"""
-		if issue["id"] in self["issues"]:
-			return "closed_by" in self["issues"][issue["id"]]
-		else:
-			return False
+		return self["issues"].is_full(issue["id"])
 
 	def add_issue(self, issue):
 		"""
@@ -115,7 +180,7 @@ class Project(dict):
 		:param commit: the commit to be checked.
 		:returns: True if the given commit exists in the project, or False otherwise.
 		"""
-		return commit["sha"] in self["commits"] and "stats" in self["commits"][commit["sha"]]
+		return self["commits"].is_full(commit["sha"])
 
 	def add_commit(self, commit):
 		"""
@@ -0,0 +1,370 @@
+import sys
+import time
+import asyncio
+import datetime
+import aiohttp
+from requests.structures import CaseInsensitiveDict
+import metrics
+import jsoncodec
+from downloader.tokenpool import TokenPool
+from downloader.responsecache import ResponseCache
+from downloader.requestpacer import RequestPacer
+from downloader.githubdownloader import GithubDownloader
+from properties import num_page_download_threads, num_full_object_download_threads, \
+	num_concurrent_requests, request_timeout, use_response_cache, responseCachePath, \
+	github_api_address, max_request_retries, use_request_pacing, request_pacing_burst
+
+class CachedResponse:
+	"""
+	Class that implements a response of the GitHub API that is served from a ResponseCache. It offers
+	the attributes of aiohttp responses that are used by AsyncGithubDownloader.
+	"""
+	def __init__(self, headers, body):
+		"""
+		Initializes this cached response.
+
+		:param headers: the headers of the response.
+		:param body: the body of the response as bytes.
+		"""
+		self.status = 200
+		self.headers = headers
+		self.body = body
+
+	async def read(self):
+		"""
+		Returns the body of this response.
+
+		:returns: the body of the response as bytes.
+		"""
+		return self.body
+
+class AsyncGithubDownloader:
+	"""
+	Class that implements an asynchronous downloader for the GitHub API. It offers the same operations
+	as GithubDownloader as coroutines and asynchronous generators. To use this class, you must first
+	call the coroutine open from within an event loop, and finally call the coroutine close.
+	"""
+	parse_links = GithubDownloader.parse_links
+	page_number = GithubDownloader.page_number
+	number_of_pages = GithubDownloader.number_of_pages
+	backoff_delay = GithubDownloader.backoff_delay
+	retry_delay = GithubDownloader.retry_delay
+	page_addresses = GithubDownloader.page_addresses
+
+	def __init__(self, apikey):
+		"""
+		Initializes this asynchronous GitHub API Downloader.
+
+		:param apikey: the GitHub api key, or a list of GitHub api keys that are used in rotation.
+		"""
+		self.remaining_requests = -1
+		self.resettime = -1
+		self.tokenpool = TokenPool(apikey if isinstance(apikey, list) else [apikey])
+		self.credentials = self.tokenpool.apikeys[0]
+		self.session = None
+		self.semaphore = None
+		self.responsecache = ResponseCache(responseCachePath) if use_response_cache else None
+		self.pacer = RequestPacer(request_pacing_burst)
+
+	async def open(self):
+		"""
+		Opens the HTTP session of this downloader and checks the credentials. At most num_concurrent_requests
+		requests are sent to the GitHub API at the same time.
+		"""
+		connector = aiohttp.TCPConnector(limit = num_concurrent_requests)
+		self.session = aiohttp.ClientSession(connector = connector, timeout = aiohttp.ClientTimeout(total = request_timeout))
+		self.semaphore = asyncio.Semaphore(num_concurrent_requests)
+		if not all([await self.check_credentials(credentials) for credentials in self.tokenpool.apikeys]):
+			sys.stdout.write("Wrong Credentials!\n")
+			await self.close()
+			exit()
+
+	async def close(self):
+		"""
+		Closes the HTTP session of this downloader.
+		"""
+		await self.session.close()
+
+	async def set_request_number(self, number, resettime, is_search = False, apikey = None):
+		"""
+		Sets the current number of requests in the GitHub API for an api key, both for simple and for search requests.
+		If all api keys have less than 100 remaining requests for API requests or less than 5 for search requests,
+		then this coroutine waits until the allowed number of requests of any api key is reset, without blocking the
+		other requests of the event loop. If use_request_pacing is True, the rate of the request pacer is
+		updated for API requests.
+
+		:param number: the current number of requests to be set.
+		:param resettime: the time until the next renewal of allowed requests.
+		:param is_search: boolean indicating whether the last request was a search request (True) or not (False).
+		:param apikey: the api key used for the last request (by default the first api key).
+		"""
+		self.tokenpool.update(apikey if apikey != None else self.credentials, number, resettime, is_search)
+		self.remaining_requests = self.tokenpool.remaining(is_search)
+		if use_request_pacing and not is_search:
+			self.pacer.set_rate(self.tokenpool.request_rate())
+		exhaustedresettime = self.tokenpool.exhausted_until(is_search)
+		if exhaustedresettime != None:
+			await self.wait_until_reset(exhaustedresettime, is_search)
+
+	async def wait_until_reset(self, resettime, is_search = False):
+		"""
+		Waits until the allowed number of requests is reset.
+
+		:param resettime: the time (as a UNIX timestamp) of the next renewal of allowed requests.
+		:param is_search: boolean indicating whether the requests are search requests (True) or not (False).
+		"""
+		self.resettime = datetime.datetime.fromtimestamp(float(resettime)).strftime('%H:%M')
+		sys.stdout.write('\nOops! You have exceeded the requests limit!\nYou have to wait until ' + self.resettime + '..\n')
+		waitsecs = int(resettime) - int(time.time())
+		waitsecs += (20 if is_search else 60)
+		metrics.record_sleep("rate_limit", waitsecs)
+		await asyncio.sleep(max(waitsecs, 0))
+		sys.stdout.write('\nDone!!')
+
+	async def select_token(self, is_search = False):
+		"""
+		Selects the api key with the most remaining requests. If all api keys are exhausted, then this
+		coroutine waits until the allowed number of requests of any api key is reset.
+
+		:param is_search: boolean indicating whether the request is a search request (True) or not (False).
+		:returns: the selected api key.
+		"""
+		apikey = self.tokenpool.select_token(is_search)
+		while apikey == None:
+			await self.wait_until_reset(self.tokenpool.exhausted_until(is_search) or time.time(), is_search)
+			apikey = self.tokenpool.select_token(is_search)
+		return apikey
+
+	def get_token_usage(self):
+		"""
+		Returns the usage counters of the api keys of this downloader.
+
+		:returns: a dict with the (masked) api keys as keys and dicts with their number of requests,
+		remaining requests, and reset time as values.
+		"""
+		return self.tokenpool.usage()
+
+	async def check_credentials(self, credentials):
+		"""
+		Checks whether the credentials are correct.
+
+		:param credentials: the GitHub api key.
+		:returns: True if the credentials are correct, or False otherwise.
+		"""
+		try:
+			r = await self.session.get(github_api_address + "/rate_limit", headers = {'Authorization': 'token ' + credentials})
+			if int(r.status) == 200:
+				content = jsoncodec.loads(await r.read())
+				await self.set_request_number(content["resources"]["core"]["remaining"], content["resources"]["core"]["reset"], apikey = credentials)
+				return True
+			else:
+				r.release()
+				return False
+		except:
+			return False
+
+	async def download_request(self, address, parameters = None, headers = None):
+		"""
+		Implements a download request. The body of the response is read before returning, so that
+		the connection is released back to the pool. See also GithubDownloader.download_request for
+		the use of the response cache and for the retries of failed requests.
+
+		:param address: the URL of the request.
+		:param parameters: the parameters of the request.
+		:param headers: the headers of the request.
+		:returns: the response of the request, or None if the request failed.
+		"""
+		parameters = '?' + '&'.join(parameters) if parameters else ""
+		cacheable = self.responsecache != None and not headers
+		entry = self.responsecache.get(address + parameters) if cacheable else None
+		if headers:
+			headers = {headers.split(':')[0].strip() : headers.split(':')[1].strip()}
+		else:
+			headers = self.responsecache.conditional_headers(entry) if entry != None else {}
+		is_search = address.startswith(github_api_address + "/search")
+		for attempt in range(max_request_retries + 1):
+			apikey = await self.select_token(is_search)
+			headers['Authorization'] = 'token ' + apikey
+			wait = self.pacer.reserve()
+			metrics.record_sleep("pacing", wait)
+			await asyncio.sleep(wait)
+			try:
+				async with self.semaphore:
+					start = time.perf_counter()
+					r = await self.session.get(address + parameters, headers = headers)
+					body = await r.read()
+			except (asyncio.TimeoutError, aiohttp.ClientError):
+				r = None
+			metrics.record_request(address, r.status if r != None else None, time.perf_counter() - start, len(body) if r != None else 0)
+			if r != None:
+				await self.set_request_number(r.headers['x-ratelimit-remaining'] if 'x-ratelimit-remaining' in r.headers else None, \
+											r.headers['x-ratelimit-reset'] if 'x-ratelimit-reset' in r.headers else None, is_search, apikey)
+			delay = self.retry_delay(attempt, r.status, r.headers, body) if r != None else self.retry_delay(attempt)
+			if delay == None or attempt == max_request_retries:
+				break
+			metrics.record_sleep("retry", delay)
+			await asyncio.sleep(delay)
+		if r == None:
+			return None
+		if entry != None and r.status == 304:
+			cachedheaders = CaseInsensitiveDict(r.headers)
+			cachedheaders.update(entry["headers"])
+			return CachedResponse(cachedheaders, entry["body"].encode('utf-8'))
+		if cacheable and r.status == 200:
+			self.responsecache.store(address + parameters, r.headers, await r.read())
+		return r
+
+	async def download_object(self, address, parameters = None, headers = None):
+		"""
+		Downloads an object of the GitHub API.
+
+		:param address: the URL of the GitHub request.
+		:param parameters: the parameters of the GitHub request.
+		:param headers: the headers of the GitHub request.
+		:returns: the contents of the response of the request.
+		"""
+		r = await self.download_request(address, parameters, headers)
+		if r != None and r.status < 400:
+			body = await r.read()
+			with metrics.timer("json_decode_seconds"):
+				content = jsoncodec.loads(body) if r.status != 204 else {}
+			if type(content) == dict and 'ETag' in r.headers:
+				content['ETag'] = r.headers['ETag']
+			return content
+
+	async def update_object(self, originalobject, address, parameters = None):
+		"""
+		Updates an object of the GitHub API if it has changed.
+
+		:param originalobject: the original object containing an Etag indicating whether it has changed.
+		:param address: the URL of the GitHub request.
+		:param parameters: the parameters of the GitHub request.
+		:returns: the contents of the response of the request or the original object if it has not changed.
+		"""
+		if 'ETag' in originalobject:
+			headers = "If-None-Match: " + originalobject['ETag']
+			r = await self.download_request(address, parameters, headers)
+			if r == None:
+				return None
+			elif int(r.status) == 200:
+				body = await r.read()
+				with metrics.timer("json_decode_seconds"):
+					newobject = jsoncodec.loads(body)
+				if type(newobject) == dict and 'ETag' in r.headers:
+					newobject['ETag'] = r.headers['ETag']
+				return newobject
+			elif int(r.status) == 304:
+				return originalobject
+		else:
+			newobject = await self.download_object(address, parameters)
+			if newobject == None:
+				return None
+			for keyfield in newobject:
+				originalobject[keyfield] = newobject[keyfield]
+			return originalobject
+
+	async def parse_page(self, address, r):
+		"""
+		Parses the objects contained in a page of a paginated object of the GitHub API.
+
+		:param address: the URL of the GitHub request.
+		:param r: the response of the request for the page.
+		:returns: a list containing the objects of the page.
+		"""
+		if r != None and r.status < 400 and r.status != 204:
+			body = await r.read()
+			with metrics.timer("json_decode_seconds"):
+				if address.startswith(github_api_address + "/search"):
+					return jsoncodec.loads(body)["items"]
+				else:
+					return jsoncodec.loads(body)
+		return []
+
+	async def download_paginated_object(self, address, parameters = None, headers = None, page_callback = None, resume_address = None):
+		"""
+		Downloads a paginated object of the GitHub API. If num_page_download_threads is larger than 1
+		and the response has a rel="last" link, then up to twice that number of pages are downloaded
+		concurrently. See also GithubDownloader.download_paginated_object for the page callback and
+		the resume address.
+
+		:param address: the URL of the GitHub request.
+		:param parameters: the parameters of the GitHub request.
+		:param headers: the headers of the GitHub request.
+		:param page_callback: an optional function that is called with the number of pages, the objects of the page,
+		the address of the page, and the address of the next page (or None) for each downloaded page.
+		:param resume_address: the address of the page from which the download starts (instead of the first page), or None.
+		:returns: an asynchronous generator containing all the pages of the response of the request.
+		"""
+		if parameters:
+			parameters.append("per_page=100")
+		else:
+			parameters = ["per_page=100"]
+		pageaddress = resume_address if resume_address != None else address + '?' + '&'.join(parameters)
+
+		r = await self.download_request(pageaddress, [], headers)
+		links = self.parse_links(r) if r != None else {}
+		num_pages = self.number_of_pages(links)
+		page = await self.parse_page(address, r)
+		if page_callback != None and r != None and r.status < 400:
+			page_callback(num_pages, page, pageaddress, links.get("next"))
+		for obj in page:
+			yield obj
+		if num_page_download_threads > 1 and "last" in links:
+			pageaddresses = self.page_addresses(links["last"], self.page_number(pageaddress) + 1)
+			pending = [asyncio.ensure_future(self.download_request(pageaddress, [], headers)) for pageaddress in pageaddresses[:2 * num_page_download_threads]]
+			try:
+				for i, pageaddress in enumerate(pageaddresses):
+					r = await pending.pop(0)
+					if i + 2 * num_page_download_threads < len(pageaddresses):
+						pending.append(asyncio.ensure_future(self.download_request(pageaddresses[i + 2 * num_page_download_threads], [], headers)))
+					page = await self.parse_page(address, r)
+					if page_callback != None and r != None and r.status < 400:
+						page_callback(num_pages, page, pageaddress, pageaddresses[i + 1] if i + 1 < len(pageaddresses) else None)
+					for obj in page:
+						yield obj
+			finally:
+				for task in pending:
+					task.cancel()
+			return
+		while "next" in links:
+			pageaddress = links["next"]
+			r = await self.download_request(pageaddress, [], headers)
+			links = self.parse_links(r) if r != None else {}
+			page = await self.parse_page(address, r)
+			if page_callback != None and r != None and r.status < 400:
+				page_callback(num_pages, page, pageaddress, links.get("next"))
+			for obj in page:
+				yield obj
+
+	async def download_full_objects(self, objects, full_object_address):
+		"""
+		Downloads the full version of objects (e.g. of the issues or commits of a paginated object). See
+		also GithubDownloader.download_full_objects; here, up to 4 * num_full_object_download_threads full
+		objects are downloaded concurrently.
+
+		:param objects: an asynchronous iterable containing the objects.
+		:param full_object_address: a function that receives an object and returns the URL of its full
+		version, or None if the object does not have to be downloaded again.
+		:returns: an asynchronous generator containing the objects, where each object is replaced by its full version if required.
+		"""
+		pending = set()
+		try:
+			async for obj in objects:
+				address = full_object_address(obj)
+				if address == None:
+					yield obj
+					continue
+				pending.add(asyncio.ensure_future(self.download_object(address)))
+				if len(pending) >= 4 * max(num_full_object_download_threads, 1):
+					done, pending = await asyncio.wait(pending, return_when = asyncio.FIRST_COMPLETED)
+					for task in done:
+						if task.result() != None:
+							yield task.result()
+			while pending:
+				done, pending = await asyncio.wait(pending, return_when = asyncio.FIRST_COMPLETED)
+				for task in done:
+					if task.result() != None:
+						yield task.result()
+		finally:
+			for task in pending:
+				task.cancel()
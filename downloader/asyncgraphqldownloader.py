@@ -0,0 +1,124 @@
+import time
+import asyncio
+import aiohttp
+import metrics
+import jsoncodec
+from downloader.tokenpool import TokenPool
+from downloader.graphqldownloader import GraphQLDownloader
+from properties import graphql_api_address, graphql_batch_size, max_request_retries
+
+class AsyncGraphQLDownloader:
+	"""
+	Class that implements an asynchronous downloader of full issues and commits using the GraphQL API of
+	GitHub. It offers the same operations as GraphQLDownloader as coroutines and asynchronous generators,
+	and sends its requests using the session and the api keys of an open AsyncGithubDownloader.
+	"""
+	parse_full_object_address = GraphQLDownloader.parse_full_object_address
+	build_query = GraphQLDownloader.build_query
+	convert_user = GraphQLDownloader.convert_user
+	merge_node = GraphQLDownloader.merge_node
+	merge_batch = GraphQLDownloader.merge_batch
+	update_rate_limit = GraphQLDownloader.update_rate_limit
+
+	def __init__(self, aghd):
+		"""
+		Initializes this asynchronous GraphQL downloader.
+
+		:param aghd: the open AsyncGithubDownloader of which the session, the api keys, and the request pacer are used.
+		"""
+		self.aghd = aghd
+		self.tokenpool = TokenPool(aghd.tokenpool.apikeys)
+
+	async def select_token(self):
+		"""
+		Selects the api key with the most remaining points of the GraphQL rate limit. If all api keys are
+		exhausted, then this coroutine waits until the rate limit of any api key is reset.
+
+		:returns: the selected api key.
+		"""
+		apikey = self.tokenpool.select_token()
+		while apikey == None:
+			await self.aghd.wait_until_reset(self.tokenpool.exhausted_until() or time.time())
+			apikey = self.tokenpool.select_token()
+		return apikey
+
+	async def post_query(self, query):
+		"""
+		Sends a query to the GraphQL API. See also GraphQLDownloader.post_query.
+
+		:param query: the GraphQL query.
+		:returns: the data of the response (which may be partial if some objects were not found), or None if the query failed.
+		"""
+		for attempt in range(max_request_retries + 1):
+			apikey = await self.select_token()
+			wait = self.aghd.pacer.reserve()
+			metrics.record_sleep("pacing", wait)
+			await asyncio.sleep(wait)
+			try:
+				async with self.aghd.semaphore:
+					start = time.perf_counter()
+					r = await self.aghd.session.post(graphql_api_address, data = jsoncodec.dumpb({"query": query}), \
+													headers = {'Authorization': 'bearer ' + apikey, 'Content-Type': 'application/json'})
+					content = await r.read()
+			except (asyncio.TimeoutError, aiohttp.ClientError):
+				r = None
+			metrics.record_request(graphql_api_address, r.status if r != None else None, time.perf_counter() - start, len(content) if r != None else 0)
+			if r != None:
+				self.update_rate_limit(apikey, r.headers)
+			delay = self.aghd.retry_delay(attempt, r.status, r.headers, content) if r != None else self.aghd.retry_delay(attempt)
+			if delay == None or attempt == max_request_retries:
+				break
+			metrics.record_sleep("retry", delay)
+			await asyncio.sleep(delay)
+		if r == None or r.status >= 400:
+			return None
+		data = jsoncodec.loads(content).get("data")
+		self.update_rate_limit(apikey, r.headers, data)
+		return data
+
+	async def download_batch(self, batch):
+		"""
+		Downloads the full versions of a batch of objects using one GraphQL query. The objects that cannot
+		be downloaded using GraphQL are downloaded concurrently using the REST API.
+
+		:param batch: a list containing tuples with the objects and the addresses of their full versions.
+		:returns: a list containing the full objects, where the objects that could not be downloaded are None.
+		"""
+		parsedaddresses = [self.parse_full_object_address(address) for _, address in batch]
+		graphqlbatch = [(obj, address) for (obj, address), parsedaddress in zip(batch, parsedaddresses) if parsedaddress != None]
+		graphqlparsedaddresses = [parsedaddress for parsedaddress in parsedaddresses if parsedaddress != None]
+		query, repository_aliases = self.build_query(graphqlparsedaddresses)
+		data = await self.post_query(query) if graphqlbatch else None
+		merged = iter(self.merge_batch(graphqlbatch, graphqlparsedaddresses, repository_aliases, data))
+		fullobjects = [next(merged) if parsedaddress != None else None for parsedaddress in parsedaddresses]
+		missing = [i for i, fullobj in enumerate(fullobjects) if fullobj == None]
+		for i, fullobj in zip(missing, await asyncio.gather(*[self.aghd.download_object(batch[i][1]) for i in missing])):
+			fullobjects[i] = fullobj
+		return fullobjects
+
+	async def download_full_objects(self, objects, full_object_address):
+		"""
+		Downloads the full version of objects (e.g. of the issues or commits of a paginated object) in batches
+		of graphql_batch_size objects. See also GraphQLDownloader.download_full_objects.
+
+		:param objects: an asynchronous iterable containing the objects.
+		:param full_object_address: a function that receives an object and returns the URL of its full
+		version, or None if the object does not have to be downloaded again.
+		:returns: an asynchronous generator containing the objects, where each object is replaced by its full version if required.
+		"""
+		batch = []
+		async for obj in objects:
+			address = full_object_address(obj)
+			if address == None:
+				yield obj
+				continue
+			batch.append((obj, address))
+			if len(batch) >= graphql_batch_size:
+				for fullobj in await self.download_batch(batch):
+					if fullobj != None:
+						yield fullobj
+				batch = []
+		if batch:
+			for fullobj in await self.download_batch(batch):
+				if fullobj != None:
+					yield fullobj
@@ -1,55 +1,241 @@
 import os
+import time
 import subprocess
-from properties import include_private_repos
+import metrics
+from contextlib import nullcontext
+from properties import include_private_repos, git_clone_depth, git_partial_clone, git_single_branch
 
 class GitDownloader():
 	"""
 	Class that implements a downloader using the git command. To use this class, git must
 	be installed in your system.
 	"""
-	def __init__(self, gitcommand, logger, apikey):
+	def __init__(self, gitcommand, logger, apikey, mirrorcache = None):
 		"""
 		Initializes this Git Downloader.
 
 		:param gitcommand: the path to the git command of the system.
 		:param logger: a Logger used to print messages from git.
-		:param apikey: the GitHub api key, required only to clone/pull private repos.
+		:param apikey: the GitHub api key (or a list of api keys), required only to clone/pull private repos.
+		:param mirrorcache: the MirrorCache of which the mirrors are referenced by the clones, or None to not use mirrors.
 		"""
 		self.gitcommand = gitcommand
 		self.logger = logger
-		self.apikey = apikey
+		self.apikey = apikey[0] if isinstance(apikey, list) else apikey
+		self.mirrorcache = mirrorcache
 
-	def git_pull(self, repo_path):
+	def authenticated_url(self, repo_url):
 		"""
-		Implements the git pull command.
+		Adds the api key to the URL of a repository if private repos are also downloaded.
+
+		:param repo_url: the URL of the repository.
+		:returns: the URL that is used by git to clone the repository.
+		"""
+		if include_private_repos:
+			return repo_url.replace('https://github.com', 'https://' + self.apikey + '@github.com')
+		return repo_url
+
+	def mirror_reference(self, upstream_url):
+		"""
+		Creates or updates the mirror of an upstream repository in the mirror cache and holds it while it is used.
+
+		:param upstream_url: the URL of the upstream repository, or None if there is no upstream repository.
+		:returns: a context manager that yields the path to the mirror, or None if no mirror is used.
+		"""
+		if self.mirrorcache == None or upstream_url == None:
+			return nullcontext(None)
+		return self.mirrorcache.reference(self.authenticated_url(upstream_url), self)
+
+	def git_has_alternates(self, repo_path):
+		"""
+		Checks if a repository references the objects of another repository (e.g. of a mirror).
+
+		:param repo_path: the path of the repository in the file system.
+		:returns: True if the repository has alternates, or False otherwise.
+		"""
+		return os.path.exists(os.path.join(repo_path, ".git", "objects", "info", "alternates"))
+
+	def git_is_partial(self, repo_path):
+		"""
+		Checks if a repository is a partial clone (e.g. cloned using git_partial_clone), i.e. if it has packs
+		that were received from a promisor remote, which sends the missing objects on demand.
 
-		:param repo_url: the URL of the repository to be pulled.
 		:param repo_path: the path of the repository in the file system.
+		:returns: True if the repository is a partial clone, or False otherwise.
+		"""
+		packfolder = os.path.join(repo_path, ".git", "objects", "pack")
+		return os.path.isdir(packfolder) and any(filename.endswith(".promisor") for filename in os.listdir(packfolder))
+
+	def git_dissociate(self, repo_path):
+		"""
+		Dissociates a repository from the repositories that it references, i.e. copies their objects that it
+		uses into it and removes its alternates, as git clone --dissociate does.
+
+		:param repo_path: the path of the repository in the file system.
+		:returns: True if the repository was dissociated, or False otherwise.
+		"""
+		if not self.run_git(['repack', '-a', '-d', '-q'], cwd = repo_path):
+			return False
+		os.remove(os.path.join(repo_path, ".git", "objects", "info", "alternates"))
+		return True
+
+	def run_git(self, arguments, cwd = None):
+		"""
+		Runs a git command and logs its output and the time it took. The progress of git is requested even
+		though its output is not a terminal; the progress lines that git overwrites (using carriage returns)
+		are not logged, so only the final state of each phase (e.g. "Receiving objects: 100%, done.") is logged.
+
+		:param arguments: a list containing the git subcommand and its arguments.
+		:param cwd: the working directory of the command, or None for the current directory.
+		:returns: True if the command succeeded, or False otherwise.
 		"""
-		p = subprocess.Popen([self.gitcommand, 'pull'], cwd = repo_path, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
+		start = time.monotonic()
+		p = subprocess.Popen([self.gitcommand] + arguments, cwd = cwd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
+		buffer = b''
 		while True:
-			line = p.stdout.readline()
-			if line != b'':
-				self.logger.log_action(line.decode('utf-8'))
+			chunk = p.stdout.read1(4096)
+			if chunk != b'':
+				*lines, buffer = (buffer + chunk).split(b'\n')
+				for line in lines:
+					self.logger.log_action(line.split(b'\r')[-1].decode('utf-8', 'replace').rstrip())
+				buffer = buffer.split(b'\r')[-1]
 			else:
 				break
+		returncode = p.wait()
+		elapsed = time.monotonic() - start
+		metrics.count("git_commands_total", {"command": arguments[0], "status": "success" if returncode == 0 else "failure"})
+		metrics.observe("git_command_seconds", elapsed, {"command": arguments[0]})
+		if returncode == 0:
+			self.logger.log_action("git %s finished in %.1f seconds" % (arguments[0], elapsed))
+		else:
+			self.logger.log_action("git %s failed with exit code %d after %.1f seconds" % (arguments[0], returncode, elapsed))
+		return returncode == 0
+
+	def git_pull(self, repo_path, upstream_url = None):
+		"""
+		Implements the git pull command. If the repository was cloned with a depth, the pull keeps it shallow.
+		If the repository references a mirror, the mirror is updated first.
+
+		:param repo_path: the path of the repository in the file system.
+		:param upstream_url: the URL of the upstream repository of which the mirror is referenced, or None.
+		:returns: True if the repository was pulled, or False otherwise.
+		"""
+		arguments = ['pull', '--progress']
+		if git_clone_depth:
+			arguments += ['--depth', str(git_clone_depth)]
+		with self.mirror_reference(upstream_url if self.git_has_alternates(repo_path) else None):
+			return self.run_git(arguments, cwd = repo_path)
+
+	def git_fetch(self, repo_path, upstream_url = None):
+		"""
+		Implements the git fetch command, pruning the remote branches that were deleted. Unlike git pull,
+		the working tree is not updated; the new commits are available in the remote branches (e.g. origin/master).
+		If the repository references a mirror, the mirror is updated first.
+
+		:param repo_path: the path of the repository in the file system.
+		:param upstream_url: the URL of the upstream repository of which the mirror is referenced, or None.
+		:returns: True if the repository was fetched, or False otherwise.
+		"""
+		arguments = ['fetch', '--prune', '--progress']
+		if git_clone_depth:
+			arguments += ['--depth', str(git_clone_depth)]
+		with self.mirror_reference(upstream_url if self.git_has_alternates(repo_path) else None):
+			return self.run_git(arguments, cwd = repo_path)
 
-	def git_clone(self, repo_url, repo_path):
+	def git_clone(self, repo_url, repo_path, upstream_url = None):
 		"""
-		Implements the git clone command.
+		Implements the git clone command. The clone can be shallow (git_clone_depth), partial (git_partial_clone,
+		in which case the contents of the files are downloaded on demand), and include only the default branch
+		(git_single_branch). If a mirror cache is used, the clone references the mirror of the upstream repository,
+		so that only the objects that are not found in the mirror are downloaded and stored.
 
 		:param repo_url: the URL of the repository to be cloned.
 		:param repo_path: the path of the file system to clone the repository.
+		:param upstream_url: the URL of the upstream repository (e.g. the root of the fork network of the repository), or None.
+		:returns: True if the repository was cloned, or False otherwise.
 		"""
-		if include_private_repos:
-			repo_url = repo_url.replace('https://github.com', 'https://' + self.apikey + '@github.com')
-		p = subprocess.Popen([self.gitcommand, 'clone', repo_url, repo_path], stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
+		arguments = ['clone', '--progress']
+		if git_clone_depth:
+			arguments += ['--depth', str(git_clone_depth)]
+		if git_partial_clone:
+			arguments += ['--filter=blob:none']
+		if git_single_branch:
+			arguments += ['--single-branch']
+		elif git_clone_depth:
+			arguments += ['--no-single-branch']
+		with self.mirror_reference(upstream_url) as reference:
+			if reference != None:
+				arguments += ['--reference', reference]
+			succeeded = self.run_git(arguments + [self.authenticated_url(repo_url), repo_path])
+			if succeeded and reference != None:
+				self.mirrorcache.add_clone(upstream_url, repo_path)
+		return succeeded
+
+	def read_tokens(self, stream, separator = b'\0'):
+		"""
+		Reads the tokens of a stream while it is being written (e.g. the output of a git command run with -z).
+
+		:param stream: the stream to be read.
+		:param separator: the separator of the tokens.
+		:returns: a generator containing the tokens as bytes.
+		"""
+		buffer = b''
 		while True:
-			line = p.stdout.readline()
-			if line != b'':
-				self.logger.log_action(line.decode('utf-8'))
+			chunk = stream.read1(65536)
+			if chunk != b'':
+				*tokens, buffer = (buffer + chunk).split(separator)
+				yield from tokens
 			else:
 				break
+		if buffer != b'':
+			yield buffer
+
+	def git_log(self, repo_path):
+		"""
+		Reads the commits of all the branches of a repository along with the files that each commit changed,
+		using one git log command of which the output is parsed while it is streamed. For each commit, git
+		prints its raw diff (the status and the paths of each file) followed by its numstat diff (the added and
+		deleted lines of each file) for the same files in the same order. Merge commits have no diff.
+
+		:param repo_path: the path of the repository in the file system.
+		:returns: a generator of tuples containing the sha of each commit, a list with the shas of its parents, and
+		a list with its changed files, where each file is a dict with the same fields as the files of the GitHub API.
+		"""
+		statuses = {'A': 'added', 'D': 'removed', 'M': 'modified', 'R': 'renamed', 'C': 'copied', 'T': 'changed'}
+		p = subprocess.Popen([self.gitcommand, 'log', '--all', '--format=%H %P', '--raw', '--numstat', '-z', '-M'], \
+							cwd = repo_path, stdout = subprocess.PIPE, stderr = subprocess.DEVNULL)
+		try:
+			tokens = self.read_tokens(p.stdout)
+			token = next(tokens, b'')
+			while token != b'':
+				sha, *parents = token.decode('utf-8').split()
+				rawdiff = []
+				token = next(tokens, b'')
+				while token.startswith((b':', b'\n:')):
+					status = token.split(b' ')[-1].decode('utf-8')
+					rawdiff.append((status, [next(tokens).decode('utf-8', 'replace') for _ in range(2 if status[0] in 'RC' else 1)]))
+					token = next(tokens, b'')
+				files = []
+				for status, paths in rawdiff:
+					additions, deletions, path = token.split(b'\t', 2)
+					if path == b'':
+						# The numstat diff of renamed and copied files is followed by their two paths
+						next(tokens)
+						next(tokens)
+					additions = int(additions) if additions != b'-' else 0
+					deletions = int(deletions) if deletions != b'-' else 0
+					changedfile = {"filename": paths[-1], "status": statuses.get(status[0], 'modified'), \
+								"additions": additions, "deletions": deletions, "changes": additions + deletions}
+					if len(paths) > 1:
+						changedfile["previous_filename"] = paths[0]
+					files.append(changedfile)
+					token = next(tokens, b'')
+				yield sha, parents, files
+		finally:
+			p.stdout.close()
+			if p.poll() == None:
+				p.kill()
+			p.wait()
 
 	def git_repo_exists(self, project_path):
 		"""
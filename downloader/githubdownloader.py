@@ -1,10 +1,25 @@
 import sys
-import json
 import time
+import random
 import datetime
+import threading
 import requests
+from email.utils import parsedate_to_datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 from urllib3.exceptions import TimeoutError
-from requests.exceptions import ConnectionError
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.exceptions import ConnectionError, Timeout, ChunkedEncodingError
+import metrics
+import jsoncodec
+from downloader.tokenpool import TokenPool
+from downloader.responsecache import ResponseCache
+from downloader.requestpacer import RequestPacer
+from properties import num_page_download_threads, num_full_object_download_threads, \
+	http_pool_size, request_timeout, use_response_cache, responseCachePath, \
+	github_api_address, max_request_retries, retry_backoff_base, retry_backoff_max, use_request_pacing, request_pacing_burst
 
 class GithubDownloader:
 	"""
@@ -14,36 +29,92 @@ class GithubDownloader:
 		"""
 		Initializes this GitHub API Downloader.
 
-		:param apikey: the GitHub api key.
+		:param apikey: the GitHub api key, or a list of GitHub api keys that are used in rotation.
 		"""
 		self.remaining_requests = -1
 		self.resettime = -1
-		self.credentials = apikey
-		if not self.check_credentials(self.credentials):
+		self.lock = threading.Lock()
+		self.session = self.create_session()
+		self.responsecache = ResponseCache(responseCachePath) if use_response_cache else None
+		self.pacer = RequestPacer(request_pacing_burst)
+		self.tokenpool = TokenPool(apikey if isinstance(apikey, list) else [apikey])
+		self.credentials = self.tokenpool.apikeys[0]
+		if not all(self.check_credentials(credentials) for credentials in self.tokenpool.apikeys):
 			sys.stdout.write("Wrong Credentials!\n")
 			exit()
 
-	def set_request_number(self, number, resettime, is_search = False):
+	def set_request_number(self, number, resettime, is_search = False, apikey = None):
 		"""
-		Sets the current number of requests in the GitHub API, both for simple and for search requests. If the number
-		of remaining requests is less than 100 for API requests or less than 5 for search requests, then this function
-		keeps waiting until the allowed number of requests is reset.
+		Sets the current number of requests in the GitHub API for an api key, both for simple and for search requests.
+		If all api keys have less than 100 remaining requests for API requests or less than 5 for search requests,
+		then this function keeps waiting until the allowed number of requests of any api key is reset. If
+		use_request_pacing is True, the rate of the request pacer is updated for API requests.
 
 		:param number: the current number of requests to be set.
 		:param resettime: the time until the next renewal of allowed requests.
 		:param is_search: boolean indicating whether the last request was a search request (True) or not (False).
+		:param apikey: the api key used for the last request (by default the first api key).
 		"""
-		self.remaining_requests = int(number) if number != None else self.remaining_requests - 1
-		self.resettime = datetime.datetime.fromtimestamp(float(resettime)).strftime('%H:%M') if resettime != None else self.resettime
-		if (is_search and self.remaining_requests < 5) or ((not is_search) and self.remaining_requests < 100):
-			sys.stdout.write('\nOops! You have exceeded the requests limit!\nYou have to wait until ' + self.resettime + '..\n')
-			waitsecs = int(resettime) - int(time.time())
-			waitsecs += (20 if is_search else 60)
-			while waitsecs > 0:
-				time.sleep(1)
-				# sys.stdout.write('\rRemaining time: %d seconds' % waitsecs)
-				waitsecs -= 1
-			sys.stdout.write('\nDone!!')
+		self.tokenpool.update(apikey if apikey != None else self.credentials, number, resettime, is_search)
+		with self.lock:
+			self.remaining_requests = self.tokenpool.remaining(is_search)
+		if use_request_pacing and not is_search:
+			self.pacer.set_rate(self.tokenpool.request_rate())
+		exhaustedresettime = self.tokenpool.exhausted_until(is_search)
+		if exhaustedresettime != None:
+			self.wait_until_reset(exhaustedresettime, is_search)
+
+	def wait_until_reset(self, resettime, is_search = False):
+		"""
+		Waits until the allowed number of requests is reset.
+
+		:param resettime: the time (as a UNIX timestamp) of the next renewal of allowed requests.
+		:param is_search: boolean indicating whether the requests are search requests (True) or not (False).
+		"""
+		self.resettime = datetime.datetime.fromtimestamp(float(resettime)).strftime('%H:%M')
+		sys.stdout.write('\nOops! You have exceeded the requests limit!\nYou have to wait until ' + self.resettime + '..\n')
+		waitsecs = int(resettime) - int(time.time())
+		waitsecs += (20 if is_search else 60)
+		metrics.record_sleep("rate_limit", waitsecs)
+		time.sleep(max(waitsecs, 0))
+		sys.stdout.write('\nDone!!')
+
+	def select_token(self, is_search = False):
+		"""
+		Selects the api key with the most remaining requests. If all api keys are exhausted, then this
+		function waits until the allowed number of requests of any api key is reset.
+
+		:param is_search: boolean indicating whether the request is a search request (True) or not (False).
+		:returns: the selected api key.
+		"""
+		apikey = self.tokenpool.select_token(is_search)
+		while apikey == None:
+			self.wait_until_reset(self.tokenpool.exhausted_until(is_search) or time.time(), is_search)
+			apikey = self.tokenpool.select_token(is_search)
+		return apikey
+
+	def get_token_usage(self):
+		"""
+		Returns the usage counters of the api keys of this downloader.
+
+		:returns: a dict with the (masked) api keys as keys and dicts with their number of requests,
+		remaining requests, and reset time as values.
+		"""
+		return self.tokenpool.usage()
+
+	def create_session(self):
+		"""
+		Creates the HTTP session that is used for all requests. The session keeps alive the connections
+		to the GitHub API in a pool of http_pool_size connections and requests gzip compressed responses.
+
+		:returns: an object of type requests.Session.
+		"""
+		session = requests.Session()
+		adapter = HTTPAdapter(pool_connections = http_pool_size, pool_maxsize = http_pool_size)
+		session.mount("https://", adapter)
+		session.mount("http://", adapter)
+		session.headers['Accept-Encoding'] = 'gzip, deflate'
+		return session
 
 	def check_credentials(self, credentials):
 		"""
@@ -53,10 +124,10 @@ class GithubDownloader:
 		:returns: True if the credentials are correct, or False otherwise.
 		"""
 		try:
-			r = requests.get("https://api.github.com/rate_limit", headers = {'Authorization': 'token ' + credentials})
+			r = self.session.get(github_api_address + "/rate_limit", headers = {'Authorization': 'token ' + credentials}, timeout = request_timeout)
 			if int(r.status_code) == 200:
-				content = json.loads(r.text or r.content)
-				self.set_request_number(content["resources"]["core"]["remaining"], content["resources"]["core"]["reset"])
+				content = jsoncodec.loads(r.content)
+				self.set_request_number(content["resources"]["core"]["remaining"], content["resources"]["core"]["reset"], apikey = credentials)
 				return True
 			else:
 				# self.set_request_number("-", "Not connected")
@@ -65,32 +136,116 @@ class GithubDownloader:
 			# self.set_request_number("-", "Not connected")
 			return False
 
+	def cached_response(self, r, entry):
+		"""
+		Creates the response of a conditional request whose content has not changed, using the cached body.
+
+		:param r: the response (with status code 304) of the conditional request.
+		:param entry: the cache entry of the request.
+		:returns: a response with status code 200 and the cached body and headers.
+		"""
+		cached = requests.Response()
+		cached.status_code = 200
+		cached.url = r.url
+		cached.encoding = 'utf-8'
+		cached.headers = CaseInsensitiveDict(r.headers)
+		cached.headers.update(entry["headers"])
+		cached._content = entry["body"].encode('utf-8')
+		return cached
+
+	def backoff_delay(self, attempt):
+		"""
+		Computes the time to wait before retrying a failed request using exponential backoff with jitter, so
+		that requests that failed at the same time are not retried at the same time.
+
+		:param attempt: the number of the attempt that failed (starting from 0).
+		:returns: a random number of seconds between half and the whole of the exponential backoff delay.
+		"""
+		delay = min(retry_backoff_max, retry_backoff_base * 2 ** attempt)
+		return delay / 2 + random.uniform(0, delay / 2)
+
+	def retry_delay(self, attempt, status = None, headers = None, body = b""):
+		"""
+		Decides whether a failed request is retried and computes the time to wait before retrying it. Requests
+		that failed due to connection errors or timeouts, server errors (5xx), and secondary rate limits (403 or
+		429 responses with a Retry-After header or a secondary rate limit message) are retried. A Retry-After
+		header pauses all requests of the downloader, while primary rate limits (403 responses with no remaining
+		requests) are retried immediately, since set_request_number has already waited until their reset.
+
+		:param attempt: the number of the attempt that failed (starting from 0).
+		:param status: the status code of the response, or None if no response was received.
+		:param headers: the headers of the response.
+		:param body: the body of the response as bytes.
+		:returns: the number of seconds to wait before retrying the request, or None if the request is not retried.
+		"""
+		if status == None or status >= 500:
+			return self.backoff_delay(attempt)
+		if status not in (403, 429):
+			return None
+		if 'Retry-After' in headers:
+			retryafter = headers['Retry-After']
+			try:
+				delay = int(retryafter) if retryafter.isdigit() else parsedate_to_datetime(retryafter).timestamp() - time.time()
+			except (TypeError, ValueError):
+				delay = self.backoff_delay(attempt)
+			self.pacer.pause(max(delay, 0))
+			return max(delay, 0)
+		if headers.get('x-ratelimit-remaining') == '0':
+			return 0
+		if status == 429 or b"secondary rate limit" in body.lower():
+			delay = max(60, self.backoff_delay(attempt))
+			self.pacer.pause(delay)
+			return delay
+		return None
+
 	def download_request(self, address, parameters = None, headers = None):
 		"""
-		Implements a download request.
+		Implements a download request. If use_response_cache is True and no headers are given, then the
+		request is sent as a conditional request for any cached response, and the cached response is returned
+		if the content has not changed (such requests do not count against the rate limit). Failed requests
+		are retried up to max_request_retries times (see retry_delay), and each request waits for the request
+		pacer before it is sent.
 
 		:param address: the URL of the request.
 		:param parameters: the parameters of the request.
 		:param headers: the headers of the request.
-		:returns: the response of the request.
+		:returns: the response of the request, or None if no response was received.
 		"""
-		for _ in range(3):
+		parameters = '?' + '&'.join(parameters) if parameters else ""
+		cacheable = self.responsecache != None and not headers
+		entry = self.responsecache.get(address + parameters) if cacheable else None
+		if headers:
+			headers = {headers.split(':')[0].strip() : headers.split(':')[1].strip()}
+		else:
+			headers = self.responsecache.conditional_headers(entry) if entry != None else {}
+		is_search = address.startswith(github_api_address + "/search")
+		for attempt in range(max_request_retries + 1):
+			apikey = self.select_token(is_search)
+			headers['Authorization'] = 'token ' + apikey
+			wait = self.pacer.reserve()
+			metrics.record_sleep("pacing", wait)
+			time.sleep(wait)
+			start = time.perf_counter()
 			try:
-				if parameters:
-					parameters = '?' + '&'.join(parameters)
-				else:
-					parameters = ""
-				if headers:
-					headers = {headers.split(':')[0].strip() : headers.split(':')[1].strip()}
-				else:
-					headers = {}
-				headers['Authorization'] = 'token ' + self.credentials
-				r = requests.get(address + parameters, headers = headers)
+				r = self.session.get(address + parameters, headers = headers, timeout = request_timeout)
+			except (TimeoutError, ConnectionError, Timeout, ChunkedEncodingError):
+				r = None
+			metrics.record_request(address, r.status_code if r != None else None, time.perf_counter() - start, len(r.content) if r != None else 0)
+			if r != None:
 				self.set_request_number(r.headers['x-ratelimit-remaining'] if 'x-ratelimit-remaining' in r.headers else None, \
-										r.headers['x-ratelimit-reset']  if 'x-ratelimit-reset' in r.headers else None, "api.github.com/search" in address)
-				return r
-			except TimeoutError or ConnectionError:
-				return None
+										r.headers['x-ratelimit-reset'] if 'x-ratelimit-reset' in r.headers else None, is_search, apikey)
+			delay = self.retry_delay(attempt, r.status_code, r.headers, r.content) if r != None else self.retry_delay(attempt)
+			if delay == None or attempt == max_request_retries:
+				break
+			metrics.record_sleep("retry", delay)
+			time.sleep(delay)
+		if r == None:
+			return None
+		if entry != None and r.status_code == 304:
+			return self.cached_response(r, entry)
+		if cacheable and r.status_code == 200:
+			self.responsecache.store(address + parameters, r.headers, r.content)
+		return r
 
 	def download_object(self, address, parameters = None, headers = None):
 		"""
@@ -102,8 +257,9 @@ class GithubDownloader:
 		:returns: the contents of the response of the request.
 		"""
 		r = self.download_request(address, parameters, headers)
-		if r.ok:
-			content = json.loads(r.text or r.content) if r.status_code != 204 else {}
+		if r != None and r.ok:
+			with metrics.timer("json_decode_seconds"):
+				content = jsoncodec.loads(r.content) if r.status_code != 204 else {}
 			if type(content) == dict and 'ETag' in r.headers:
 				content['ETag'] = r.headers['ETag']
 			return content  # if not isinstance(content, list) else content[0]
@@ -120,8 +276,11 @@ class GithubDownloader:
 		if 'ETag' in originalobject:
 			headers = "If-None-Match: " + originalobject['ETag']
 			r = self.download_request(address, parameters, headers)
-			if int(r.status_code) == 200:
-				newobject = json.loads(r.text or r.content)
+			if r == None:
+				return None
+			elif int(r.status_code) == 200:
+				with metrics.timer("json_decode_seconds"):
+					newobject = jsoncodec.loads(r.content)
 				if type(newobject) == dict and 'ETag' in r.headers:
 					newobject['ETag'] = r.headers['ETag']
 				return newobject
@@ -129,55 +288,200 @@ class GithubDownloader:
 				return originalobject
 		else:
 			newobject = self.download_object(address, parameters)
+			if newobject == None:
+				return None
 			for keyfield in newobject:
 				originalobject[keyfield] = newobject[keyfield]
 			return originalobject
 
-	def download_paginated_object(self, address, parameters = None, headers = None):
+	def parse_links(self, r):
 		"""
-		Downloads a paginated object of the GitHub API.
+		Parses the Link header of a response of the GitHub API.
+
+		:param r: the response of the request.
+		:returns: a dict with the link types (e.g. next, last) as keys and the link addresses as values.
+		"""
+		links = {}
+		try:
+			for link in r.headers['Link'].split(", "):
+				linkaddress, linktype = link.split("; ")
+				linkaddress = linkaddress[1:-1]
+				linktype = linktype.split("\"")[1]
+				links[linktype] = linkaddress
+		except (KeyError, ValueError):
+			return {}
+		return links
+
+	def parse_page(self, address, r):
+		"""
+		Parses the objects contained in a page of a paginated object of the GitHub API.
+
+		:param address: the URL of the GitHub request.
+		:param r: the response of the request for the page.
+		:returns: a list containing the objects of the page.
+		"""
+		if r != None and r.ok and r.status_code != 204:
+			with metrics.timer("json_decode_seconds"):
+				if address.startswith(github_api_address + "/search"):
+					return jsoncodec.loads(r.content)["items"]
+				else:
+					return jsoncodec.loads(r.content)
+		return []
+
+	def page_number(self, address):
+		"""
+		Returns the number of the page of a paginated object given the address of the page.
+
+		:param address: the address of the page.
+		:returns: the value of the page parameter of the address, or 1 if it has no page parameter.
+		"""
+		return int(dict(parse_qsl(urlsplit(address).query)).get("page", 1))
+
+	def number_of_pages(self, links):
+		"""
+		Returns the number of pages of a paginated object given the links of one of its pages.
+
+		:param links: the links of the page, as returned by parse_links.
+		:returns: the number of pages as given by the rel="last" link, or None if it is not known.
+		"""
+		if "last" in links:
+			return self.page_number(links["last"])
+		return None if "next" in links else 1
+
+	def page_addresses(self, lastaddress, firstpage = 2):
+		"""
+		Computes the addresses of the pages of a paginated object given the address of its last page.
+
+		:param lastaddress: the address of the last page, as given by the rel="last" link.
+		:param firstpage: the number of the first page whose address is computed.
+		:returns: a list containing the addresses of the pages from the first page (by default the second one) up to the last one.
+		"""
+		scheme, netloc, path, query, fragment = urlsplit(lastaddress)
+		parameters = parse_qsl(query, keep_blank_values = True)
+		lastpage = int(dict(parameters)["page"])
+		addresses = []
+		for page in range(firstpage, lastpage + 1):
+			pageparameters = [(key, str(page) if key == "page" else value) for key, value in parameters]
+			addresses.append(urlunsplit((scheme, netloc, path, urlencode(pageparameters), fragment)))
+		return addresses
+
+	def download_pages_concurrently(self, address, pageaddresses, headers = None, page_callback = None, num_pages = None):
+		"""
+		Downloads the given pages of a paginated object using a pool of threads. At most two pages per
+		thread are downloaded ahead of the page that is currently consumed.
+
+		:param address: the URL of the GitHub request.
+		:param pageaddresses: a list containing the addresses of the pages to be downloaded.
+		:param headers: the headers of the GitHub request.
+		:param page_callback: an optional page callback, see download_paginated_object.
+		:param num_pages: the number of pages of the paginated object that is given to the page callback.
+		:returns: a generator containing the objects of the pages, in page order.
+		"""
+		executor = ThreadPoolExecutor(max_workers = num_page_download_threads)
+		pending = deque()
+		try:
+			for pageaddress in pageaddresses[:2 * num_page_download_threads]:
+				pending.append(executor.submit(self.download_request, pageaddress, [], headers))
+			for i, pageaddress in enumerate(pageaddresses):
+				r = pending.popleft().result()
+				if i + 2 * num_page_download_threads < len(pageaddresses):
+					pending.append(executor.submit(self.download_request, pageaddresses[i + 2 * num_page_download_threads], [], headers))
+				page = self.parse_page(address, r)
+				if page_callback != None and r != None and r.ok:
+					page_callback(num_pages, page, pageaddress, pageaddresses[i + 1] if i + 1 < len(pageaddresses) else None)
+				for obj in page:
+					yield obj
+		finally:
+			for future in pending:
+				future.cancel()
+			executor.shutdown()
+
+	def download_paginated_object(self, address, parameters = None, headers = None, page_callback = None, resume_address = None):
+		"""
+		Downloads a paginated object of the GitHub API. If num_page_download_threads is larger than 1
+		and the response has a rel="last" link, then the pages are downloaded concurrently. If a page
+		callback is given, it is called for each page that is downloaded successfully before its objects
+		are returned, so that the size of the paginated object can be computed without sending separate
+		requests for counting it, and so that the download can be resumed from the page after the last
+		completed one (given as the resume address).
 
 		:param address: the URL of the GitHub request.
 		:param parameters: the parameters of the GitHub request.
 		:param headers: the headers of the GitHub request.
+		:param page_callback: an optional function that is called with the number of pages (as returned by
+		number_of_pages for the first downloaded page), the objects of the page, the address of the page,
+		and the address of the next page (or None for the last page).
+		:param resume_address: the address of the page from which the download starts (instead of the first page), or None.
 		:returns: a generator containing all the pages of the response of the request.
 		"""
 		if parameters:
 			parameters.append("per_page=100")
 		else:
 			parameters = ["per_page=100"]
+		pageaddress = resume_address if resume_address != None else address + '?' + '&'.join(parameters)
 
-		r = self.download_request(address, parameters, headers)
-		if r.ok and r.status_code != 204:
-			if "api.github.com/search" in address:
-				for obj in json.loads(r.text or r.content)["items"]:
+		r = self.download_request(pageaddress, [], headers)
+		links = self.parse_links(r) if r != None else {}
+		num_pages = self.number_of_pages(links)
+		page = self.parse_page(address, r)
+		if page_callback != None and r != None and r.ok:
+			page_callback(num_pages, page, pageaddress, links.get("next"))
+		for obj in page:
+			yield obj
+		if num_page_download_threads > 1 and "last" in links:
+			pageaddresses = self.page_addresses(links["last"], self.page_number(pageaddress) + 1)
+			for obj in self.download_pages_concurrently(address, pageaddresses, headers, page_callback, num_pages):
+				yield obj
+			return
+		while "next" in links:
+			pageaddress = links["next"]
+			r = self.download_request(pageaddress, [], headers)
+			links = self.parse_links(r) if r != None else {}
+			page = self.parse_page(address, r)
+			if page_callback != None and r != None and r.ok:
+				page_callback(num_pages, page, pageaddress, links.get("next"))
+			for obj in page:
+				yield obj
+
+	def download_full_objects(self, objects, full_object_address):
+		"""
+		Downloads the full version of objects (e.g. of the issues or commits of a paginated object). If
+		num_full_object_download_threads is larger than 1, the objects are consumed from the given iterable
+		while a pool of threads downloads the full versions of the previous ones, and each full object is
+		returned as soon as it is downloaded. Objects whose full version cannot be downloaded are skipped.
+
+		:param objects: an iterable containing the objects.
+		:param full_object_address: a function that receives an object and returns the URL of its full
+		version, or None if the object does not have to be downloaded again.
+		:returns: a generator containing the objects, where each object is replaced by its full version if required.
+		"""
+		if num_full_object_download_threads <= 1:
+			for obj in objects:
+				address = full_object_address(obj)
+				obj = self.download_object(address) if address != None else obj
+				if obj != None:
 					yield obj
-			else:
-				for obj in json.loads(r.text or r.content):
+			return
+		executor = ThreadPoolExecutor(max_workers = num_full_object_download_threads)
+		pending = set()
+		try:
+			for obj in objects:
+				address = full_object_address(obj)
+				if address == None:
 					yield obj
-		while True:
-			try:
-				links = {}
-				for link in r.headers['Link'].split(", "):
-					linkaddress, linktype = link.split("; ")
-					linkaddress = linkaddress[1:-1]
-					linktype = linktype.split("\"")[1]
-					links[linktype] = linkaddress
-				if "next" in links:
-					relnext = links["next"]
-					is_relnext = True
-				else:
-					is_relnext = False
-			except (KeyError, ValueError):
-				break
-			if is_relnext:
-				r = self.download_request(relnext, [], headers)
-			else:
-				break
-			if r.ok and r.status_code != 204:
-				if "api.github.com/search" in address:
-					for obj in json.loads(r.text or r.content)["items"]:
-						yield obj
-				else:
-					for obj in json.loads(r.text or r.content):
-						yield obj
+					continue
+				pending.add(executor.submit(self.download_object, address))
+				if len(pending) >= 4 * num_full_object_download_threads:
+					done, pending = wait(pending, return_when = FIRST_COMPLETED)
+					for future in done:
+						if future.result() != None:
+							yield future.result()
+			while pending:
+				done, pending = wait(pending, return_when = FIRST_COMPLETED)
+				for future in done:
+					if future.result() != None:
+						yield future.result()
+		finally:
+			for future in pending:
+				future.cancel()
+			executor.shutdown()
@@ -0,0 +1,221 @@
+import re
+import time
+import datetime
+from urllib3.exceptions import TimeoutError
+from requests.exceptions import ConnectionError, Timeout, ChunkedEncodingError
+import metrics
+import jsoncodec
+from downloader.tokenpool import TokenPool
+from properties import github_api_address, graphql_api_address, graphql_batch_size, request_timeout, max_request_retries
+
+class GraphQLDownloader:
+	"""
+	Class that implements a downloader of full issues and commits using the GraphQL API of GitHub. Instead
+	of sending one request to the REST API for each full object, the objects are downloaded in batches of
+	graphql_batch_size objects per GraphQL query, and the results are merged into the objects so that they
+	have the same form as the full objects of the REST API, i.e. issues get their closed_by field and commits
+	get their stats field (the files of the commits are not offered by the GraphQL API). Any object that
+	cannot be downloaded using GraphQL is downloaded using the REST API. The requests are sent using the
+	session, the api keys, and the request pacer of a GithubDownloader, and failed requests are retried as
+	the requests to the REST API. The GraphQL API has its own rate limit, which is kept for each api key in
+	a separate pool using the rateLimit field of the responses.
+	"""
+	def __init__(self, ghd):
+		"""
+		Initializes this GraphQL downloader.
+
+		:param ghd: the GithubDownloader of which the session, the api keys, and the request pacer are used.
+		"""
+		self.ghd = ghd
+		self.tokenpool = TokenPool(ghd.tokenpool.apikeys)
+
+	def parse_full_object_address(self, address):
+		"""
+		Parses the REST API address of a full issue or commit.
+
+		:param address: the address of the full object (e.g. https://api.github.com/repos/owner/name/issues/1).
+		:returns: a tuple containing the owner and the name of the repository, the type of the object (issues or
+		commits) and the number of the issue or the sha of the commit, or None if the address is not supported.
+		"""
+		match = re.match(r".*/repos/([^/]+)/([^/]+)/(issues|commits)/([^/?]+)$", address)
+		return match.groups() if match else None
+
+	def build_query(self, batch):
+		"""
+		Builds the GraphQL query for a batch of full objects. Each object is given the alias n<i> (where i
+		is its index in the batch) inside the repository with the alias r<j>.
+
+		:param batch: a list containing tuples with the parsed address of each object, as returned by parse_full_object_address.
+		:returns: a tuple containing the query and a list with the alias of the repository of each object.
+		"""
+		repositories = {}
+		repository_aliases = []
+		closedevents = "timelineItems(itemTypes: [CLOSED_EVENT], last: 1) { nodes { ... on ClosedEvent { actor { " \
+						"__typename login avatarUrl url ... on User { databaseId id } ... on Bot { databaseId id } } } } }"
+		for i, (owner, name, objtype, objid) in enumerate(batch):
+			fields = repositories.setdefault((owner, name), [])
+			repository_aliases.append("r" + str(list(repositories).index((owner, name))))
+			if objtype == "issues":
+				# The issues of the REST API include the pull requests, which are not found by issue(number:)
+				fields.append("n%d: issueOrPullRequest(number: %d) { ... on Issue { %s } ... on PullRequest { %s } }" % (i, int(objid), closedevents, closedevents))
+			else:
+				fields.append("n%d: object(oid: %s) { ... on Commit { additions deletions } }" % (i, jsoncodec.dumps(objid)))
+		query = "query { rateLimit { remaining resetAt } " + " ".join("r%d: repository(owner: %s, name: %s) { %s }" % (j, jsoncodec.dumps(owner), jsoncodec.dumps(name), " ".join(fields)) \
+										for j, ((owner, name), fields) in enumerate(repositories.items())) + " }"
+		return query, repository_aliases
+
+	def convert_user(self, actor):
+		"""
+		Converts a GraphQL actor to a user object of the REST API.
+
+		:param actor: the GraphQL actor.
+		:returns: a dict containing the user, or None if there is no actor.
+		"""
+		if actor == None:
+			return None
+		return {"login": actor["login"], "id": actor.get("databaseId"), "node_id": actor.get("id"), "avatar_url": actor["avatarUrl"], \
+				"url": github_api_address + "/users/" + actor["login"], "html_url": actor["url"], "type": actor["__typename"]}
+
+	def merge_node(self, obj, objtype, node):
+		"""
+		Merges the result of a GraphQL query for an object into a copy of the object.
+
+		:param obj: the object of the REST API.
+		:param objtype: the type of the object (issues or commits).
+		:param node: the GraphQL node of the object.
+		:returns: the full object, or None if the node is empty.
+		"""
+		if node == None or ("timelineItems" if objtype == "issues" else "additions") not in node:
+			return None
+		fullobj = dict(obj)
+		if objtype == "issues":
+			closedevents = node["timelineItems"]["nodes"]
+			fullobj["closed_by"] = self.convert_user(closedevents[-1].get("actor")) if closedevents else None
+		else:
+			fullobj["stats"] = {"total": node["additions"] + node["deletions"], "additions": node["additions"], "deletions": node["deletions"]}
+		return fullobj
+
+	def merge_batch(self, batch, parsedaddresses, repository_aliases, data):
+		"""
+		Merges the result of a GraphQL query into the objects of a batch.
+
+		:param batch: a list containing tuples with the objects and the addresses of their full versions.
+		:param parsedaddresses: the parsed addresses of the objects of the batch.
+		:param repository_aliases: the alias of the repository of each object, as returned by build_query.
+		:param data: the data of the response of the query, or None if the query failed.
+		:returns: a list containing the full objects, where the objects that were not found are None.
+		"""
+		fullobjects = []
+		for i, ((obj, _), parsedaddress) in enumerate(zip(batch, parsedaddresses)):
+			node = ((data or {}).get(repository_aliases[i]) or {}).get("n" + str(i))
+			fullobjects.append(self.merge_node(obj, parsedaddress[2], node))
+		return fullobjects
+
+	def update_rate_limit(self, apikey, headers, data = None):
+		"""
+		Updates the remaining points of the GraphQL rate limit of an api key, using the rateLimit field of the
+		data of a response if it is given, or else the x-ratelimit-* headers of the response.
+
+		:param apikey: the api key used for the request.
+		:param headers: the headers of the response.
+		:param data: the data of the response, or None.
+		"""
+		ratelimit = (data or {}).get("rateLimit")
+		if ratelimit != None:
+			resettime = datetime.datetime.strptime(ratelimit["resetAt"], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo = datetime.timezone.utc).timestamp()
+			self.tokenpool.update(apikey, ratelimit["remaining"], resettime)
+		elif 'x-ratelimit-remaining' in headers:
+			self.tokenpool.update(apikey, headers['x-ratelimit-remaining'], headers.get('x-ratelimit-reset'))
+
+	def select_token(self):
+		"""
+		Selects the api key with the most remaining points of the GraphQL rate limit. If all api keys are
+		exhausted, then this function waits until the rate limit of any api key is reset.
+
+		:returns: the selected api key.
+		"""
+		apikey = self.tokenpool.select_token()
+		while apikey == None:
+			self.ghd.wait_until_reset(self.tokenpool.exhausted_until() or time.time())
+			apikey = self.tokenpool.select_token()
+		return apikey
+
+	def post_query(self, query):
+		"""
+		Sends a query to the GraphQL API. Failed requests are retried (see GithubDownloader.retry_delay),
+		and each request waits for the request pacer before it is sent.
+
+		:param query: the GraphQL query.
+		:returns: the data of the response (which may be partial if some objects were not found), or None if the query failed.
+		"""
+		for attempt in range(max_request_retries + 1):
+			apikey = self.select_token()
+			wait = self.ghd.pacer.reserve()
+			metrics.record_sleep("pacing", wait)
+			time.sleep(wait)
+			start = time.perf_counter()
+			try:
+				r = self.ghd.session.post(graphql_api_address, data = jsoncodec.dumpb({"query": query}), timeout = request_timeout, \
+										headers = {'Authorization': 'bearer ' + apikey, 'Content-Type': 'application/json'})
+			except (TimeoutError, ConnectionError, Timeout, ChunkedEncodingError):
+				r = None
+			metrics.record_request(graphql_api_address, r.status_code if r != None else None, time.perf_counter() - start, len(r.content) if r != None else 0)
+			if r != None:
+				self.update_rate_limit(apikey, r.headers)
+			delay = self.ghd.retry_delay(attempt, r.status_code, r.headers, r.content) if r != None else self.ghd.retry_delay(attempt)
+			if delay == None or attempt == max_request_retries:
+				break
+			metrics.record_sleep("retry", delay)
+			time.sleep(delay)
+		if r == None or not r.ok:
+			return None
+		data = jsoncodec.loads(r.content).get("data")
+		self.update_rate_limit(apikey, r.headers, data)
+		return data
+
+	def download_batch(self, batch):
+		"""
+		Downloads the full versions of a batch of objects using one GraphQL query. The objects that cannot
+		be downloaded using GraphQL are downloaded using the REST API.
+
+		:param batch: a list containing tuples with the objects and the addresses of their full versions.
+		:returns: a list containing the full objects, where the objects that could not be downloaded are None.
+		"""
+		parsedaddresses = [self.parse_full_object_address(address) for _, address in batch]
+		graphqlbatch = [(obj, address) for (obj, address), parsedaddress in zip(batch, parsedaddresses) if parsedaddress != None]
+		graphqlparsedaddresses = [parsedaddress for parsedaddress in parsedaddresses if parsedaddress != None]
+		query, repository_aliases = self.build_query(graphqlparsedaddresses)
+		data = self.post_query(query) if graphqlbatch else None
+		merged = iter(self.merge_batch(graphqlbatch, graphqlparsedaddresses, repository_aliases, data))
+		fullobjects = []
+		for (obj, address), parsedaddress in zip(batch, parsedaddresses):
+			fullobj = next(merged) if parsedaddress != None else None
+			fullobjects.append(fullobj if fullobj != None else self.ghd.download_object(address))
+		return fullobjects
+
+	def download_full_objects(self, objects, full_object_address):
+		"""
+		Downloads the full version of objects (e.g. of the issues or commits of a paginated object) in batches
+		of graphql_batch_size objects. See also GithubDownloader.download_full_objects.
+
+		:param objects: an iterable containing the objects.
+		:param full_object_address: a function that receives an object and returns the URL of its full
+		version, or None if the object does not have to be downloaded again.
+		:returns: a generator containing the objects, where each object is replaced by its full version if required.
+		"""
+		batch = []
+		for obj in objects:
+			address = full_object_address(obj)
+			if address == None:
+				yield obj
+				continue
+			batch.append((obj, address))
+			if len(batch) >= graphql_batch_size:
+				for fullobj in self.download_batch(batch):
+					if fullobj != None:
+						yield fullobj
+				batch = []
+		if batch:
+			for fullobj in self.download_batch(batch):
+				if fullobj != None:
+					yield fullobj
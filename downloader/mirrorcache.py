@@ -0,0 +1,213 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+import jsoncodec
+from contextlib import contextmanager
+
+class MirrorCache:
+	"""
+	Class that implements an on-disk cache of bare mirrors of repositories, which is shared among the clones
+	of the source code of the downloaded repositories. Each mirror is kept for an upstream repository (i.e.
+	the root of a fork network), so the clones of the upstream repository and of all of its forks reference
+	the same mirror (using git clone --reference); the objects that are found in the mirror are neither
+	downloaded nor stored again by the clones. When the total size of the mirrors exceeds max_size, the least
+	recently used mirrors are evicted. Before a mirror is evicted, the clones that reference it are dissociated
+	from it (i.e. its objects that they use are copied into them), so that they keep working. The mirrors and
+	the clones that reference them are kept in the file mirrors.json of the folder of the cache. The mirrors
+	are created with automatic garbage collection disabled, so that git never prunes objects that are only
+	used by the clones that reference them.
+	"""
+	def __init__(self, cachepath, max_size, fetch_interval = 0):
+		"""
+		Initializes this mirror cache.
+
+		:param cachepath: the path to the folder where the mirrors are stored.
+		:param max_size: the maximum total size of the mirrors in bytes.
+		:param fetch_interval: the number of seconds after fetching a mirror during which it is not fetched again.
+		"""
+		self.cachepath = cachepath
+		self.max_size = max_size
+		self.fetch_interval = fetch_interval
+		self.lock = threading.Lock()
+		self.mirrorlocks = {}
+		self.readers = {}
+		if not os.path.exists(cachepath):
+			os.makedirs(cachepath)
+		self.indexfile = os.path.join(cachepath, "mirrors.json")
+		self.mirrors = self.read_index()
+
+	def read_index(self):
+		"""
+		Reads the index of the mirrors of the cache.
+
+		:returns: a dict with the names of the mirrors as keys and dicts with their last use time, last fetch time,
+		size, and clones as values; mirrors that are not found in the folder of the cache are not included.
+		"""
+		if not os.path.exists(self.indexfile):
+			return {}
+		try:
+			with open(self.indexfile, 'rb') as infile:
+				mirrors = jsoncodec.loads(infile.read())
+		except ValueError:
+			return {}
+		return {name: mirror for name, mirror in mirrors.items() if os.path.isdir(os.path.join(self.cachepath, name))}
+
+	def write_index(self):
+		"""
+		Writes the index of the mirrors of the cache. The index is written to a temporary file that is then
+		renamed, so that an interrupted write does not leave a broken index. This function must be called
+		while holding the lock of the cache.
+		"""
+		fd, tmpfilename = tempfile.mkstemp(dir = self.cachepath, suffix = ".tmp")
+		with os.fdopen(fd, 'wb') as outfile:
+			outfile.write(jsoncodec.dumpb(self.mirrors, indent = 3, sort_keys = True))
+		os.replace(tmpfilename, self.indexfile)
+
+	def mirror_name(self, url):
+		"""
+		Returns the name of the mirror of a repository.
+
+		:param url: the URL of the repository.
+		:returns: the name of the mirror (e.g. user_repo.git for https://github.com/user/repo).
+		"""
+		url = url.rstrip('/')
+		if url.endswith(".git"):
+			url = url[:-len(".git")]
+		return '_'.join(url.split('/')[-2:]) + ".git"
+
+	def directory_size(self, path):
+		"""
+		Computes the size of the files of a folder and its subfolders.
+
+		:param path: the path to the folder.
+		:returns: the total size of the files in bytes.
+		"""
+		size = 0
+		for dirpath, _, filenames in os.walk(path):
+			for filename in filenames:
+				filename = os.path.join(dirpath, filename)
+				if not os.path.islink(filename):
+					size += os.path.getsize(filename)
+		return size
+
+	def mirror_lock(self, name):
+		"""
+		Returns the lock of a mirror, which is held while the mirror is created, fetched, or evicted.
+
+		:param name: the name of the mirror.
+		:returns: the lock of the mirror.
+		"""
+		with self.lock:
+			return self.mirrorlocks.setdefault(name, threading.Lock())
+
+	@contextmanager
+	def reference(self, url, gd):
+		"""
+		Creates or updates the mirror of a repository and holds it while a clone that references it is created
+		or updated, so that it is not evicted in the meantime. The lock of the mirror is held only while the
+		mirror is created or fetched; the clones that use the mirror are counted as its readers, so that the
+		clones of the forks of the same repository are created or updated at the same time. The mirror is not
+		fetched if it was fetched less than fetch_interval seconds ago. The least recently used mirrors are
+		evicted afterwards if the cache exceeds its maximum size.
+
+		:param url: the URL of the upstream repository (the URL may include an api key for private repositories).
+		:param gd: the git downloader used to run the git commands.
+		:returns: a context manager that yields the path to the mirror, or None if the mirror could not be created.
+		"""
+		name = self.mirror_name(url)
+		mirrorpath = os.path.join(self.cachepath, name)
+		with self.mirror_lock(name):
+			with self.lock:
+				last_fetched = self.mirrors.get(name, {}).get("last_fetched", 0)
+			if not os.path.isdir(mirrorpath):
+				succeeded = gd.run_git(['clone', '--mirror', '--progress', '-c', 'gc.auto=0', '-c', 'gc.pruneExpire=never', url, mirrorpath])
+			elif time.time() - last_fetched >= self.fetch_interval:
+				succeeded = gd.run_git(['fetch', '--prune', '--progress'], cwd = mirrorpath)
+			else:
+				succeeded = None
+			if not succeeded and not os.path.isdir(mirrorpath):
+				mirrorpath = None
+			else:
+				size = self.directory_size(mirrorpath) if succeeded != None else None
+				with self.lock:
+					mirror = self.mirrors.setdefault(name, {"clones": []})
+					mirror["last_used"] = time.time()
+					if succeeded:
+						mirror["last_fetched"] = mirror["last_used"]
+					if size != None:
+						mirror["size"] = size
+					self.readers[name] = self.readers.get(name, 0) + 1
+					self.write_index()
+		try:
+			yield mirrorpath
+		finally:
+			if mirrorpath != None:
+				with self.lock:
+					self.readers[name] -= 1
+		self.evict(gd)
+
+	def add_clone(self, url, clonepath):
+		"""
+		Adds a clone to the clones that reference the mirror of a repository.
+
+		:param url: the URL of the upstream repository.
+		:param clonepath: the path to the clone.
+		"""
+		with self.lock:
+			mirror = self.mirrors.get(self.mirror_name(url))
+			if mirror != None and os.path.abspath(clonepath) not in mirror["clones"]:
+				mirror["clones"].append(os.path.abspath(clonepath))
+				self.write_index()
+
+	def evict(self, gd):
+		"""
+		Evicts the least recently used mirrors until the total size of the mirrors does not exceed the maximum
+		size of the cache. The mirrors that are being created, fetched, or used by a clone are not evicted. The
+		clones that reference an evicted mirror are dissociated from it first; the mirrors to be evicted are
+		selected while holding the lock of the cache, but their clones are dissociated while holding only the
+		locks of the mirrors, so that the other mirrors can be used in the meantime. If a mirror is kept because
+		some of its clones could not be dissociated, the next least recently used mirrors are evicted instead.
+
+		:param gd: the git downloader used to dissociate the clones.
+		"""
+		kept = set()
+		while True:
+			evicted = []
+			with self.lock:
+				total_size = sum(mirror["size"] for mirror in self.mirrors.values())
+				for name in sorted(self.mirrors, key = lambda name: self.mirrors[name]["last_used"]):
+					if total_size <= self.max_size:
+						break
+					if name in kept:
+						continue
+					mirrorlock = self.mirrorlocks.setdefault(name, threading.Lock())
+					if not mirrorlock.acquire(blocking = False):
+						continue
+					if self.readers.get(name, 0) > 0:
+						mirrorlock.release()
+						continue
+					evicted.append((name, mirrorlock, list(self.mirrors[name]["clones"])))
+					total_size -= self.mirrors[name]["size"]
+			if not evicted:
+				return
+			try:
+				failed = {}
+				for name, _, clonepaths in evicted:
+					clonepaths = [clonepath for clonepath in clonepaths if gd.git_repo_exists(clonepath)]
+					failed[name] = [clonepath for clonepath in clonepaths if not gd.git_dissociate(clonepath)]
+				with self.lock:
+					for name, _, _ in evicted:
+						if failed[name]:
+							# The mirror is kept for the clones that could not be dissociated
+							self.mirrors[name]["clones"] = failed[name]
+							kept.add(name)
+							continue
+						shutil.rmtree(os.path.join(self.cachepath, name), ignore_errors = True)
+						del self.mirrors[name]
+						gd.logger.log_action("Evicted mirror " + name + " from the mirror cache")
+					self.write_index()
+			finally:
+				for _, mirrorlock, _ in evicted:
+					mirrorlock.release()
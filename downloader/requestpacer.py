@@ -0,0 +1,69 @@
+import time
+import threading
+
+class RequestPacer:
+	"""
+	Class that implements a token bucket that paces the requests to the GitHub API. Tokens are added to the
+	bucket at a rate that spreads the remaining requests of the rate limit evenly over the time until it is
+	reset, and each request consumes one token, so that the requests are sent at a steady rate instead of
+	being sent in bursts until the rate limit is exceeded. The bucket holds at most burst tokens, so that
+	short downloads are not slowed down. Additionally, all requests can be paused for some time (e.g. when
+	the GitHub API responds with a Retry-After header).
+	"""
+	def __init__(self, burst):
+		"""
+		Initializes this request pacer. Until its rate is set, requests are not paced.
+
+		:param burst: the maximum number of requests that can be sent without waiting.
+		"""
+		self.lock = threading.Lock()
+		self.burst = burst
+		self.tokens = burst
+		self.rate = None
+		self.last = time.monotonic()
+		self.paused_until = 0
+
+	def refill(self, now):
+		"""
+		Adds to the bucket the tokens that correspond to the time passed since the last refill. This
+		function must be called while holding the lock of the pacer.
+
+		:param now: the current time, as given by time.monotonic.
+		"""
+		if self.rate != None:
+			self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+		self.last = now
+
+	def set_rate(self, rate):
+		"""
+		Sets the rate at which tokens are added to the bucket.
+
+		:param rate: the number of requests per second, or None to stop pacing the requests.
+		"""
+		with self.lock:
+			self.refill(time.monotonic())
+			self.rate = rate
+
+	def pause(self, seconds):
+		"""
+		Pauses all requests for some time.
+
+		:param seconds: the number of seconds for which no requests are sent.
+		"""
+		with self.lock:
+			self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+	def reserve(self):
+		"""
+		Reserves a token for a request.
+
+		:returns: the number of seconds to wait before sending the request.
+		"""
+		with self.lock:
+			now = time.monotonic()
+			self.refill(now)
+			wait = max(self.paused_until - now, 0)
+			if not self.rate:
+				return wait
+			self.tokens -= 1
+			return max(wait, -self.tokens / self.rate)
@@ -0,0 +1,84 @@
+import os
+import hashlib
+import tempfile
+import jsoncodec
+
+class ResponseCache:
+	"""
+	Class that implements an on-disk cache of responses of the GitHub API. For each URL, the cache keeps
+	the body of the last successful response together with its ETag, Last-Modified and Link headers, so
+	that the next request for the URL can be sent as a conditional request. Each entry is stored in its
+	own file, named after the SHA-1 hash of the URL.
+	"""
+	cached_headers = ["ETag", "Last-Modified", "Link", "Content-Type"]
+
+	def __init__(self, cachepath):
+		"""
+		Initializes this response cache.
+
+		:param cachepath: the path to the folder where the cached responses are stored.
+		"""
+		self.cachepath = cachepath
+		if not os.path.exists(cachepath):
+			os.makedirs(cachepath)
+
+	def entry_filename(self, url):
+		"""
+		Returns the filename of the cache entry of a URL.
+
+		:param url: the URL of the request.
+		:returns: the path to the file of the cache entry.
+		"""
+		urlhash = hashlib.sha1(url.encode('utf-8')).hexdigest()
+		return os.path.join(self.cachepath, urlhash[:2], urlhash + ".json")
+
+	def get(self, url):
+		"""
+		Returns the cache entry of a URL.
+
+		:param url: the URL of the request.
+		:returns: a dict with the keys headers and body, or None if the URL is not cached.
+		"""
+		filename = self.entry_filename(url)
+		if not os.path.exists(filename):
+			return None
+		try:
+			with open(filename, 'rb') as infile:
+				return jsoncodec.loads(infile.read())
+		except ValueError:
+			return None
+
+	def conditional_headers(self, entry):
+		"""
+		Returns the headers that turn a request into a conditional request for a cache entry.
+
+		:param entry: the cache entry, as returned by get.
+		:returns: a dict containing the If-None-Match and/or If-Modified-Since headers.
+		"""
+		headers = {}
+		if "ETag" in entry["headers"]:
+			headers["If-None-Match"] = entry["headers"]["ETag"]
+		if "Last-Modified" in entry["headers"]:
+			headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+		return headers
+
+	def store(self, url, headers, body):
+		"""
+		Stores a response in the cache if it has an ETag or a Last-Modified header. The entry is written
+		to a temporary file that is then renamed, so that an interrupted write does not leave a broken entry.
+
+		:param url: the URL of the request.
+		:param headers: the headers of the response.
+		:param body: the body of the response as bytes.
+		"""
+		if "ETag" not in headers and "Last-Modified" not in headers:
+			return
+		entry = {"url": url, "headers": {header: headers[header] for header in self.cached_headers if header in headers}, \
+				"body": body.decode('utf-8')}
+		filename = self.entry_filename(url)
+		if not os.path.exists(os.path.dirname(filename)):
+			os.makedirs(os.path.dirname(filename), exist_ok = True)
+		fd, tempfilename = tempfile.mkstemp(dir = os.path.dirname(filename), suffix = ".tmp")
+		with os.fdopen(fd, 'wb') as outfile:
+			outfile.write(jsoncodec.dumpb(entry))
+		os.replace(tempfilename, filename)
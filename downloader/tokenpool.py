@@ -0,0 +1,122 @@
+import time
+import threading
+
+class TokenPool:
+	"""
+	Class that implements a pool of GitHub api keys. For each api key, the pool keeps the number of
+	remaining requests and the reset time (both for simple and for search requests), as given by the
+	x-ratelimit-* headers of the GitHub API, as well as the number of requests sent using the api key.
+	"""
+	def __init__(self, apikeys):
+		"""
+		Initializes this pool of GitHub api keys.
+
+		:param apikeys: a list containing the GitHub api keys.
+		"""
+		self.apikeys = list(apikeys)
+		self.lock = threading.Lock()
+		self.limits = {apikey: {"core": {"remaining": -1, "reset": -1}, "search": {"remaining": -1, "reset": -1}} for apikey in self.apikeys}
+		self.requests = {apikey: 0 for apikey in self.apikeys}
+
+	def minimum_remaining(self, is_search):
+		"""
+		Returns the number of remaining requests below which an api key is considered exhausted.
+
+		:param is_search: boolean indicating whether the requests are search requests (True) or not (False).
+		:returns: 5 for search requests, or 100 for simple requests.
+		"""
+		return 5 if is_search else 100
+
+	def headroom(self, apikey, is_search):
+		"""
+		Returns the number of requests that can still be sent using an api key. If the number of
+		remaining requests of the api key is not known or its reset time has passed, the headroom
+		is considered infinite.
+
+		:param apikey: the GitHub api key.
+		:param is_search: boolean indicating whether the requests are search requests (True) or not (False).
+		:returns: the number of requests that can be sent before the api key is exhausted.
+		"""
+		limit = self.limits[apikey]["search" if is_search else "core"]
+		if limit["remaining"] < 0 or limit["reset"] < time.time():
+			return float("inf")
+		return limit["remaining"] - self.minimum_remaining(is_search)
+
+	def select_token(self, is_search = False):
+		"""
+		Selects the api key with the most headroom and counts a request for it.
+
+		:param is_search: boolean indicating whether the request is a search request (True) or not (False).
+		:returns: the selected api key, or None if all api keys are exhausted.
+		"""
+		with self.lock:
+			apikey = max(self.apikeys, key = lambda apikey: self.headroom(apikey, is_search))
+			if self.headroom(apikey, is_search) < 0:
+				return None
+			self.requests[apikey] += 1
+			return apikey
+
+	def update(self, apikey, number, resettime, is_search = False):
+		"""
+		Updates the number of remaining requests and the reset time of an api key.
+
+		:param apikey: the GitHub api key.
+		:param number: the number of remaining requests, or None to decrease the last known number by one.
+		:param resettime: the time (as a UNIX timestamp) of the next renewal of allowed requests, or None if unknown.
+		:param is_search: boolean indicating whether the last request was a search request (True) or not (False).
+		"""
+		with self.lock:
+			limit = self.limits[apikey]["search" if is_search else "core"]
+			limit["remaining"] = int(number) if number != None else limit["remaining"] - 1
+			limit["reset"] = int(float(resettime)) if resettime != None else limit["reset"]
+
+	def remaining(self, is_search = False):
+		"""
+		Returns the total number of remaining requests of all api keys.
+
+		:param is_search: boolean indicating whether the requests are search requests (True) or not (False).
+		:returns: the sum of the remaining requests of the api keys.
+		"""
+		with self.lock:
+			return sum(max(self.limits[apikey]["search" if is_search else "core"]["remaining"], 0) for apikey in self.apikeys)
+
+	def request_rate(self, is_search = False):
+		"""
+		Returns the rate at which requests can be sent so that the remaining requests of each api key
+		are spread evenly over the time until its reset.
+
+		:param is_search: boolean indicating whether the requests are search requests (True) or not (False).
+		:returns: the total rate of the api keys in requests per second, or None if the rate limit of any api key is not known.
+		"""
+		with self.lock:
+			now = time.time()
+			rate = 0
+			for apikey in self.apikeys:
+				limit = self.limits[apikey]["search" if is_search else "core"]
+				if limit["remaining"] < 0 or limit["reset"] < now:
+					return None
+				rate += max(limit["remaining"] - self.minimum_remaining(is_search), 0) / max(limit["reset"] - now, 1)
+			return rate
+
+	def exhausted_until(self, is_search = False):
+		"""
+		Checks whether all api keys are exhausted.
+
+		:param is_search: boolean indicating whether the requests are search requests (True) or not (False).
+		:returns: the earliest reset time (as a UNIX timestamp) if all api keys are exhausted, or None otherwise.
+		"""
+		with self.lock:
+			if any(self.headroom(apikey, is_search) >= 0 for apikey in self.apikeys):
+				return None
+			return min(self.limits[apikey]["search" if is_search else "core"]["reset"] for apikey in self.apikeys)
+
+	def usage(self):
+		"""
+		Returns the usage counters of the api keys. Only the last 4 characters of each api key are shown.
+
+		:returns: a dict with the masked api keys as keys and dicts with the number of requests sent, the
+		number of remaining requests and the reset time as values.
+		"""
+		with self.lock:
+			return {"..." + apikey[-4:]: {"requests": self.requests[apikey], "remaining": self.limits[apikey]["core"]["remaining"], \
+										"reset": self.limits[apikey]["core"]["reset"]} for apikey in self.apikeys}
@@ -1,35 +1,563 @@
 import os
 import sys
+import time
+import asyncio
 import traceback
+import metrics
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from logger.downloadlogger import Logger
 from datamanager.dbmanager import DBManager
 from downloader.gitdownloader import GitDownloader
+from downloader.mirrorcache import MirrorCache
 from datamanager.mongomanager import MongoDBManager
+from datamanager.jsonlmanager import JSONLinesDBManager
 from downloader.githubdownloader import GithubDownloader
-from helpers import get_number_of, print_usage, read_file_in_lines
-from properties import GitHubAuthToken, dataFolderPath, gitExecutablePath, verbose, \
+from downloader.asyncgithubdownloader import AsyncGithubDownloader
+from downloader.graphqldownloader import GraphQLDownloader
+from downloader.asyncgraphqldownloader import AsyncGraphQLDownloader
+from helpers import get_number_of, async_get_number_of, print_usage, read_file_in_lines
+from properties import GitHubAuthToken, github_api_address, dataFolderPath, gitExecutablePath, verbose, \
 	download_issues, download_issue_comments, download_issue_events, \
 	download_commits, download_commit_comments, download_source_code, \
-	download_issues_full, download_commits_full, download_contributors, \
-	update_existing_repos, use_database
+	download_issues_full, download_commits_full, download_contributors, download_project_stats, \
+	update_existing_repos, use_database, use_async_downloader, num_parallel_repos, \
+	use_incremental_updates, use_graphql_full_objects, use_checkpoints, checkpoint_max_age, \
+	use_git_fetch, num_source_code_threads, use_local_commit_stats, use_mirror_cache, mirrorCachePath, mirror_cache_max_size, \
+	mirror_cache_fetch_interval
+
+def create_data_manager(client = None):
+	"""
+	Creates a data manager according to the use_database property.
+
+	:param client: the MongoClient of another MongoDB manager that is shared, or None to create a new one.
+	:returns: an object of type MongoDBManager, JSONLinesDBManager, or DBManager.
+	"""
+	if use_database == 'mongo':
+		return MongoDBManager(client)
+	elif use_database == 'jsonl':
+		return JSONLinesDBManager()
+	else:
+		return DBManager()
 
 # Initialize all required objects
-db = MongoDBManager() if use_database == 'mongo' else DBManager()
+db = create_data_manager()
 lg = Logger(verbose)
 ghd = GithubDownloader(GitHubAuthToken)
-gd = GitDownloader(gitExecutablePath, lg, GitHubAuthToken)
+fod = GraphQLDownloader(ghd) if use_graphql_full_objects else ghd
+mc = MirrorCache(mirrorCachePath, mirror_cache_max_size * 1024 ** 3, mirror_cache_fetch_interval) if use_mirror_cache else None
+gd = GitDownloader(gitExecutablePath, lg, GitHubAuthToken, mc)
+sourcecodeexecutor = ThreadPoolExecutor(max_workers = max(num_source_code_threads, 1)) \
+						if num_source_code_threads > 0 or use_local_commit_stats else None
+
+def get_sections(repo_name, repo_api_address, project, db, localcommits = None):
+	"""
+	Returns the sections of a repository, i.e. issues, issue comments, issue events, commits, commit comments,
+	and contributors. Each section is a dict that includes the name of its statistic, the message to be logged,
+	the address and the parameters of its paginated object, whether it is selected to be downloaded, and two
+	functions: one that receives an object and returns the address of its full version (or None if the full
+	version is not required) and one that stores an object in the project (if it is not already stored).
+	Both functions receive also a refresh argument, which is True when the object is known to have changed
+	(so it has to be downloaded and stored again even if it exists). Finally, for incremental updates, each
+	section includes a function that returns the high water mark of an object (i.e. its last update date),
+	and whether the section supports the since parameter or is ordered from newest to oldest (so that its
+	download can stop at the first object older than the high water mark). Each section includes also the key
+	field of its objects, which is used to track the pages whose objects are all stored for checkpoints, and
+	a function that has to be called before the section is downloaded (or None if nothing has to be prepared).
+
+	:param repo_name: the name of the repository.
+	:param repo_api_address: the GitHub API URL of the repository.
+	:param project: the project where the downloaded objects are stored.
+	:param db: the data manager used to write the downloaded objects.
+	:param localcommits: the LocalCommitStats used to fill the stats and the files of the full commits, or None to download them.
+	:returns: a list containing the sections of the repository.
+	"""
+	def full_issue_address(issue, refresh = False):
+		if download_issues_full and issue["state"] == "closed" and (refresh or not project.full_issue_exists(issue)):
+			return repo_api_address + "/issues/" + str(issue["number"])
+
+	def store_issue(issue, refresh = False):
+		if refresh or not project.issue_exists(issue) or (download_issues_full and not project.full_issue_exists(issue)):
+			if download_issues_full and "closed_by" not in issue:
+				issue["closed_by"] = None
+			project.add_issue(issue)
+			db.write_project_issue_to_disk(repo_name, issue)
+
+	def store_issue_comment(issue_comment, refresh = False):
+		if refresh or not project.issue_comment_exists(issue_comment):
+			project.add_issue_comment(issue_comment)
+			db.write_project_issue_comment_to_disk(repo_name, issue_comment)
+
+	def store_issue_event(issue_event, refresh = False):  # @UnusedVariable
+		if not project.issue_event_exists(issue_event):
+			project.add_issue_event(issue_event)
+			db.write_project_issue_event_to_disk(repo_name, issue_event)
+
+	def full_commit_address(commit, refresh = False):  # @UnusedVariable
+		if download_commits_full and not project.full_commit_exists(commit):
+			# The commits that are found in the local clone are filled from it instead of being downloaded
+			if localcommits != None and localcommits.add_stats_and_files(commit):
+				return None
+			return repo_api_address + "/commits/" + str(commit["sha"])
+
+	def store_commit(commit, refresh = False):  # @UnusedVariable
+		if not project.commit_exists(commit) or (download_commits_full and not project.full_commit_exists(commit)):
+			project.add_commit(commit)
+			db.write_project_commit_to_disk(repo_name, commit)
+
+	def store_commit_comment(commit_comment, refresh = False):  # @UnusedVariable
+		if not project.commit_comment_exists(commit_comment):
+			project.add_commit_comment(commit_comment)
+			db.write_project_commit_comment_to_disk(repo_name, commit_comment)
+
+	def store_contributor(contributor, refresh = False):  # @UnusedVariable
+		if not project.contributor_exists(contributor):
+			project.add_contributor(contributor)
+			db.write_project_contributor_to_disk(repo_name, contributor)
+
+	def no_full_address(obj, refresh = False):  # @UnusedVariable
+		return None
+
+	def updated_at(obj):
+		return obj["updated_at"]
+
+	def created_at(obj):
+		return obj["created_at"]
+
+	def commit_date(commit):
+		return commit["commit"]["committer"]["date"]
+
+	return [
+		{"name": "issues", "key": "id", "message": "issues", "path": "issues", "parameters": ["state=all"], "download": download_issues,
+			"full_object_address": full_issue_address, "store_object": store_issue,
+			"high_water_mark": updated_at, "since": True, "newest_first": False, "prepare": None},
+		{"name": "issue_comments", "key": "id", "message": "issue comments", "path": "issues/comments", "parameters": [], "download": download_issue_comments,
+			"full_object_address": no_full_address, "store_object": store_issue_comment,
+			"high_water_mark": updated_at, "since": True, "newest_first": False, "prepare": None},
+		{"name": "issue_events", "key": "id", "message": "issue events", "path": "issues/events", "parameters": [], "download": download_issue_events,
+			"full_object_address": no_full_address, "store_object": store_issue_event,
+			"high_water_mark": created_at, "since": False, "newest_first": True, "prepare": None},
+		{"name": "commits", "key": "sha", "message": "commits", "path": "commits", "parameters": [], "download": download_commits,
+			"full_object_address": full_commit_address, "store_object": store_commit,
+			"high_water_mark": commit_date, "since": True, "newest_first": False, "prepare": localcommits.load if localcommits != None else None},
+		{"name": "commit_comments", "key": "id", "message": "commit comments", "path": "comments", "parameters": [], "download": download_commit_comments,
+			"full_object_address": no_full_address, "store_object": store_commit_comment,
+			"high_water_mark": None, "since": False, "newest_first": False, "prepare": None},
+		{"name": "contributors", "key": "id", "message": "contributors", "path": "contributors", "parameters": [], "download": download_contributors,
+			"full_object_address": no_full_address, "store_object": store_contributor,
+			"high_water_mark": None, "since": False, "newest_first": False, "prepare": None}
+	]
+
+class IncrementalUpdate:
+	"""
+	Class that implements the incremental update of a section of a repository. If use_incremental_updates is
+	True and the project has a high water mark for the section, then only the objects that have changed since
+	the high water mark are downloaded (using the since parameter, or by stopping at the first older object
+	for sections ordered from newest to oldest) and are stored again even if they already exist. The high
+	water mark is advanced and written to disk only after the whole section is downloaded, i.e. if no page
+	failed and no full object was missing (see SectionCheckpoint); otherwise the previous high water mark is
+	kept, so that the objects that were not stored are downloaded by the next update.
+	"""
+	def __init__(self, section, project):
+		"""
+		Initializes this incremental update.
+
+		:param section: the section to be updated, as returned by get_sections.
+		:param project: the project where the downloaded objects are stored.
+		"""
+		self.section = section
+		self.project = project
+		self.high_water_mark = project.get_high_water_mark(section["name"]) if use_incremental_updates and section["high_water_mark"] else None
+		self.new_high_water_mark = self.high_water_mark
+		self.refresh = self.high_water_mark != None and self.section["since"]
+		self.stopped = False
+
+	def parameters(self):
+		"""
+		Returns the parameters of the paginated object of the section.
+
+		:returns: the parameters of the section, including the since parameter if required.
+		"""
+		return list(self.section["parameters"]) + (["since=" + self.high_water_mark] if self.refresh else [])
+
+	def full_object_address(self, obj):
+		"""
+		Returns the address of the full version of an object of the section.
+
+		:param obj: the object of the section.
+		:returns: the address of the full version of the object, or None if it is not required.
+		"""
+		return self.section["full_object_address"](obj, self.refresh)
+
+	def store_object(self, obj):
+		"""
+		Stores an object of the section and updates the high water mark.
+
+		:param obj: the object of the section.
+		:returns: False if the download of the section should stop (the object is older than the high water mark), or True otherwise.
+		"""
+		if self.section["high_water_mark"]:
+			obj_high_water_mark = self.section["high_water_mark"](obj)
+			if self.high_water_mark != None and self.section["newest_first"] and obj_high_water_mark < self.high_water_mark:
+				self.stopped = True
+				return False
+			if self.new_high_water_mark == None or obj_high_water_mark > self.new_high_water_mark:
+				self.new_high_water_mark = obj_high_water_mark
+		self.section["store_object"](obj, self.refresh)
+		metrics.count("items_total", {"resource": self.section["name"]})
+		return True
+
+	def finalize(self, repo_name, db, checkpoint):
+		"""
+		Adds the new high water mark of the section to the project and writes the high water marks to disk,
+		if the whole section was downloaded.
+
+		:param repo_name: the name of the repository.
+		:param db: the data manager used to write the high water marks.
+		:param checkpoint: the checkpoint of the section, which indicates whether the whole section was downloaded.
+		"""
+		if self.section["high_water_mark"] and self.new_high_water_mark != None and checkpoint.complete:
+			self.project.add_high_water_mark(self.section["name"], self.new_high_water_mark)
+			db.write_project_high_water_marks_to_disk(repo_name, self.project["info"], self.project["highwatermarks"])
+
+class SectionStatistic:
+	"""
+	Class that computes the statistic of a section of a repository (i.e. its number of objects) from the pages
+	that are downloaded for the section, so that no separate requests are sent for counting its objects. When
+	the first page is downloaded, the number of objects is estimated from the number of pages (given by the
+	rel="last" link) and is set as the length of the current action of the logger. The statistic is known only
+	if all the pages of the section are downloaded without the since parameter; otherwise, it has to be counted
+	using get_number_of.
+	"""
+	def __init__(self, update, lg = None):
+		"""
+		Initializes this section statistic.
+
+		:param update: the incremental update of the section.
+		:param lg: the logger of which the length of the current action is set, or None to not set it.
+		"""
+		self.lg = lg
+		self.countable = update.section["download"] and not update.refresh
+		self.num_pages = None
+		self.num_downloaded_pages = 0
+		self.num_objects = 0
+
+	def count_page(self, num_pages, page, pageaddress, nextaddress):  # @UnusedVariable
+		"""
+		Counts the objects of a downloaded page of the section. This function is given as a page
+		callback of the paginated object of the section.
+
+		:param num_pages: the number of pages of the section, or None if it is not known.
+		:param page: a list containing the objects of the page.
+		:param pageaddress: the address of the page.
+		:param nextaddress: the address of the next page, or None if this is the last page.
+		"""
+		if self.num_downloaded_pages == 0 and self.lg != None and num_pages != None:
+			self.lg.set_action_length(len(page) if num_pages == 1 else 100 * num_pages)
+		self.num_pages = num_pages
+		self.num_downloaded_pages += 1
+		self.num_objects += len(page)
+
+	def value(self):
+		"""
+		Returns the statistic of the section.
+
+		:returns: the number of objects of the section, or None if not all of its pages were counted.
+		"""
+		if self.countable and self.num_pages != None and self.num_downloaded_pages == self.num_pages:
+			return self.num_objects
+
+class SectionCheckpoint:
+	"""
+	Class that implements the checkpoint of a section of a repository, i.e. the address of the page from which
+	an interrupted download of the section is resumed, and whether the section is finished. A page is completed
+	when all of its objects are stored (which may happen out of order when full objects are downloaded
+	concurrently), and the checkpoint advances only over consecutive completed pages, so that resuming never
+	skips an object that was not stored. The section is complete if the checkpoint advances over its last
+	page, or if its download stops at the high water mark after all the preceding pages were completed; a
+	page that failed, or a full object that could not be downloaded (so it was never stored), keeps the section
+	incomplete. If use_checkpoints is True, the checkpoint is written to disk whenever it advances.
+	"""
+	def __init__(self, update, repo_name, db):
+		"""
+		Initializes this section checkpoint from the checkpoint of the section in the project (if any).
+
+		:param update: the incremental update of the section.
+		:param repo_name: the name of the repository.
+		:param db: the data manager used to write the checkpoints.
+		"""
+		self.update = update
+		self.section = update.section
+		self.project = update.project
+		self.repo_name = repo_name
+		self.db = db
+		checkpoint = self.project.get_checkpoint(self.section["name"]) or {}
+		self.finished = checkpoint.get("finished", False)
+		self.resume_address = checkpoint.get("next")
+		self.next_address = self.resume_address
+		self.started = False
+		self.complete = False
+		self.pages = deque()
+
+	def add_page(self, num_pages, page, pageaddress, nextaddress):  # @UnusedVariable
+		"""
+		Adds a downloaded page of the section, whose objects are pending until they are stored. This
+		function is given as a page callback of the paginated object of the section.
+
+		:param num_pages: the number of pages of the section, or None if it is not known.
+		:param page: a list containing the objects of the page.
+		:param pageaddress: the address of the page.
+		:param nextaddress: the address of the next page, or None if this is the last page.
+		"""
+		self.pages.append((pageaddress, nextaddress, set(obj[self.section["key"]] for obj in page)))
+		self.advance()
+
+	def stop_at(self, obj):
+		"""
+		Marks that the download of the section stopped at an object that is older than the high water mark of
+		an incremental update. The section is complete if the object is in the first page that is not completed
+		and that page follows the last completed page.
+
+		:param obj: the object at which the download stopped.
+		"""
+		if self.pages and obj[self.section["key"]] in self.pages[0][2] and (not self.started or self.pages[0][0] == self.next_address):
+			self.complete = True
+
+	def store_object(self, obj):
+		"""
+		Marks an object of the section as stored.
+
+		:param obj: the object that was stored.
+		"""
+		key = obj[self.section["key"]]
+		for _, _, pending in self.pages:
+			if key in pending:
+				pending.discard(key)
+				break
+		self.advance()
+
+	def advance(self):
+		"""
+		Advances the checkpoint over the consecutive completed pages and writes it if it has advanced. The
+		checkpoint does not advance over a page that does not follow the last completed page (e.g. when the
+		download of a page failed).
+		"""
+		advanced = False
+		while self.pages and not self.pages[0][2]:
+			pageaddress, nextaddress, _ = self.pages[0]
+			if self.started and pageaddress != self.next_address:
+				break
+			self.pages.popleft()
+			self.started = True
+			self.next_address = nextaddress
+			advanced = True
+		if advanced:
+			self.complete = self.next_address == None
+			self.write(False)
+
+	def finalize(self):
+		"""
+		Finalizes the checkpoint of the section after its download. The section is finished if it is complete.
+		"""
+		if self.complete:
+			self.finished = True
+			self.write(True)
+
+	def write(self, finished):
+		"""
+		Adds the checkpoint of the section to the project and writes the checkpoints of the project.
+
+		:param finished: boolean indicating whether the section is finished.
+		"""
+		if self.project.get("checkpoints") != None:
+			self.project.add_checkpoint(self.section["name"], {"next": self.next_address, "finished": finished})
+			self.db.write_project_checkpoints_to_disk(self.repo_name, self.project["info"], self.project["checkpoints"])
+
+class LocalCommitStats:
+	"""
+	Class that fills the stats and the files of the commits of a repository from the local clone of its source
+	code, so that the full commits do not have to be downloaded one by one. The commits of all the branches of
+	the clone are read using one git log command, after the source code is retrieved and before the commits
+	of the repository are downloaded. Merge commits and the commits at the boundary of a shallow clone are not
+	read, since their diff differs from the one of the GitHub API, so they are downloaded as any other commit
+	that is not found in the clone. Partial clones are not read at all, since git would download the contents
+	of all the changed files one by one to compute the stats.
+	"""
+	def __init__(self, repo_name, sourcecode, lg = lg, gd = gd):
+		"""
+		Initializes this local commit stats object.
+
+		:param repo_name: the name of the repository.
+		:param sourcecode: the future of the retrieval of the source code of the repository.
+		:param lg: the logger used to log the number of commits read from the clone.
+		:param gd: the git downloader used to read the commits of the clone.
+		"""
+		self.repo_name = repo_name
+		self.sourcecode = sourcecode
+		self.lg = lg
+		self.gd = gd
+		self.commits = None
+
+	def load(self):
+		"""
+		Waits until the source code of the repository is retrieved and reads the commits of its clone.
+		"""
+		if self.commits != None:
+			return
+		self.sourcecode.result()
+		git_repo_path = os.path.join(dataFolderPath, self.repo_name, "sourcecode")
+		shallowfile = os.path.join(git_repo_path, ".git", "shallow")
+		shallow = set(read_file_in_lines(shallowfile)) if os.path.exists(shallowfile) else set()
+		self.commits = {}
+		if self.gd.git_repo_exists(git_repo_path) and self.gd.git_is_partial(git_repo_path):
+			self.lg.log_action("Skipped reading the commits of the partial clone of the source code")
+			return
+		if self.gd.git_repo_exists(git_repo_path):
+			for sha, parents, files in self.gd.git_log(git_repo_path):
+				if len(parents) <= 1 and sha not in shallow:
+					self.commits[sha] = files
+		self.lg.log_action("Read " + str(len(self.commits)) + " commits from the source code")
+
+	def add_stats_and_files(self, commit):
+		"""
+		Adds the stats and the files of a commit, if the commit is found in the clone.
+
+		:param commit: the commit, as returned by the paginated object of the commits.
+		:returns: True if the stats and the files were added to the commit, or False otherwise.
+		"""
+		self.load()
+		files = self.commits.pop(commit["sha"], None)
+		if files == None:
+			return False
+		additions = sum(changedfile["additions"] for changedfile in files)
+		deletions = sum(changedfile["deletions"] for changedfile in files)
+		commit["stats"] = {"total": additions + deletions, "additions": additions, "deletions": deletions}
+		commit["files"] = files
+		return True
+
+def page_callbacks(*callbacks):
+	"""
+	Combines page callbacks (e.g. of a section statistic and a section checkpoint) into one page callback.
+
+	:param callbacks: the page callbacks to be combined.
+	:returns: a function that calls all the page callbacks.
+	"""
+	def page_callback(num_pages, page, pageaddress, nextaddress):
+		for callback in callbacks:
+			callback(num_pages, page, pageaddress, nextaddress)
+	return page_callback
+
+def recent_checkpoints(checkpoints):
+	"""
+	Checks whether the checkpoints of a project can be used, i.e. whether use_checkpoints is True and the
+	checkpoints were started less than checkpoint_max_age seconds ago.
+
+	:param checkpoints: the checkpoints of the project.
+	:returns: True if the checkpoints can be used, or False otherwise.
+	"""
+	return use_checkpoints and bool(checkpoints) and checkpoints["started_at"] > time.time() - checkpoint_max_age
+
+def initialize_checkpoints(project):
+	"""
+	Initializes the checkpoints of a project. If the checkpoints of the project cannot be used, the download
+	starts from the first page of each section; if use_checkpoints is False, no checkpoints are kept.
+
+	:param project: the project of which the checkpoints are initialized.
+	"""
+	if not use_checkpoints:
+		project["checkpoints"] = None
+	elif not recent_checkpoints(project["checkpoints"]):
+		project.start_checkpoints(time.time())
+
+def finalize_checkpoints(repo_name, project, checkpoints, db):
+	"""
+	Marks the checkpoints of a project as completed if all the downloaded sections are finished, so that
+	the project is skipped if it is downloaded again before its checkpoints expire.
+
+	:param repo_name: the name of the repository.
+	:param project: the project of which the checkpoints are completed.
+	:param checkpoints: a list containing the section checkpoints of the project.
+	:param db: the data manager used to write the checkpoints.
+	"""
+	if project["checkpoints"] != None and all(checkpoint.finished for checkpoint in checkpoints if checkpoint.section["download"]):
+		project.complete_checkpoints(time.time())
+		db.write_project_checkpoints_to_disk(repo_name, project["info"], project["checkpoints"])
 
-def download_repo(repo_address):
+def get_upstream_address(repo_address, project_info):
 	"""
-	Downloads all the data of a repository given its GitHub URL.
+	Returns the URL of the upstream repository of a repository, i.e. of the root of its fork network, of which
+	the mirror is referenced by the clone of the repository when a mirror cache is used.
+
+	:param repo_address: the URL of the repository.
+	:param project_info: the info of the repository, as returned by the GitHub API.
+	:returns: the URL of the root of the fork network of the repository, or the URL of the repository if it is not a fork.
+	"""
+	if project_info and project_info.get("source"):
+		return project_info["source"]["html_url"]
+	return repo_address
+
+def download_source_code_of_repo(repo_address, repo_name, upstream_address = None, lg = lg, gd = gd):
+	"""
+	Clones the source code of a repository, or updates it (using git pull or git fetch) if it has already been cloned.
+
+	:param repo_address: the URL of the repository.
+	:param repo_name: the name of the repository.
+	:param upstream_address: the URL of the upstream repository of which the mirror is referenced, or None.
+	:param lg: the logger used to log the progress of the download.
+	:param gd: the git downloader used to clone or update the repository.
+	"""
+	lg.log_action("Retrieving source code...")
+	git_repo_path = os.path.join(dataFolderPath, repo_name, "sourcecode")
+	if not gd.git_repo_exists(git_repo_path):
+		gd.git_clone(repo_address, git_repo_path, upstream_address)
+	elif use_git_fetch:
+		gd.git_fetch(git_repo_path, upstream_address)
+	else:
+		gd.git_pull(git_repo_path, upstream_address)
+
+def start_source_code_download(repo_address, repo_name, upstream_address = None, lg = lg, gd = gd):
+	"""
+	Starts retrieving the source code of a repository in the background if num_source_code_threads is more
+	than 0, so that it overlaps with the download of the data of the repository.
+
+	:param repo_address: the URL of the repository.
+	:param repo_name: the name of the repository.
+	:param upstream_address: the URL of the upstream repository of which the mirror is referenced, or None.
+	:param lg: the logger used to log the progress of the download.
+	:param gd: the git downloader used to clone or update the repository.
+	:returns: a future of the retrieval, or None if the source code is not retrieved in the background.
+	"""
+	if not download_source_code or sourcecodeexecutor == None:
+		return None
+	return sourcecodeexecutor.submit(download_source_code_of_repo, repo_address, repo_name, upstream_address, lg, gd)
+
+@metrics.profiled
+def download_repo(repo_address, db = db, lg = lg, gd = gd):
+	"""
+	Downloads all the data of a repository given its GitHub URL. If use_async_downloader is True, then
+	the download is delegated to async_download_repo. Any exception is raised after the data that were
+	already downloaded are written to disk.
 
 	:param repo_address: the URL of the repository of which the data are downloaded.
+	:param db: the data manager used to read and write the data of the repository.
+	:param lg: the logger used to log the progress of the download.
+	:param gd: the git downloader used to download the source code of the repository.
 	"""
-	repo_api_address = "https://api.github.com/repos/" + '/'.join(repo_address.split('/')[-2:])
+	if use_async_downloader:
+		return asyncio.run(async_download_repo(repo_address, db, lg, gd))
+
+	repo_api_address = github_api_address + "/repos/" + '/'.join(repo_address.split('/')[-2:])
 	repo_name = '_'.join(repo_address.split('/')[-2:])
 
 	lg.log_action("Downloading project " + repo_name)
-	if db.project_exists(repo_name):
+	checkpoints = db.read_project_checkpoints(repo_name) if use_checkpoints else None
+	if recent_checkpoints(checkpoints):
+		if checkpoints["completed_at"] != None:
+			lg.log_action("Project already downloaded according to its checkpoints! Skipping...")
+			return
+		# An interrupted download is resumed even if existing projects are not updated
+		lg.log_action("Project download was interrupted! Resuming...")
+	elif db.project_exists(repo_name):
 		if update_existing_repos:
 			lg.log_action("Project already exists! Updating...")
 		else:
@@ -39,135 +567,325 @@ def download_repo(repo_address):
 	db.initialize_write_to_disk(repo_name)
 
 	project = db.read_project_from_disk(repo_name)
+	for filename in project.get_quarantined_files():
+		lg.log_action("Moved unreadable file to " + filename)
+	initialize_checkpoints(project)
 
 	try:
 		project_info = ghd.download_object(repo_api_address)
 		project.add_info(project_info)
 		db.write_project_info_to_disk(repo_name, project["info"])
+		upstream_address = get_upstream_address(repo_address, project["info"])
+		sourcecode = start_source_code_download(repo_address, repo_name, upstream_address, lg, gd)
+		localcommits = LocalCommitStats(repo_name, sourcecode, lg, gd) if use_local_commit_stats and download_commits_full and sourcecode != None else None
 
-		lg.start_action("Retrieving project statistics...", 6)
-		project_stats = {}
-		project_stats["issues"] = get_number_of(ghd, repo_api_address, "issues", "state=all")
-		lg.step_action()
-		project_stats["issue_comments"] = get_number_of(ghd, repo_api_address, "issues/comments")
-		lg.step_action()
-		project_stats["issue_events"] = get_number_of(ghd, repo_api_address, "issues/events")
-		lg.step_action()
-		project_stats["commits"] = get_number_of(ghd, repo_api_address, "commits")
-		lg.step_action()
-		project_stats["commit_comments"] = get_number_of(ghd, repo_api_address, "comments")
-		lg.step_action()
-		project_stats["contributors"] = get_number_of(ghd, repo_api_address, "contributors")
-		lg.step_action()
-		project.add_stats(project_stats)
-		lg.end_action()
-		db.write_project_stats_to_disk(repo_name, project["info"], project["stats"])
-
-		if download_issues:
-			lg.start_action("Retrieving issues...", project_stats["issues"])
-			repo_issues_address = repo_api_address + "/issues"
-			for issue in ghd.download_paginated_object(repo_issues_address, ["state=all"]):
-				if not project.issue_exists(issue):
-					if download_issues_full:
-						if issue["state"] == "closed":
-							issue = ghd.download_object(repo_issues_address + "/" + str(issue["number"]))
-						else:
-							issue["closed_by"] = None
-					project.add_issue(issue)
-					db.write_project_issue_to_disk(repo_name, issue)
-				else:
-					if download_issues_full and not project.full_issue_exists(issue):
-						if issue["state"] == "closed":
-							issue = ghd.download_object(repo_issues_address + "/" + str(issue["number"]))
-						else:
-							issue["closed_by"] = None
-						project.add_issue(issue)
-						db.write_project_issue_to_disk(repo_name, issue)
-				lg.step_action()
-			lg.end_action()
+		sections = get_sections(repo_name, repo_api_address, project, db, localcommits)
+		updates = [IncrementalUpdate(section, project) for section in sections]
+		statistics = [SectionStatistic(update, lg) for update in updates]
+		checkpoints = [SectionCheckpoint(update, repo_name, db) for update in updates]
 
-		if download_issue_comments:
-			lg.start_action("Retrieving issue comments...", project_stats["issue_comments"])
-			repo_issue_comments_address = repo_issues_address + "/comments"
-			for issue_comment in ghd.download_paginated_object(repo_issue_comments_address):
-				if not project.issue_comment_exists(issue_comment):
-					project.add_issue_comment(issue_comment)
-					db.write_project_issue_comment_to_disk(repo_name, issue_comment)
-				lg.step_action()
-			lg.end_action()
+		# The sections that cannot be counted while downloading them are counted concurrently in the meantime
+		with ThreadPoolExecutor(max_workers = len(sections)) as counter:
+			counts = [counter.submit(get_number_of, ghd, repo_api_address, section["path"], *section["parameters"]) \
+						if download_project_stats and not statistic.countable else None for section, statistic in zip(sections, statistics)]
 
-		if download_issue_events:
-			lg.start_action("Retrieving issue events...", project_stats["issue_events"])
-			repo_issue_events_address = repo_issues_address + "/events"
-			for issue_event in ghd.download_paginated_object(repo_issue_events_address):
-				if not project.issue_event_exists(issue_event):
-					project.add_issue_event(issue_event)
-					db.write_project_issue_event_to_disk(repo_name, issue_event)
-				lg.step_action()
-			lg.end_action()
+			for section, update, statistic, checkpoint in zip(sections, updates, statistics, checkpoints):
+				if section["download"] and not checkpoint.finished:
+					if section["prepare"] != None:
+						section["prepare"]()
+					lg.start_action("Retrieving " + section["message"] + "...")
+					objects = ghd.download_paginated_object(repo_api_address + "/" + section["path"], update.parameters(), \
+								page_callback = page_callbacks(statistic.count_page, checkpoint.add_page), resume_address = checkpoint.resume_address)
+					for obj in fod.download_full_objects(objects, update.full_object_address):
+						if not update.store_object(obj):
+							checkpoint.stop_at(obj)
+							break
+						checkpoint.store_object(obj)
+						lg.step_action()
+					update.finalize(repo_name, db, checkpoint)
+					checkpoint.finalize()
+					lg.end_action()
 
-		if download_commits:
-			lg.start_action("Retrieving commits...", project_stats["commits"])
-			repo_commits_address = repo_api_address + "/commits"
-			for commit in ghd.download_paginated_object(repo_commits_address):
-				if not project.commit_exists(commit):
-					if download_commits_full:
-						commit = ghd.download_object(repo_commits_address + "/" + str(commit["sha"]))
-					project.add_commit(commit)
-					db.write_project_commit_to_disk(repo_name, commit)
-				else:
-					if download_commits_full and not project.full_commit_exists(commit):
-						commit = ghd.download_object(repo_commits_address + "/" + str(commit["sha"]))
-						project.add_commit(commit)
-						db.write_project_commit_to_disk(repo_name, commit)
-				lg.step_action()
-			lg.end_action()
+			if download_project_stats:
+				lg.start_action("Retrieving project statistics...")
+				counts = [counter.submit(get_number_of, ghd, repo_api_address, section["path"], *section["parameters"]) \
+							if count == None and statistic.value() == None else count for section, statistic, count in zip(sections, statistics, counts)]
+				project.add_stats({section["name"]: count.result() if count != None else statistic.value() for section, statistic, count in zip(sections, statistics, counts)})
+				lg.end_action()
+				db.write_project_stats_to_disk(repo_name, project["info"], project["stats"])
 
-		if download_commit_comments:
-			lg.start_action("Retrieving commit comments...", project_stats["commit_comments"])
-			repo_commit_comments_address = repo_api_address + "/comments"
-			for commit_comment in ghd.download_paginated_object(repo_commit_comments_address):
-				if not project.commit_comment_exists(commit_comment):
-					project.add_commit_comment(commit_comment)
-					db.write_project_commit_comment_to_disk(repo_name, commit_comment)
-				lg.step_action()
-			lg.end_action()
+		if sourcecode != None:
+			sourcecode.result()
+		elif download_source_code:
+			download_source_code_of_repo(repo_address, repo_name, upstream_address, lg, gd)
 
-		if download_contributors:
-			lg.start_action("Retrieving contributors...", project_stats["contributors"])
-			repo_contributors_address = repo_api_address + "/contributors"
-			for contributor in ghd.download_paginated_object(repo_contributors_address):
-				if not project.contributor_exists(contributor):
-					project.add_contributor(contributor)
-					db.write_project_contributor_to_disk(repo_name, contributor)
-				lg.step_action()
-			lg.end_action()
+		finalize_checkpoints(repo_name, project, checkpoints, db)
+
+	finally:
+		# This line of code is always executed even if an exception occurs
+		db.finalize_write_to_disk(repo_name, project)
+		metrics.export()
+
+async def gather_or_cancel(*coroutines):
+	"""
+	Runs coroutines concurrently and returns their results, as asyncio.gather does. If any of them fails
+	(or the caller is cancelled), the rest are cancelled and awaited before the exception is raised, so that
+	no download is still writing to the data manager when the download of the repository is finalized.
+
+	:param coroutines: the coroutines to be run.
+	:returns: a list containing the results of the coroutines.
+	"""
+	tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+	try:
+		return await asyncio.gather(*tasks)
+	except BaseException:
+		for task in tasks:
+			task.cancel()
+		await asyncio.gather(*tasks, return_exceptions = True)
+		raise
+
+async def async_download_section(aghd, repo_name, repo_api_address, update, statistic, checkpoint, db = db, lg = lg):
+	"""
+	Downloads a section of a repository (e.g. its issues) using an AsyncGithubDownloader. If the download
+	stops early (at the high water mark or because of an error), the generators of the objects and of the
+	pages are closed, so that their pending requests are cancelled and their connections are released.
+
+	:param aghd: an instance of AsyncGithubDownloader.
+	:param repo_name: the name of the repository.
+	:param repo_api_address: the GitHub API URL of the repository.
+	:param update: the incremental update of the section to be downloaded.
+	:param statistic: the statistic of the section, which counts the downloaded pages.
+	:param checkpoint: the checkpoint of the section, which records the downloaded pages.
+	:param db: the data manager used to write the high water marks of the section.
+	:param lg: the logger used to log the progress of the download.
+	"""
+	section = update.section
+	if section["prepare"] != None:
+		await asyncio.get_event_loop().run_in_executor(None, section["prepare"])
+	lg.log_action("Retrieving " + section["message"] + "...")
+	num_objects = 0
+	pages = aghd.download_paginated_object(repo_api_address + "/" + section["path"], update.parameters(), \
+								page_callback = page_callbacks(statistic.count_page, checkpoint.add_page), resume_address = checkpoint.resume_address)
+	afod = AsyncGraphQLDownloader(aghd) if use_graphql_full_objects else aghd
+	objects = afod.download_full_objects(pages, update.full_object_address)
+	try:
+		async for obj in objects:
+			if not update.store_object(obj):
+				checkpoint.stop_at(obj)
+				break
+			checkpoint.store_object(obj)
+			num_objects += 1
+	finally:
+		await objects.aclose()
+		await pages.aclose()
+	update.finalize(repo_name, db, checkpoint)
+	checkpoint.finalize()
+	lg.log_action("Retrieved " + str(num_objects) + " " + section["message"])
+
+async def async_download_repo(repo_address, db = db, lg = lg, gd = gd, aghd = None):
+	"""
+	Downloads all the data of a repository given its GitHub URL using an AsyncGithubDownloader. The sections
+	of the repository (issues, issue comments, issue events, commits, commit comments, and contributors)
+	are downloaded concurrently. Any exception is raised after the data that were already downloaded are
+	written to disk.
+
+	:param repo_address: the URL of the repository of which the data are downloaded.
+	:param db: the data manager used to read and write the data of the repository.
+	:param lg: the logger used to log the progress of the download.
+	:param gd: the git downloader used to download the source code of the repository.
+	:param aghd: an open AsyncGithubDownloader, or None to open a new one for this repository.
+	"""
+	repo_api_address = github_api_address + "/repos/" + '/'.join(repo_address.split('/')[-2:])
+	repo_name = '_'.join(repo_address.split('/')[-2:])
+
+	lg.log_action("Downloading project " + repo_name)
+	checkpoints = db.read_project_checkpoints(repo_name) if use_checkpoints else None
+	if recent_checkpoints(checkpoints):
+		if checkpoints["completed_at"] != None:
+			lg.log_action("Project already downloaded according to its checkpoints! Skipping...")
+			return
+		# An interrupted download is resumed even if existing projects are not updated
+		lg.log_action("Project download was interrupted! Resuming...")
+	elif db.project_exists(repo_name):
+		if update_existing_repos:
+			lg.log_action("Project already exists! Updating...")
+		else:
+			lg.log_action("Project already exists! Skipping...")
+			return
+
+	db.initialize_write_to_disk(repo_name)
+
+	project = db.read_project_from_disk(repo_name)
+	for filename in project.get_quarantined_files():
+		lg.log_action("Moved unreadable file to " + filename)
+	initialize_checkpoints(project)
+
+	close_aghd = aghd == None
+	if close_aghd:
+		aghd = AsyncGithubDownloader(GitHubAuthToken)
+		await aghd.open()
+	try:
+		project_info = await aghd.download_object(repo_api_address)
+		project.add_info(project_info)
+		db.write_project_info_to_disk(repo_name, project["info"])
+		upstream_address = get_upstream_address(repo_address, project["info"])
+		sourcecode = start_source_code_download(repo_address, repo_name, upstream_address, lg, gd)
+		localcommits = LocalCommitStats(repo_name, sourcecode, lg, gd) if use_local_commit_stats and download_commits_full and sourcecode != None else None
+
+		sections = get_sections(repo_name, repo_api_address, project, db, localcommits)
+		updates = [IncrementalUpdate(section, project) for section in sections]
+		statistics = [SectionStatistic(update) for update in updates]
+		checkpoints = [SectionCheckpoint(update, repo_name, db) for update in updates]
+
+		# The sections that cannot be counted while downloading them are counted concurrently with the downloads
+		uncountable = [section for section, statistic in zip(sections, statistics) if download_project_stats and not statistic.countable]
+		counts = await gather_or_cancel(*[async_get_number_of(aghd, repo_api_address, section["path"], *section["parameters"]) for section in uncountable], \
+									*[async_download_section(aghd, repo_name, repo_api_address, update, statistic, checkpoint, db, lg) \
+										for update, statistic, checkpoint in zip(updates, statistics, checkpoints) \
+										if update.section["download"] and not checkpoint.finished])
+		counts = {section["name"]: count for section, count in zip(uncountable, counts)}
 
-		if download_source_code:
-			lg.start_action("Retrieving source code...")
-			git_repo_path = os.path.join(dataFolderPath, repo_name, "sourcecode")
-			if not gd.git_repo_exists(git_repo_path):
-				gd.git_clone(repo_address, git_repo_path)
-			else:
-				gd.git_pull(git_repo_path)
+		if download_project_stats:
+			lg.start_action("Retrieving project statistics...")
+			incomplete = [section for section, statistic in zip(sections, statistics) if section["name"] not in counts and statistic.value() == None]
+			counts.update(zip([section["name"] for section in incomplete], \
+							await gather_or_cancel(*[async_get_number_of(aghd, repo_api_address, section["path"], *section["parameters"]) for section in incomplete])))
+			project.add_stats({section["name"]: counts[section["name"]] if section["name"] in counts else statistic.value() for section, statistic in zip(sections, statistics)})
 			lg.end_action()
+			db.write_project_stats_to_disk(repo_name, project["info"], project["stats"])
+
+		if sourcecode != None:
+			await asyncio.wrap_future(sourcecode)
+		elif download_source_code:
+			await asyncio.get_event_loop().run_in_executor(None, download_source_code_of_repo, repo_address, repo_name, upstream_address, lg, gd)
+
+		finalize_checkpoints(repo_name, project, checkpoints, db)
 
-	except Exception:
-		# Catch any exception and print it before exiting
-		sys.exit(traceback.format_exc())
 	finally:
 		# This line of code is always executed even if an exception occurs
+		if close_aghd:
+			await aghd.close()
 		db.finalize_write_to_disk(repo_name, project)
+		metrics.export()
+
+def create_repo_downloaders(repo_address):
+	"""
+	Creates the objects that are required to download a repository in parallel with other repositories, i.e.
+	a data manager, a logger that prefixes its messages with the name of the repository, and a git downloader.
+	If MongoDB is used, the data manager shares the client of the module-level data manager. If only one
+	repository is downloaded at a time, the module-level objects are returned instead.
+
+	:param repo_address: the URL of the repository.
+	:returns: a tuple containing the data manager, the logger, and the git downloader.
+	"""
+	if num_parallel_repos <= 1:
+		return db, lg, gd
+	repo_lg = Logger(min(verbose, 1), prefix = "[" + '_'.join(repo_address.split('/')[-2:]) + "] ")
+	return create_data_manager(db.client if use_database == 'mongo' else None), repo_lg, GitDownloader(gitExecutablePath, repo_lg, GitHubAuthToken, mc)
+
+def download_repos(repos):
+	"""
+	Downloads all the data of multiple repositories given their GitHub URLs. Up to num_parallel_repos
+	repositories are downloaded at the same time, each one using its own data manager and logger, while
+	the GitHub API downloader (and thus the rate limit) is shared among them. The failure of a repository
+	is logged and does not stop the download of the other repositories. If use_async_downloader is True,
+	then the download is delegated to async_download_repos.
+
+	:param repos: a list containing the URLs of the repositories of which the data are downloaded.
+	:returns: a dict with the URLs of the repositories that failed as keys and the errors as values.
+	"""
+	if use_async_downloader:
+		return asyncio.run(async_download_repos(repos))
+	failures = {}
+	def download_repo_and_report_failure(repo_address):
+		repo_db, repo_lg, repo_gd = create_repo_downloaders(repo_address)
+		try:
+			download_repo(repo_address, repo_db, repo_lg, repo_gd)
+		except Exception:
+			failures[repo_address] = traceback.format_exc()
+			repo_lg.log_action("Failed to download project!\n" + failures[repo_address])
+	with ThreadPoolExecutor(max_workers = max(num_parallel_repos, 1)) as executor:
+		list(executor.map(download_repo_and_report_failure, repos))
+	return failures
+
+async def async_download_repos(repos):
+	"""
+	Downloads all the data of multiple repositories given their GitHub URLs using an AsyncGithubDownloader
+	that is shared among them. Up to num_parallel_repos repositories are downloaded at the same time. See
+	also download_repos.
+
+	:param repos: a list containing the URLs of the repositories of which the data are downloaded.
+	:returns: a dict with the URLs of the repositories that failed as keys and the errors as values.
+	"""
+	failures = {}
+	semaphore = asyncio.Semaphore(max(num_parallel_repos, 1))
+	aghd = AsyncGithubDownloader(GitHubAuthToken)
+	await aghd.open()
+	async def download_repo_and_report_failure(repo_address):
+		async with semaphore:
+			repo_db, repo_lg, repo_gd = create_repo_downloaders(repo_address)
+			try:
+				await async_download_repo(repo_address, repo_db, repo_lg, repo_gd, aghd)
+			except Exception:
+				failures[repo_address] = traceback.format_exc()
+				repo_lg.log_action("Failed to download project!\n" + failures[repo_address])
+	try:
+		await asyncio.gather(*[download_repo_and_report_failure(repo_address) for repo_address in repos])
+	finally:
+		await aghd.close()
+	return failures
+
+def warm_mirror_cache(repos):
+	"""
+	Creates or updates the mirrors of the upstream repositories of multiple repositories in the mirror cache, so
+	that the repositories are cloned faster later. The upstream repository of each repository is found using the
+	GitHub API, and the mirror of each upstream repository is created or updated only once. Up to
+	num_source_code_threads mirrors (or one if it is 0) are created or updated at the same time.
+
+	:param repos: a list containing the URLs of the repositories of which the upstream repositories are mirrored.
+	:returns: a dict with the URLs of the upstream repositories that failed as keys and the errors as values.
+	"""
+	if mc == None:
+		lg.log_action("The mirror cache is not used! Set use_mirror_cache to True to use it.")
+		return {}
+	failures = {}
+	def get_upstream_address_of_repo(repo_address):
+		return get_upstream_address(repo_address, ghd.download_object(github_api_address + "/repos/" + '/'.join(repo_address.split('/')[-2:])))
+	def warm_mirror(upstream_address):
+		lg.log_action("Mirroring " + upstream_address)
+		try:
+			with gd.mirror_reference(upstream_address) as reference:
+				if reference == None:
+					failures[upstream_address] = "The mirror could not be created"
+		except Exception:
+			failures[upstream_address] = traceback.format_exc()
+	with ThreadPoolExecutor(max_workers = max(num_source_code_threads, 1)) as executor:
+		upstream_addresses = list(dict.fromkeys(executor.map(get_upstream_address_of_repo, repos)))
+		list(executor.map(warm_mirror, upstream_addresses))
+	return failures
 
 if __name__ == "__main__":
 	if ((not sys.argv) or len(sys.argv) <= 1):
 		print_usage()
+	elif sys.argv[1] == "--warm-mirror-cache" and len(sys.argv) > 2 and os.path.exists(sys.argv[2]):
+		failures = warm_mirror_cache([repo for repo in read_file_in_lines(sys.argv[2]) if repo])
+		if failures:
+			print("\nFailed to mirror " + str(len(failures)) + " repositories:")
+			for repo in failures:
+				print("   " + repo)
 	elif(sys.argv[1].startswith("https://github.com")):
-		download_repo(sys.argv[1])
+		try:
+			download_repo(sys.argv[1])
+		except Exception:
+			# Catch any exception and print it before exiting
+			sys.exit(traceback.format_exc())
 	elif(os.path.exists(sys.argv[1])):
-		repos = read_file_in_lines(sys.argv[1])
-		for repo in repos:
-			download_repo(repo)
+		repos = [repo for repo in read_file_in_lines(sys.argv[1]) if repo]
+		failures = download_repos(repos)
+		if failures:
+			print("\nFailed to download " + str(len(failures)) + " of " + str(len(repos)) + " projects:")
+			for repo in failures:
+				print("   " + repo)
 	else:
 		print_usage()
 
@@ -1,4 +1,4 @@
-import json
+import jsoncodec
 
 def get_number_of(gdownloader, repo_api_address, statistic_type, parameter = None):
 	"""
@@ -8,15 +8,38 @@ def get_number_of(gdownloader, repo_api_address, statistic_type, parameter = Non
 	:param gdownloader: an instance of GithubDownloader.
 	:param statistic_type: the type for which the statistic is downloaded.
 	:param parameter: an optional parameter for the statistic (e.g. for issues set this to "state=all" to get all of them).
-	:returns: the value for the statistic as an absolute number.
+	:returns: the value for the statistic as an absolute number, or None if it could not be downloaded.
 	"""
 	r = gdownloader.download_request(repo_api_address + "/" + statistic_type, ["per_page=100"] if parameter == None else ["per_page=100", parameter])
-	if "link" in r.headers:
+	if r == None or not r.ok:
+		return None
+	elif "link" in r.headers:
 		address = r.headers["link"].split(',')[1].split('<')[1].split('>')[0]
 		data = gdownloader.download_object(address)
 		return 100 * (int(address.split('=')[-1]) - 1) + len(data) if data != None else None
 	else:
-		data = json.loads(r.text or r.content) if r.status_code != 204 else {}
+		data = jsoncodec.loads(r.content) if r.status_code != 204 else {}
+		return len(data)
+
+async def async_get_number_of(agdownloader, repo_api_address, statistic_type, parameter = None):
+	"""
+	Posts a request using an instance of AsyncGithubDownloader and returns the number of
+	a given statistic (e.g. number of issues, number of commits, etc.). See also get_number_of.
+
+	:param agdownloader: an instance of AsyncGithubDownloader.
+	:param statistic_type: the type for which the statistic is downloaded.
+	:param parameter: an optional parameter for the statistic (e.g. for issues set this to "state=all" to get all of them).
+	:returns: the value for the statistic as an absolute number, or None if it could not be downloaded.
+	"""
+	r = await agdownloader.download_request(repo_api_address + "/" + statistic_type, ["per_page=100"] if parameter == None else ["per_page=100", parameter])
+	if r == None or r.status >= 400:
+		return None
+	elif "link" in r.headers:
+		address = r.headers["link"].split(',')[1].split('<')[1].split('>')[0]
+		data = await agdownloader.download_object(address)
+		return 100 * (int(address.split('=')[-1]) - 1) + len(data) if data != None else None
+	else:
+		data = jsoncodec.loads(await r.read()) if r.status != 204 else {}
 		return len(data)
 
 def read_file_in_lines(filename):
@@ -38,4 +61,6 @@ def print_usage():
 	print("where arg can be one of the following:")
 	print("   github url (e.g. https://github.com/user/repo)")
 	print("   path to txt file containing github urls")
+	print("or: python gddownloader.py --warm-mirror-cache path")
+	print("to create or update the mirrors of the upstream repos of the github urls of a txt file")
 
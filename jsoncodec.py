@@ -0,0 +1,88 @@
+import json
+from properties import json_codec
+
+class JSONCodec:
+	"""
+	Class that implements a JSON codec on top of one of the supported JSON libraries (orjson, ujson, or
+	the json module of the standard library). Documents are parsed directly from bytes when possible
+	and are written as UTF-8 bytes, so that they are not decoded to or encoded from strings in between.
+	"""
+	def __init__(self, name = "auto"):
+		"""
+		Initializes this JSON codec.
+
+		:param name: the name of the library (one of orjson, ujson, json), or auto to use the fastest installed one.
+		"""
+		self.name, self.backend = self.load_backend(name)
+
+	def load_backend(self, name):
+		"""
+		Loads a JSON library given its name. If the name is auto, the fastest installed library is loaded.
+
+		:param name: the name of the library (one of auto, orjson, ujson, json).
+		:returns: a tuple containing the name and the module of the loaded library.
+		"""
+		if name in ("auto", "orjson"):
+			try:
+				import orjson
+				return "orjson", orjson
+			except ImportError:
+				if name != "auto":
+					raise
+		if name in ("auto", "ujson"):
+			try:
+				import ujson
+				return "ujson", ujson
+			except ImportError:
+				if name != "auto":
+					raise
+		return "json", json
+
+	def loads(self, data):
+		"""
+		Parses a JSON document.
+
+		:param data: the JSON document as bytes or as a string.
+		:returns: the parsed JSON object.
+		"""
+		return self.backend.loads(data)
+
+	def dumpb(self, obj, indent = None, sort_keys = False):
+		"""
+		Serializes an object to a JSON document encoded in UTF-8. Note that orjson supports only an
+		indentation of 2 spaces, so any other indentation is written using the json module instead.
+
+		:param obj: the object to be serialized.
+		:param indent: the number of spaces used for indentation, or None for a compact document.
+		:param sort_keys: boolean indicating whether the keys of the objects are sorted.
+		:returns: the JSON document as bytes.
+		"""
+		if self.name == "orjson" and indent in (None, 2):
+			option = self.backend.OPT_NON_STR_KEYS
+			if indent != None:
+				option |= self.backend.OPT_INDENT_2
+			if sort_keys:
+				option |= self.backend.OPT_SORT_KEYS
+			return self.backend.dumps(obj, option = option)
+		return self.dumps(obj, indent, sort_keys).encode('utf-8')
+
+	def dumps(self, obj, indent = None, sort_keys = False):
+		"""
+		Serializes an object to a JSON document. See also dumpb.
+
+		:param obj: the object to be serialized.
+		:param indent: the number of spaces used for indentation, or None for a compact document.
+		:param sort_keys: boolean indicating whether the keys of the objects are sorted.
+		:returns: the JSON document as a string.
+		"""
+		if self.name == "orjson" and indent in (None, 2):
+			return self.dumpb(obj, indent, sort_keys).decode('utf-8')
+		elif self.name == "ujson":
+			return self.backend.dumps(obj, ensure_ascii = False, escape_forward_slashes = False, sort_keys = sort_keys, indent = indent or 0)
+		return json.dumps(obj, ensure_ascii = False, sort_keys = sort_keys, indent = indent, separators = None if indent != None else (',', ':'))
+
+# The codec that is selected by the json_codec property and is used throughout the tool
+codec = JSONCodec(json_codec)
+loads = codec.loads
+dumpb = codec.dumpb
+dumps = codec.dumps
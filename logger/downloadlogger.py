@@ -4,16 +4,18 @@ class Logger:
 	"""
 	Class that implements a logger for the actions of this tool.
 	"""
-	def __init__(self, verbose, logto = sys.stdout):
+	def __init__(self, verbose, logto = sys.stdout, prefix = ""):
 		"""
 		Initializes this logger. The verbose argument can be set to 0 for no messages,
 		1 for simple messages, and 2 for progress bars.
 
 		:param verbose: integer denoting the amount of output to be logged.
 		:param logto: buffer where messages are logged.
+		:param prefix: a string that is prepended to all messages (e.g. the name of a repository).
 		"""
 		self.verbose = verbose
 		self.logto = logto
+		self.prefix = prefix
 		self.current_action_length = None
 		self.current_action_step = 0
 		self.last_print_action_step = 0
@@ -25,7 +27,7 @@ class Logger:
 		:param action: the message of the action to be logged.
 		"""
 		if self.verbose == 1 or self.verbose == 2:
-			self.logto.write(action + "\n")
+			self.logto.write(self.prefix + action + "\n")
 
 	def start_action(self, action, current_action_length = None):
 		"""
@@ -39,7 +41,16 @@ class Logger:
 		self.current_action_step = 0
 		self.last_print_action_step = 0
 		if self.verbose == 1 or self.verbose == 2:
-			self.logto.write("\n" + action + "\n")
+			self.logto.write("\n" + self.prefix + action + "\n")
+
+	def set_action_length(self, current_action_length):
+		"""
+		Sets the number of steps of the current multi-step action, for actions of which the length
+		is not known when they start (e.g. it is known after the first page of a download).
+
+		:param current_action_length: the number of steps that the current action consists of.
+		"""
+		self.current_action_length = current_action_length
 
 	def step_action(self):
 		"""
@@ -47,13 +58,13 @@ class Logger:
 		methods start_action and end_action.
 		"""
 		self.current_action_step += 1
-		if self.verbose == 2:
-			fragment = self.current_action_step / self.current_action_length
+		if self.verbose == 2 and self.current_action_length:
+			fragment = min(self.current_action_step / self.current_action_length, 1)
 			percentage = int(100 * fragment)
 			progress_bar_size = 20
 			progress_bar_fragment = int(fragment * progress_bar_size)
 			whitespace = "  " if percentage < 10 else (" " if percentage < 100 else "")
-			last_print_percentage = int(100 * self.last_print_action_step / self.current_action_length)
+			last_print_percentage = int(100 * min(self.last_print_action_step / self.current_action_length, 1))
 			if last_print_percentage != percentage:
 				self.logto.write("\r[%s%s] %s%d%%" % ("-" * progress_bar_fragment, " " * (progress_bar_size - progress_bar_fragment), whitespace, percentage))
 				self.last_print_action_step = self.current_action_step
@@ -63,6 +74,6 @@ class Logger:
 		Logs the end of an action (either single or multi-step).
 		"""
 		if self.verbose == 1:
-			self.logto.write("Done!\n")
+			self.logto.write(self.prefix + "Done!\n")
 		elif self.verbose == 2:
 			self.logto.write("\nDone!\n")
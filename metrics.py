@@ -0,0 +1,245 @@
+import os
+import re
+import time
+import atexit
+import cProfile
+import functools
+import threading
+from contextlib import contextmanager, nullcontext
+import jsoncodec
+from properties import use_metrics, metricsPath, metrics_export_interval, use_profiler
+
+class Metrics:
+	"""
+	Class that implements the metrics of the tool, i.e. counters (e.g. the number of requests to each endpoint
+	of the GitHub API) and histograms (e.g. the latency of the requests). The metrics are exported to the files
+	metrics.json and metrics.prom (in the text format of Prometheus) of metricsPath at the end of the download
+	of each repository, every metrics_export_interval seconds, and when the tool exits. When the metrics are
+	disabled, all functions return immediately, so the instrumented code is not slowed down.
+	"""
+	buckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+	def __init__(self, enabled, metricspath, export_interval):
+		"""
+		Initializes the metrics.
+
+		:param enabled: boolean indicating whether the metrics are collected and exported.
+		:param metricspath: the path to the folder where the metrics are exported.
+		:param export_interval: the number of seconds between two periodic exports, or 0 to not export periodically.
+		"""
+		self.enabled = enabled
+		self.metricspath = metricspath
+		self.lock = threading.Lock()
+		self.exportlock = threading.Lock()
+		self.counters = {}
+		self.histograms = {}
+		self.started = time.time()
+		if enabled:
+			if not os.path.exists(metricspath):
+				os.makedirs(metricspath)
+			atexit.register(self.export)
+			if export_interval > 0:
+				threading.Thread(target = self.export_periodically, args = (export_interval, ), daemon = True).start()
+
+	def endpoint(self, address):
+		"""
+		Returns the endpoint of a URL of the GitHub API, where the owners, the names of the repositories, the
+		numbers and the shas are replaced by placeholders (e.g. /repos/:owner/:repo/issues/:number).
+
+		:param address: the URL of the request.
+		:returns: the endpoint of the request.
+		"""
+		path = re.sub(r"^https?://[^/]+|\?.*$", "", address)
+		path = re.sub(r"^/repos/[^/]+/[^/]+", "/repos/:owner/:repo", path)
+		return re.sub(r"/\d+(?=/|$)", "/:number", re.sub(r"/[0-9a-f]{40}(?=/|$)", "/:sha", path))
+
+	def key(self, name, labels):
+		"""
+		Returns the key of a metric given its name and labels.
+
+		:param name: the name of the metric.
+		:param labels: a dict containing the labels of the metric, or None.
+		:returns: a tuple containing the name and the sorted labels of the metric.
+		"""
+		return (name, tuple(sorted(labels.items())) if labels else ())
+
+	def count(self, name, labels = None, value = 1):
+		"""
+		Increases a counter.
+
+		:param name: the name of the counter.
+		:param labels: a dict containing the labels of the counter, or None.
+		:param value: the value that is added to the counter.
+		"""
+		if not self.enabled:
+			return
+		key = self.key(name, labels)
+		with self.lock:
+			self.counters[key] = self.counters.get(key, 0) + value
+
+	def observe(self, name, value, labels = None):
+		"""
+		Adds a value (e.g. a duration in seconds) to a histogram.
+
+		:param name: the name of the histogram.
+		:param value: the observed value.
+		:param labels: a dict containing the labels of the histogram, or None.
+		"""
+		if not self.enabled:
+			return
+		key = self.key(name, labels)
+		with self.lock:
+			histogram = self.histograms.setdefault(key, {"buckets": [0] * len(self.buckets), "sum": 0, "count": 0})
+			for i, bucket in enumerate(self.buckets):
+				if value <= bucket:
+					histogram["buckets"][i] += 1
+			histogram["sum"] += value
+			histogram["count"] += 1
+
+	def timer(self, name, labels = None):
+		"""
+		Returns a context manager that adds its duration to a histogram.
+
+		:param name: the name of the histogram.
+		:param labels: a dict containing the labels of the histogram, or None.
+		:returns: the context manager.
+		"""
+		if not self.enabled:
+			return nullcontext()
+		@contextmanager
+		def measure():
+			start = time.perf_counter()
+			try:
+				yield
+			finally:
+				self.observe(name, time.perf_counter() - start, labels)
+		return measure()
+
+	def record_request(self, address, status, seconds, size):
+		"""
+		Records a request to the GitHub API.
+
+		:param address: the URL of the request.
+		:param status: the status code of the response, or None if no response was received.
+		:param seconds: the duration of the request in seconds.
+		:param size: the size of the body of the response in bytes.
+		"""
+		if not self.enabled:
+			return
+		endpoint = self.endpoint(address)
+		self.count("requests_total", {"endpoint": endpoint, "status": str(status) if status != None else "error"})
+		self.count("response_bytes_total", {"endpoint": endpoint}, size)
+		self.observe("request_latency_seconds", seconds, {"endpoint": endpoint})
+
+	def record_sleep(self, reason, seconds):
+		"""
+		Records the time spent waiting before sending requests.
+
+		:param reason: the reason of the wait (pacing, retry, or rate_limit).
+		:param seconds: the number of seconds of the wait.
+		"""
+		if seconds > 0:
+			self.count("sleep_seconds_total", {"reason": reason}, seconds)
+
+	def snapshot(self):
+		"""
+		Returns the current values of the metrics, including the number of items stored per second for
+		each resource (e.g. issues), computed since the metrics were initialized.
+
+		:returns: a dict containing the uptime, the counters, the histograms, and the rates of the items.
+		"""
+		with self.lock:
+			uptime = time.time() - self.started
+			counters = [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in sorted(self.counters.items())]
+			histograms = [{"name": name, "labels": dict(labels), "buckets": dict(zip(self.buckets, histogram["buckets"])), \
+							"sum": histogram["sum"], "count": histogram["count"]} for (name, labels), histogram in sorted(self.histograms.items())]
+		rates = [{"name": "items_per_second", "labels": counter["labels"], "value": counter["value"] / uptime if uptime > 0 else 0} \
+					for counter in counters if counter["name"] == "items_total"]
+		return {"uptime_seconds": uptime, "counters": counters + rates, "histograms": histograms}
+
+	def prometheus_text(self, snapshot):
+		"""
+		Formats the values of the metrics in the text format of Prometheus. All metrics are prefixed with gddownloader_.
+
+		:param snapshot: the values of the metrics, as returned by snapshot.
+		:returns: the metrics as a string.
+		"""
+		def labelstring(labels, extra = None):
+			labels = dict(labels, **(extra or {}))
+			return "{" + ",".join('%s="%s"' % (label, str(value).replace('\\', '\\\\').replace('"', '\\"')) for label, value in labels.items()) + "}" if labels else ""
+		lines = ["gddownloader_uptime_seconds %s" % snapshot["uptime_seconds"]]
+		for counter in snapshot["counters"]:
+			lines.append("gddownloader_%s%s %s" % (counter["name"], labelstring(counter["labels"]), counter["value"]))
+		for histogram in snapshot["histograms"]:
+			for bucket, value in histogram["buckets"].items():
+				lines.append("gddownloader_%s_bucket%s %d" % (histogram["name"], labelstring(histogram["labels"], {"le": bucket}), value))
+			lines.append("gddownloader_%s_bucket%s %d" % (histogram["name"], labelstring(histogram["labels"], {"le": "+Inf"}), histogram["count"]))
+			lines.append("gddownloader_%s_sum%s %s" % (histogram["name"], labelstring(histogram["labels"]), histogram["sum"]))
+			lines.append("gddownloader_%s_count%s %d" % (histogram["name"], labelstring(histogram["labels"]), histogram["count"]))
+		return "\n".join(lines) + "\n"
+
+	def export(self):
+		"""
+		Exports the metrics to the files metrics.json and metrics.prom. Each file is written to a temporary
+		file that is then renamed, so that readers never see a partially written file.
+		"""
+		if not self.enabled:
+			return
+		snapshot = self.snapshot()
+		with self.exportlock:
+			for filename, data in (("metrics.json", jsoncodec.dumpb(snapshot, indent = 3)), ("metrics.prom", self.prometheus_text(snapshot).encode('utf-8'))):
+				filename = os.path.join(self.metricspath, filename)
+				with open(filename + ".tmp", 'wb') as outfile:
+					outfile.write(data)
+				os.replace(filename + ".tmp", filename)
+
+	def export_periodically(self, export_interval):
+		"""
+		Exports the metrics every export_interval seconds. This function runs in a background thread.
+
+		:param export_interval: the number of seconds between two exports.
+		"""
+		while True:
+			time.sleep(export_interval)
+			self.export()
+
+	def profiled(self, function):
+		"""
+		Wraps a function that downloads a repository (its first argument is the URL of the repository), so that
+		each call is profiled using cProfile if use_profiler is True. The statistics of each call are written
+		to the file <repo_name>.prof of metricsPath. Only one call can be profiled at a time, so calls made
+		while another call is profiled are not profiled. When use_profiler is False, the function itself is returned.
+
+		:param function: the function to be wrapped.
+		:returns: the wrapped function.
+		"""
+		if not use_profiler:
+			return function
+		profilerlock = threading.Lock()
+		@functools.wraps(function)
+		def profiled_function(repo_address, *args, **kwargs):
+			if not profilerlock.acquire(blocking = False):
+				return function(repo_address, *args, **kwargs)
+			try:
+				profiler = cProfile.Profile()
+				profiler.enable()
+				try:
+					return function(repo_address, *args, **kwargs)
+				finally:
+					profiler.disable()
+					if not os.path.exists(metricsPath):
+						os.makedirs(metricsPath)
+					profiler.dump_stats(os.path.join(metricsPath, '_'.join(repo_address.split('/')[-2:]) + ".prof"))
+			finally:
+				profilerlock.release()
+		return profiled_function
+
+# The metrics that are selected by the use_metrics property and are collected throughout the tool
+registry = Metrics(use_metrics, metricsPath, metrics_export_interval)
+count = registry.count
+observe = registry.observe
+timer = registry.timer
+record_request = registry.record_request
+record_sleep = registry.record_sleep
+export = registry.export
+profiled = registry.profiled
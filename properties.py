@@ -1,5 +1,6 @@
-# Set this to your GitHub auth token
+# Set this to your GitHub auth token (or to a list of tokens, so that each request is sent using the token with the most remaining requests)
 GitHubAuthToken = 'add_here_your_token'
+github_api_address = 'https://api.github.com' # Set this to the address of the GitHub REST API (without trailing slash)
 
 # Set this to the path of the git executable
 gitExecutablePath = 'git'
@@ -10,19 +11,81 @@ include_private_repos = False
 # Set this to False to skip existing repos
 update_existing_repos = True
 
+# Set this to True to update existing repos incrementally (only the data that changed since the last download are downloaded)
+use_incremental_updates = False
+
+# Set this to True to resume interrupted downloads from the last checkpoint of each section of a repo
+use_checkpoints = False
+checkpoint_max_age = 86400 # Set the age (in seconds) after which the checkpoints of a repo are discarded
+
 # Set to 0 for no messages, 1 for simple messages, and 2 for progress bars
 verbose = 1
 
+# Set this to more than 1 to download the pages of paginated objects concurrently using this number of threads
+num_page_download_threads = 1
+
+# Set this to more than 1 to download the full issues and commits concurrently using this number of threads
+num_full_object_download_threads = 1
+
+# Set this to True to download the full issues and commits in batches using the GitHub GraphQL API (commits get their stats but not their files)
+use_graphql_full_objects = False
+graphql_api_address = 'https://api.github.com/graphql' # Set this to the address of the GitHub GraphQL API
+graphql_batch_size = 100 # Set the number of full issues or commits that are downloaded using one GraphQL query
+
+# Set the number of connections kept alive to the GitHub API (should be at least equal to the number of threads)
+http_pool_size = 10
+
+# Set the timeout (in seconds) of each request to the GitHub API
+request_timeout = 60
+
+# Set how failed requests (connection errors, timeouts, server errors, and secondary rate limits) are retried
+max_request_retries = 5 # Set the number of times a failed request is retried
+retry_backoff_base = 1 # Set the time (in seconds) to wait before the first retry (doubled after each retry)
+retry_backoff_max = 60 # Set the maximum time (in seconds) to wait before a retry
+
+# Set this to True to spread the remaining requests of the rate limit evenly over the time until it is reset
+use_request_pacing = False
+request_pacing_burst = 100 # Set the number of requests that can be sent without waiting when use_request_pacing is True
+
+# Set this to True to download the data using asyncio (the sections of each repo are downloaded concurrently)
+use_async_downloader = False
+
+# Set the maximum number of concurrent requests when use_async_downloader is True
+num_concurrent_requests = 100
+
+# Set the number of repos that are downloaded at the same time when a list of repos is given
+num_parallel_repos = 1
+
+# Set the library used to parse and write JSON (available options: auto, orjson, ujson, json), auto selects the fastest installed one
+json_codec = 'auto'
+
+# Set this to True to keep the responses of the GitHub API in a cache and send conditional requests for them
+use_response_cache = False
+responseCachePath = 'cache' # Set this to the folder where the responses are cached
+
+# Set this to True to collect metrics of the requests, the writes, and the git commands
+use_metrics = False
+metricsPath = 'metrics' # Set this to the folder where the metrics (and the profiles) are written
+metrics_export_interval = 60 # Set the number of seconds between two exports of the metrics while downloading (0 to export only after each repo)
+use_profiler = False # Set this to True to profile the download of each repo using cProfile
+
 # Select how to write to disk (or how to send queries to the database)
 always_write_to_disk = True
+deferred_write_buffer_size = 10000 # set the number of items of each type that are kept in memory before being written when always_write_to_disk is False
 
 # Change these settings to store data in disk/database
-use_database = 'disk' # (available options: disk, mongo)
+use_database = 'disk' # (available options: disk, jsonl, mongo)
 # Disk settings
 dataFolderPath = 'data' # Set this to the folder where data are downloaded
+compress_jsonl_segments = False # Set this to True to compress the JSON Lines segments (only for jsonl)
+compact_json_files = False # Set this to True to write JSON files without indentation
+num_file_writer_threads = 0 # Set this to more than 0 to write the JSON files of items in background threads (only for disk)
+num_file_reader_threads = 8 # Set the number of threads that read the JSON files of existing repos (only for disk)
+use_folder_snapshots = False # Set this to True to keep a snapshot of the keys of the items of each folder, so that existing repos are read faster (only for disk)
 # Database settings
 database_host_and_port = "mongodb://localhost:27017/"  # change this to the hostname and port of your database
 num_bulk_operations = 1000 # set the number of operations that are sent as a bulk to the database
+bulk_flush_interval = 5 # set the maximum time (in seconds) that an operation waits in the buffer before being sent to the database
 
 # Select what to download
 download_issues = True
@@ -31,8 +94,23 @@ download_issue_events = True
 download_commits = True
 download_commit_comments = True
 download_contributors = True
+download_project_stats = True # Set this to False to skip counting the issues, commits, etc. of each repo
 download_source_code = False
 
+# Select how the source code is downloaded (when download_source_code is True)
+git_clone_depth = None # Set this to a number of commits to clone only the latest commits of each repo (shallow clone)
+git_partial_clone = False # Set this to True to clone without the contents of the files, which are downloaded on demand
+git_single_branch = False # Set this to True to clone only the default branch of each repo
+use_git_fetch = False # Set this to True to update existing clones using git fetch --prune instead of git pull
+num_source_code_threads = 0 # Set this to more than 0 to clone/update the source code in background threads while the data are downloaded
+use_local_commit_stats = False # Set this to True to read the stats and the files of full commits from the cloned source code instead of the GitHub API
+
+# Set this to True to keep mirrors of the upstream repos that are shared among the clones of the repos and their forks
+use_mirror_cache = False
+mirrorCachePath = 'mirrors' # Set this to the folder where the mirrors are kept
+mirror_cache_max_size = 50 # Set the maximum total size (in GB) of the mirrors, above which the least recently used ones are evicted
+mirror_cache_fetch_interval = 600 # Set the number of seconds after fetching a mirror during which it is not fetched again
+
 # Select whether the downloaded issues and commits information will be full
 download_issues_full = True
 download_commits_full = True
@@ -0,0 +1,261 @@
+import os
+import sys
+import shutil
+import asyncio
+import tempfile
+import unittest
+from unittest import mock
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import properties
+# The data are written to a temporary folder, which has to be set before the data managers are imported
+datafolder = tempfile.mkdtemp()
+properties.dataFolderPath = datafolder
+from logger.downloadlogger import Logger
+from downloader.githubdownloader import GithubDownloader
+with mock.patch.object(GithubDownloader, "check_credentials", return_value = True):
+	import gddownloader
+
+def tearDownModule():
+	shutil.rmtree(datafolder, ignore_errors = True)
+
+class FakeAsyncGithubDownloader:
+	"""
+	Class that implements the parts of an AsyncGithubDownloader that are used to download a repository. The
+	pages of each section are given, and the requested pages and the closed paginated objects are recorded.
+	"""
+	def __init__(self, pages, failing = (), dropped = ()):
+		"""
+		Initializes this downloader.
+
+		:param pages: a dict with the paths of the sections (e.g. issues) as keys and lists of pages as values.
+		:param failing: the addresses of the pages of which the download fails.
+		:param dropped: the addresses of the full objects of which the download fails.
+		"""
+		self.pages = pages
+		self.failing = set(failing)
+		self.dropped = set(dropped)
+		self.requested = []
+		self.closed = []
+
+	async def download_object(self, address):
+		"""
+		Downloads the info of the repository or a full object (as AsyncGithubDownloader.download_object).
+		"""
+		if address in self.dropped:
+			return None
+		if address.endswith("/repos/owner/name"):
+			return {"full_name": "owner/name"}
+		number = int(address.split('/')[-1])
+		return dict(next(obj for page in self.pages["issues"] for obj in page if obj["number"] == number), closed_by = None)
+
+	async def download_paginated_object(self, address, parameters = None, headers = None, page_callback = None, resume_address = None):  # @UnusedVariable
+		"""
+		Downloads the pages of a section, starting from the resume address if it is given (as
+		AsyncGithubDownloader.download_paginated_object). The download stops at the first failing page.
+		"""
+		pages = self.pages.get(address.split("/repos/owner/name/")[-1], [[]])
+		first = int(resume_address.split("page=")[-1]) if resume_address != None else 1
+		try:
+			for number in range(first, len(pages) + 1):
+				pageaddress = address + "?page=" + str(number)
+				self.requested.append(pageaddress)
+				await asyncio.sleep(0)
+				if pageaddress in self.failing:
+					return
+				page_callback(len(pages), pages[number - 1], pageaddress, address + "?page=" + str(number + 1) if number < len(pages) else None)
+				for obj in pages[number - 1]:
+					yield obj
+		finally:
+			self.closed.append(address)
+
+	async def download_full_objects(self, objects, full_object_address):
+		"""
+		Downloads the full version of objects one by one (as AsyncGithubDownloader.download_full_objects).
+		"""
+		async for obj in objects:
+			address = full_object_address(obj)
+			fullobj = await self.download_object(address) if address != None else obj
+			if fullobj != None:
+				yield fullobj
+
+def issue(number, updated_at):
+	"""
+	Returns a closed issue of the GitHub API.
+
+	:param number: the number of the issue.
+	:param updated_at: the last update date of the issue.
+	"""
+	return {"id": number, "number": number, "state": "closed", "updated_at": updated_at}
+
+def issue_event(number, created_at):
+	"""
+	Returns an issue event of the GitHub API.
+
+	:param number: the id of the issue event.
+	:param created_at: the creation date of the issue event.
+	"""
+	return {"id": number, "created_at": created_at}
+
+class GDDownloaderTestCase(unittest.TestCase):
+	"""
+	Base class for the tests that download a repository from a FakeAsyncGithubDownloader to a temporary folder.
+	"""
+	repo_address = "https://github.com/owner/name"
+	repo_api_address = properties.github_api_address + "/repos/owner/name"
+	repo_name = "owner_name"
+
+	def setUp(self):
+		self.db = gddownloader.DBManager()
+		self.lg = Logger(0)
+		self.properties = mock.patch.multiple("gddownloader", download_project_stats = False, download_source_code = False)
+		self.properties.start()
+
+	def tearDown(self):
+		self.properties.stop()
+		shutil.rmtree(os.path.join(datafolder, self.repo_name), ignore_errors = True)
+
+	def read_project(self, high_water_marks = None):
+		"""
+		Reads the project of the repository, which is created if it does not exist.
+
+		:param high_water_marks: the high water marks of the project, or None.
+		:returns: an object of type Project.
+		"""
+		self.db.initialize_write_to_disk(self.repo_name)
+		project = self.db.read_project_from_disk(self.repo_name)
+		project.add_info({"full_name": "owner/name"})
+		for name, high_water_mark in (high_water_marks or {}).items():
+			project.add_high_water_mark(name, high_water_mark)
+		gddownloader.initialize_checkpoints(project)
+		return project
+
+	def download_section(self, aghd, project, name):
+		"""
+		Downloads a section of the repository using async_download_section. The paginated objects that are
+		closed when the download returns (and not later by the event loop) are kept in aghd.closed_on_return.
+
+		:param aghd: the FakeAsyncGithubDownloader.
+		:param project: the project where the objects are stored.
+		:param name: the name of the section (e.g. issues).
+		:returns: a tuple containing the incremental update and the checkpoint of the section.
+		"""
+		section = next(section for section in gddownloader.get_sections(self.repo_name, self.repo_api_address, project, self.db) if section["name"] == name)
+		update = gddownloader.IncrementalUpdate(section, project)
+		checkpoint = gddownloader.SectionCheckpoint(update, self.repo_name, self.db)
+		async def download_section_and_check_closed():
+			try:
+				await gddownloader.async_download_section(aghd, self.repo_name, self.repo_api_address, update, \
+										gddownloader.SectionStatistic(update), checkpoint, self.db, self.lg)
+			finally:
+				aghd.closed_on_return = list(aghd.closed)
+		asyncio.run(download_section_and_check_closed())
+		return update, checkpoint
+
+class TestAsyncDownloadSection(GDDownloaderTestCase):
+	"""
+	Tests that the paginated objects of a section are closed when its download stops early.
+	"""
+	def test_pages_are_closed_when_stopped_at_high_water_mark(self):
+		events = [[issue_event(3, "2020-03-01"), issue_event(2, "2020-01-01")], [issue_event(1, "2019-01-01")]]
+		aghd = FakeAsyncGithubDownloader({"issues/events": events})
+		with mock.patch.object(gddownloader, "use_incremental_updates", True):
+			update, _ = self.download_section(aghd, self.read_project({"issue_events": "2020-02-01"}), "issue_events")
+		self.assertTrue(update.stopped)
+		self.assertEqual(aghd.requested, [self.repo_api_address + "/issues/events?page=1"])
+		self.assertEqual(aghd.closed_on_return, [self.repo_api_address + "/issues/events"])
+
+	def test_pages_are_closed_when_storing_fails(self):
+		aghd = FakeAsyncGithubDownloader({"issues/events": [[issue_event(1, "2020-01-01")], [issue_event(2, "2020-01-02")]]})
+		with mock.patch.object(self.db, "write_project_issue_event_to_disk", side_effect = OSError("disk full")):
+			with self.assertRaises(OSError):
+				self.download_section(aghd, self.read_project(), "issue_events")
+		self.assertEqual(aghd.closed_on_return, [self.repo_api_address + "/issues/events"])
+
+class TestHighWaterMarks(GDDownloaderTestCase):
+	"""
+	Tests that the high water mark of a section is advanced only if the whole section was downloaded.
+	"""
+	issues = [[issue(1, "2020-01-01"), issue(2, "2020-03-01")], [issue(3, "2020-02-01")]]
+
+	def setUp(self):
+		super().setUp()
+		self.incremental = mock.patch.object(gddownloader, "use_incremental_updates", True)
+		self.incremental.start()
+
+	def tearDown(self):
+		self.incremental.stop()
+		super().tearDown()
+
+	def written_high_water_marks(self):
+		"""
+		Returns the high water marks that were written to disk.
+
+		:returns: a dict containing the high water marks.
+		"""
+		return self.db.read_json_from_file_if_it_exists(os.path.join(datafolder, self.repo_name, "highwatermarks.json"))
+
+	def test_mark_advances_when_all_pages_are_downloaded(self):
+		project = self.read_project({"issues": "2019-01-01"})
+		self.download_section(FakeAsyncGithubDownloader({"issues": self.issues}), project, "issues")
+		self.assertEqual(project.get_high_water_mark("issues"), "2020-03-01")
+		self.assertEqual(self.written_high_water_marks(), {"issues": "2020-03-01"})
+
+	def test_mark_is_kept_when_a_page_fails(self):
+		project = self.read_project({"issues": "2019-01-01"})
+		aghd = FakeAsyncGithubDownloader({"issues": self.issues}, failing = [self.repo_api_address + "/issues?page=2"])
+		_, checkpoint = self.download_section(aghd, project, "issues")
+		self.assertFalse(checkpoint.finished)
+		self.assertEqual(project.get_high_water_mark("issues"), "2019-01-01")
+		self.assertEqual(self.written_high_water_marks(), {})
+
+	def test_mark_is_kept_when_a_full_object_is_dropped(self):
+		project = self.read_project({"issues": "2019-01-01"})
+		aghd = FakeAsyncGithubDownloader({"issues": self.issues}, dropped = [self.repo_api_address + "/issues/1"])
+		_, checkpoint = self.download_section(aghd, project, "issues")
+		self.assertFalse(checkpoint.finished)
+		self.assertEqual(project.get_high_water_mark("issues"), "2019-01-01")
+
+	def test_mark_advances_when_stopped_at_high_water_mark(self):
+		project = self.read_project({"issue_events": "2020-02-01"})
+		events = [[issue_event(3, "2020-03-01"), issue_event(2, "2020-01-01")], [issue_event(1, "2019-01-01")]]
+		_, checkpoint = self.download_section(FakeAsyncGithubDownloader({"issues/events": events}), project, "issue_events")
+		self.assertTrue(checkpoint.finished)
+		self.assertEqual(project.get_high_water_mark("issue_events"), "2020-03-01")
+
+	def test_mark_is_kept_when_stopped_after_a_failed_page(self):
+		project = self.read_project({"issue_events": "2020-02-01"})
+		checkpoint = gddownloader.SectionCheckpoint(gddownloader.IncrementalUpdate(next(section for section in \
+						gddownloader.get_sections(self.repo_name, self.repo_api_address, project, self.db) if section["name"] == "issue_events"), project), self.repo_name, self.db)
+		# The first page is completed, the second page failed, and the download stopped at an object of the third page
+		checkpoint.add_page(3, [], "page1", "page2")
+		checkpoint.add_page(3, [issue_event(1, "2019-01-01")], "page3", None)
+		checkpoint.stop_at(issue_event(1, "2019-01-01"))
+		self.assertFalse(checkpoint.complete)
+
+class TestResumeDownload(GDDownloaderTestCase):
+	"""
+	Tests that an interrupted download is resumed from its checkpoints.
+	"""
+	issues = [[issue(1, "2020-01-01")], [issue(2, "2020-02-01")]]
+
+	def download_repo(self, aghd):
+		"""
+		Downloads the repository using async_download_repo.
+
+		:param aghd: the FakeAsyncGithubDownloader.
+		"""
+		asyncio.run(gddownloader.async_download_repo(self.repo_address, self.db, self.lg, aghd = aghd))
+
+	def test_interrupted_download_is_resumed_when_existing_repos_are_not_updated(self):
+		with mock.patch.multiple("gddownloader", use_checkpoints = True, update_existing_repos = False):
+			self.download_repo(FakeAsyncGithubDownloader({"issues": self.issues}, failing = [self.repo_api_address + "/issues?page=2"]))
+			self.assertTrue(self.db.project_exists(self.repo_name))
+			aghd = FakeAsyncGithubDownloader({"issues": self.issues})
+			self.download_repo(aghd)
+		self.assertIn(self.repo_api_address + "/issues?page=2", aghd.requested)
+		self.assertNotIn(self.repo_api_address + "/issues?page=1", aghd.requested)
+		self.assertEqual(sorted(self.db.read_project_from_disk(self.repo_name)["issues"]), [1, 2])
+		self.assertNotEqual(self.db.read_project_checkpoints(self.repo_name)["completed_at"], None)
+
+if __name__ == "__main__":
+	unittest.main()
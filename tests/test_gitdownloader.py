@@ -0,0 +1,143 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+from unittest import mock
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger.downloadlogger import Logger
+from downloader.gitdownloader import GitDownloader
+
+def git(repo_path, *arguments):
+	"""
+	Runs a git command in a repository with a fixed author, so that commits can be created in any environment.
+
+	:param repo_path: the path of the repository in the file system.
+	:param arguments: the git subcommand and its arguments.
+	"""
+	subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@example.com", "-c", "init.defaultBranch=master"] + list(arguments), \
+				cwd = repo_path, check = True, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+
+def write_file(repo_path, filename, content):
+	"""
+	Writes a file of a repository.
+
+	:param repo_path: the path of the repository in the file system.
+	:param filename: the name of the file.
+	:param content: the content of the file.
+	"""
+	with open(os.path.join(repo_path, filename), 'w') as outfile:
+		outfile.write(content)
+
+class TestGitClone(unittest.TestCase):
+	"""
+	Tests that the clones are shallow, partial, and include only the default branch according to the properties.
+	"""
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+		self.upstream = os.path.join(self.folder, "upstream")
+		os.makedirs(self.upstream)
+		git(self.upstream, "init", "-q")
+		for i in range(3):
+			write_file(self.upstream, "file.txt", str(i))
+			git(self.upstream, "add", "file.txt")
+			git(self.upstream, "commit", "-q", "-m", "commit %d" % i)
+		git(self.upstream, "branch", "feature")
+		self.gd = GitDownloader("git", Logger(0), "apikey")
+
+	def tearDown(self):
+		shutil.rmtree(self.folder, ignore_errors = True)
+
+	def clone_arguments(self, **properties):
+		"""
+		Returns the arguments of the git clone command for the given properties, without running it.
+
+		:param properties: the values of git_clone_depth, git_partial_clone, and git_single_branch.
+		:returns: a list containing the arguments.
+		"""
+		with mock.patch.multiple("downloader.gitdownloader", **properties), mock.patch.object(self.gd, "run_git", return_value = True) as run_git:
+			self.gd.git_clone("https://github.com/owner/name", "path")
+		return run_git.call_args[0][0]
+
+	def test_clone_arguments(self):
+		self.assertEqual(self.clone_arguments(git_clone_depth = 0, git_partial_clone = False, git_single_branch = False), \
+						['clone', '--progress', "https://github.com/owner/name", "path"])
+		self.assertEqual(self.clone_arguments(git_clone_depth = 1, git_partial_clone = True, git_single_branch = False), \
+						['clone', '--progress', '--depth', '1', '--filter=blob:none', '--no-single-branch', "https://github.com/owner/name", "path"])
+		self.assertEqual(self.clone_arguments(git_clone_depth = 0, git_partial_clone = False, git_single_branch = True), \
+						['clone', '--progress', '--single-branch', "https://github.com/owner/name", "path"])
+
+	def test_shallow_clone_of_all_branches(self):
+		clone = os.path.join(self.folder, "clone")
+		with mock.patch.multiple("downloader.gitdownloader", git_clone_depth = 1, git_partial_clone = False, git_single_branch = False):
+			self.assertTrue(self.gd.git_clone("file://" + self.upstream, clone))
+		self.assertTrue(os.path.exists(os.path.join(clone, ".git", "shallow")))
+		log = subprocess.check_output(["git", "rev-list", "--all"], cwd = clone).split()
+		self.assertEqual(len(log), 1)
+		branches = subprocess.check_output(["git", "branch", "-r"], cwd = clone).decode()
+		self.assertIn("origin/feature", branches)
+
+class TestGitLog(unittest.TestCase):
+	"""
+	Tests that the commits read by git_log have the same files as the commits of the GitHub API.
+	"""
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+		git(self.folder, "init", "-q")
+		write_file(self.folder, "a.txt", "".join("line %d\n" % i for i in range(10)))
+		with open(os.path.join(self.folder, "image.bin"), 'wb') as outfile:
+			outfile.write(bytes(range(256)))
+		git(self.folder, "add", "a.txt", "image.bin")
+		git(self.folder, "commit", "-q", "-m", "add files")
+		git(self.folder, "mv", "a.txt", "b.txt")
+		write_file(self.folder, "b.txt", "".join("line %d\n" % i for i in range(9)) + "changed\n")
+		git(self.folder, "rm", "-q", "image.bin")
+		git(self.folder, "commit", "-q", "-a", "-m", "rename and remove files")
+		git(self.folder, "checkout", "-q", "-b", "feature")
+		write_file(self.folder, "c.txt", "new\n")
+		git(self.folder, "add", "c.txt")
+		git(self.folder, "commit", "-q", "-m", "add file on branch")
+		git(self.folder, "checkout", "-q", "master")
+		write_file(self.folder, "d.txt", "other\n")
+		git(self.folder, "add", "d.txt")
+		git(self.folder, "commit", "-q", "-m", "add file on master")
+		git(self.folder, "merge", "-q", "-m", "merge feature", "feature")
+		self.gd = GitDownloader("git", Logger(0), "apikey")
+		self.commits = {subprocess.check_output(["git", "log", "-1", "--format=%s", sha], cwd = self.folder).decode().strip(): (parents, files) \
+						for sha, parents, files in self.gd.git_log(self.folder)}
+
+	def tearDown(self):
+		shutil.rmtree(self.folder, ignore_errors = True)
+
+	def test_all_commits_are_read(self):
+		self.assertEqual(set(self.commits), {"add files", "rename and remove files", "add file on branch", "add file on master", "merge feature"})
+
+	def test_added_files(self):
+		parents, files = self.commits["add files"]
+		self.assertEqual(parents, [])
+		self.assertEqual(sorted(files, key = lambda changedfile: changedfile["filename"]), \
+						[{"filename": "a.txt", "status": "added", "additions": 10, "deletions": 0, "changes": 10}, \
+						{"filename": "image.bin", "status": "added", "additions": 0, "deletions": 0, "changes": 0}])
+
+	def test_renamed_and_removed_files(self):
+		_, files = self.commits["rename and remove files"]
+		self.assertEqual(sorted(files, key = lambda changedfile: changedfile["filename"]), \
+						[{"filename": "b.txt", "previous_filename": "a.txt", "status": "renamed", "additions": 1, "deletions": 1, "changes": 2}, \
+						{"filename": "image.bin", "status": "removed", "additions": 0, "deletions": 0, "changes": 0}])
+
+	def test_merge_commit_has_no_files(self):
+		parents, files = self.commits["merge feature"]
+		self.assertEqual(len(parents), 2)
+		self.assertEqual(files, [])
+		self.assertEqual(self.commits["add file on branch"][1], [{"filename": "c.txt", "status": "added", "additions": 1, "deletions": 0, "changes": 1}])
+
+	def test_partial_clone_is_detected(self):
+		clone = os.path.join(tempfile.mkdtemp(dir = self.folder), "clone")
+		subprocess.run(["git", "-c", "uploadpack.allowfilter=true", "clone", "-q", "--no-local", "--filter=blob:none", "file://" + self.folder, clone], \
+					check = True, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+		self.assertTrue(self.gd.git_is_partial(clone))
+		self.assertFalse(self.gd.git_is_partial(self.folder))
+
+if __name__ == "__main__":
+	unittest.main()
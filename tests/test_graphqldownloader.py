@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from downloader.tokenpool import TokenPool
+from downloader.graphqldownloader import GraphQLDownloader
+
+class FakeResponse:
+	"""
+	Class that implements a response of the GraphQL API.
+	"""
+	def __init__(self, status_code, body):
+		"""
+		Initializes this response.
+
+		:param status_code: the status code of the response.
+		:param body: the JSON object of the body of the response.
+		"""
+		self.status_code = status_code
+		self.ok = status_code < 400
+		self.headers = {}
+		self.content = json.dumps(body).encode('utf-8')
+
+class FakeGithubDownloader:
+	"""
+	Class that implements the parts of a GithubDownloader that are used by a GraphQLDownloader. The
+	full objects that are downloaded using the REST API are recorded.
+	"""
+	def __init__(self, response):
+		"""
+		Initializes this downloader.
+
+		:param response: the response that is returned for any GraphQL query.
+		"""
+		self.tokenpool = TokenPool(["apikey"])
+		self.pacer = self
+		self.session = self
+		self.response = response
+		self.queries = []
+		self.downloaded = []
+
+	def reserve(self):
+		"""
+		Reserves the sending of a request without waiting (as RequestPacer.reserve).
+		"""
+		return 0
+
+	def post(self, address, data, **kwargs):  # @UnusedVariable
+		"""
+		Records a GraphQL query and returns the response (as Session.post).
+		"""
+		self.queries.append(json.loads(data)["query"])
+		return self.response
+
+	def retry_delay(self, attempt, status_code = None, headers = None, content = None):  # @UnusedVariable
+		"""
+		Does not retry any request (as GithubDownloader.retry_delay).
+		"""
+		return None
+
+	def download_object(self, address):
+		"""
+		Records the download of a full object using the REST API (as GithubDownloader.download_object).
+		"""
+		self.downloaded.append(address)
+		return {"address": address}
+
+class TestGraphQLDownloader(unittest.TestCase):
+	"""
+	Tests that the full objects that are not returned by the GraphQL API are downloaded using the REST API.
+	"""
+	issues = [({"number": 1}, "https://api.github.com/repos/owner/name/issues/1"), \
+			({"number": 2}, "https://api.github.com/repos/owner/name/issues/2")]
+
+	def closed_issue(self, login):
+		"""
+		Returns the GraphQL node of an issue that was closed by a user.
+
+		:param login: the login of the user.
+		"""
+		return {"timelineItems": {"nodes": [{"actor": {"__typename": "User", "login": login, "avatarUrl": "", "url": "", "databaseId": 7, "id": "U"}}]}}
+
+	def test_null_node_is_downloaded_using_rest(self):
+		response = FakeResponse(200, {"data": {"rateLimit": {"remaining": 4000, "resetAt": "2030-01-01T00:00:00Z"}, \
+												"r0": {"n0": None, "n1": self.closed_issue("user")}}})
+		ghd = FakeGithubDownloader(response)
+		fullobjects = GraphQLDownloader(ghd).download_batch(self.issues)
+		self.assertEqual(fullobjects[0], {"address": self.issues[0][1]})
+		self.assertEqual(fullobjects[1]["closed_by"]["login"], "user")
+		self.assertEqual(ghd.downloaded, [self.issues[0][1]])
+		self.assertIn("issueOrPullRequest(number: 1)", ghd.queries[0])
+
+	def test_null_data_is_downloaded_using_rest(self):
+		ghd = FakeGithubDownloader(FakeResponse(200, {"data": None, "errors": [{"message": "Something went wrong"}]}))
+		fullobjects = GraphQLDownloader(ghd).download_batch(self.issues)
+		self.assertEqual(fullobjects, [{"address": address} for _, address in self.issues])
+
+	def test_failed_query_is_downloaded_using_rest(self):
+		ghd = FakeGithubDownloader(FakeResponse(502, {"message": "Bad Gateway"}))
+		fullobjects = GraphQLDownloader(ghd).download_batch(self.issues)
+		self.assertEqual(ghd.downloaded, [address for _, address in self.issues])
+		self.assertEqual(len(fullobjects), 2)
+
+	def test_rate_limit_is_kept_separately(self):
+		response = FakeResponse(200, {"data": {"rateLimit": {"remaining": 50, "resetAt": "2030-01-01T00:00:00Z"}, \
+												"r0": {"n0": self.closed_issue("a"), "n1": self.closed_issue("b")}}})
+		ghd = FakeGithubDownloader(response)
+		gqld = GraphQLDownloader(ghd)
+		gqld.download_batch(self.issues)
+		self.assertEqual(gqld.tokenpool.limits["apikey"]["core"]["remaining"], 50)
+		self.assertEqual(ghd.tokenpool.limits["apikey"]["core"]["remaining"], -1)
+
+if __name__ == "__main__":
+	unittest.main()
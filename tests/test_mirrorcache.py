@@ -0,0 +1,150 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import threading
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger.downloadlogger import Logger
+from downloader.mirrorcache import MirrorCache
+
+class FakeGitDownloader:
+	"""
+	Class that implements the parts of a GitDownloader that are used by a mirror cache. The clones that
+	exist and the clones that cannot be dissociated are given, and the git commands and the dissociated
+	clones are recorded.
+	"""
+	def __init__(self, existing = (), failing = ()):
+		"""
+		Initializes this git downloader.
+
+		:param existing: the paths to the clones that exist.
+		:param failing: the paths to the clones that cannot be dissociated.
+		"""
+		self.logger = Logger(0)
+		self.existing = set(existing)
+		self.failing = set(failing)
+		self.dissociated = []
+		self.commands = []
+
+	def run_git(self, arguments, cwd = None):  # @UnusedVariable
+		"""
+		Records a git command; clone creates the folder of the mirror (as GitDownloader.run_git).
+		"""
+		self.commands.append(arguments[0])
+		if arguments[0] == 'clone':
+			self.cloned = arguments
+			os.makedirs(arguments[-1])
+		return True
+
+	def git_repo_exists(self, project_path):
+		"""
+		Checks if a clone exists (as GitDownloader.git_repo_exists).
+		"""
+		return project_path in self.existing
+
+	def git_dissociate(self, repo_path):
+		"""
+		Dissociates a clone unless it is one of the failing clones (as GitDownloader.git_dissociate).
+		"""
+		if repo_path in self.failing:
+			return False
+		self.dissociated.append(repo_path)
+		return True
+
+class TestMirrorCacheEviction(unittest.TestCase):
+	"""
+	Tests that the least recently used mirrors are evicted, except for the ones that are still needed by their clones.
+	"""
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+		self.cache = MirrorCache(self.folder, 250)
+		for i, name in enumerate(["oldest.git", "older.git", "newest.git"]):
+			os.makedirs(os.path.join(self.folder, name))
+			self.cache.mirrors[name] = {"last_used": i, "size": 100, "clones": ["/clones/" + name + "/1", "/clones/" + name + "/2"]}
+
+	def tearDown(self):
+		shutil.rmtree(self.folder, ignore_errors = True)
+
+	def test_least_recently_used_mirror_is_evicted(self):
+		gd = FakeGitDownloader(["/clones/oldest.git/1", "/clones/oldest.git/2"])
+		self.cache.evict(gd)
+		self.assertEqual(set(self.cache.mirrors), {"older.git", "newest.git"})
+		self.assertFalse(os.path.exists(os.path.join(self.folder, "oldest.git")))
+		self.assertEqual(gd.dissociated, ["/clones/oldest.git/1", "/clones/oldest.git/2"])
+
+	def test_mirror_with_clone_that_cannot_be_dissociated_is_kept(self):
+		gd = FakeGitDownloader(["/clones/oldest.git/1", "/clones/oldest.git/2", "/clones/older.git/1"], failing = ["/clones/oldest.git/2"])
+		self.cache.evict(gd)
+		self.assertEqual(set(self.cache.mirrors), {"oldest.git", "newest.git"})
+		self.assertTrue(os.path.exists(os.path.join(self.folder, "oldest.git")))
+		self.assertEqual(self.cache.mirrors["oldest.git"]["clones"], ["/clones/oldest.git/2"])
+		self.assertEqual(MirrorCache(self.folder, 250).mirrors["oldest.git"]["clones"], ["/clones/oldest.git/2"])
+
+	def test_mirror_in_use_is_kept(self):
+		gd = FakeGitDownloader([])
+		with self.cache.mirror_lock("oldest.git"):
+			self.cache.evict(gd)
+		self.assertEqual(set(self.cache.mirrors), {"oldest.git", "newest.git"})
+
+class TestMirrorCacheReference(unittest.TestCase):
+	"""
+	Tests that the mirrors are created, fetched, and shared by the clones that reference them.
+	"""
+	url = "https://github.com/owner/name"
+
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.folder, ignore_errors = True)
+
+	def test_mirror_is_created_without_automatic_gc(self):
+		gd = FakeGitDownloader()
+		with MirrorCache(self.folder, 1000).reference(self.url, gd) as mirrorpath:
+			self.assertEqual(mirrorpath, os.path.join(self.folder, "owner_name.git"))
+		self.assertEqual(gd.cloned[:7], ['clone', '--mirror', '--progress', '-c', 'gc.auto=0', '-c', 'gc.pruneExpire=never'])
+
+	def test_recently_fetched_mirror_is_not_fetched_again(self):
+		gd = FakeGitDownloader()
+		cache = MirrorCache(self.folder, 1000, fetch_interval = 600)
+		for _ in range(3):
+			with cache.reference(self.url, gd):
+				pass
+		self.assertEqual(gd.commands, ['clone'])
+		cache.fetch_interval = 0
+		with cache.reference(self.url, gd):
+			pass
+		self.assertEqual(gd.commands, ['clone', 'fetch'])
+
+	def test_clones_reference_the_mirror_at_the_same_time(self):
+		gd = FakeGitDownloader()
+		cache = MirrorCache(self.folder, 1000)
+		entered, release = threading.Event(), threading.Event()
+		def reference(wait):
+			with cache.reference(self.url, gd):
+				entered.set()
+				if wait:
+					release.wait(5)
+		thread = threading.Thread(target = reference, args = (True, ))
+		thread.start()
+		try:
+			self.assertTrue(entered.wait(5))
+			other = threading.Thread(target = reference, args = (False, ))
+			other.start()
+			other.join(5)
+			self.assertFalse(other.is_alive())
+		finally:
+			release.set()
+			thread.join()
+
+	def test_mirror_used_by_a_clone_is_not_evicted(self):
+		gd = FakeGitDownloader()
+		cache = MirrorCache(self.folder, -1)
+		with cache.reference(self.url, gd):
+			cache.evict(gd)
+			self.assertIn("owner_name.git", cache.mirrors)
+		self.assertNotIn("owner_name.git", cache.mirrors)
+
+if __name__ == "__main__":
+	unittest.main()